@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, QSortFilterProxyModel, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPixmap
+from PyQt5.QtWidgets import (QCheckBox, QComboBox, QDialog, QHBoxLayout, QLabel, QListView, QMessageBox,
+                             QSpinBox, QVBoxLayout)
+
+import batch_processor
+from panel_store import qimage_view
+from thumbnail_cache import ThumbnailCache
+
+
+# 批处理结果浏览：结果列表用 model/view 显示，视图只为可见的格子请求数据，
+# 缩略图在后台线程池中按需解码（最近请求的优先），解码结果缓存在磁盘和内存中。
+
+DEFECT_NAMES = (('cracks', '裂缝'), ('potholes', '坑洼'), ('water', '积水'))
+SORT_KEYS = (('name', '文件名'), ('total', '缺陷总数'), ('cracks', '裂缝数'), ('potholes', '坑洼数'), ('water', '积水数'))
+
+PATH_ROLE = Qt.UserRole + 1
+RESULT_ROLE = Qt.UserRole + 2
+
+# 内存中最多保留的缩略图数
+MAX_PIXMAPS = 2000
+
+
+class BatchResultModel(QAbstractListModel):
+    """批处理结果列表（见 batch_processor.load_results），缩略图在第一次被视图请求时后台加载
+
+    is_wanted: 可选的判断函数 row -> bool，排队中的请求在开始解码前再确认一次（已滚出视图的跳过）
+    """
+
+    thumbnail_ready = pyqtSignal(int, QImage)
+
+    def __init__(self, results, cache, workers=4, parent=None):
+        super().__init__(parent)
+        self.results = results
+        self.cache = cache
+        self.workers = workers
+        self.is_wanted = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+        self._pixmaps = OrderedDict()
+        self._failed = set()  # 无法生成缩略图的行，不再重复请求
+        self._queue = []  # 待加载的行，后请求的先加载
+        self._pending = set()
+        self._in_flight = 0
+        self._placeholder = QPixmap(cache.size, cache.size)
+        self._placeholder.fill(QColor(236, 240, 241))
+        # 工作线程发出的信号自动排队到界面线程处理
+        self.thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        result = self.results[row]
+        if role == Qt.DisplayRole:
+            counts = ' '.join(f"{name}{result['counts'][key]}" for key, name in DEFECT_NAMES)
+            return f"{result['name']}\n{counts}" + ('（已跳过）' if result['skipped'] else '')
+        if role == Qt.DecorationRole:
+            pixmap = self._pixmaps.get(row)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(row)
+                return pixmap
+            if result['path'] and row not in self._failed:
+                self._request(row)
+            return self._placeholder
+        if role == Qt.ToolTipRole:
+            return result['path'] or result['name']
+        if role == PATH_ROLE:
+            return result['path']
+        if role == RESULT_ROLE:
+            return result
+        return None
+
+    def _request(self, row):
+        if row in self._pending:
+            return
+        self._pending.add(row)
+        self._queue.append(row)
+        self._pump()
+
+    def _pump(self):
+        while self._in_flight < self.workers and self._queue:
+            row = self._queue.pop()
+            if self.is_wanted is not None and not self.is_wanted(row):
+                # 已滚出视图，丢弃请求，再次可见时会重新请求
+                self._pending.discard(row)
+                continue
+            self._in_flight += 1
+            self._executor.submit(self._load, row, self.results[row]['path'])
+
+    def _load(self, row, path):
+        """在工作线程中生成缩略图，QImage 复制一份数据后交给界面线程"""
+        try:
+            thumbnail = self.cache.get(path)
+            image = qimage_view(thumbnail).copy() if thumbnail is not None else QImage()
+        except Exception as e:
+            print(f"加载缩略图 {path} 时出错: {str(e)}")
+            image = QImage()
+        self.thumbnail_ready.emit(row, image)
+
+    def _on_thumbnail_ready(self, row, image):
+        self._in_flight -= 1
+        self._pending.discard(row)
+        if image.isNull():
+            self._failed.add(row)
+        else:
+            self._pixmaps[row] = QPixmap.fromImage(image)
+            while len(self._pixmaps) > MAX_PIXMAPS:
+                self._pixmaps.popitem(last=False)
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+        self._pump()
+
+    def shutdown(self):
+        """停止后台加载（丢弃排队中的请求）"""
+        self._queue.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchResultFilter(QSortFilterProxyModel):
+    """按缺陷类型和数量筛选、按文件名或缺陷数量排序"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.defect_type = 'total'
+        self.min_count = 0
+        self.hide_skipped = False
+        self.sort_key = 'name'
+
+    def set_filter(self, defect_type, min_count, hide_skipped):
+        self.defect_type = defect_type
+        self.min_count = min_count
+        self.hide_skipped = hide_skipped
+        self.invalidateFilter()
+
+    def set_sort_key(self, sort_key, descending):
+        self.sort_key = sort_key
+        self.invalidate()
+        self.sort(0, Qt.DescendingOrder if descending else Qt.AscendingOrder)
+
+    def _value(self, result, key):
+        if key == 'name':
+            return result['name'].lower()
+        if key == 'total':
+            return result['total']
+        return result['counts'][key]
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        result = self.sourceModel().results[source_row]
+        if self.hide_skipped and result['skipped']:
+            return False
+        return self._value(result, self.defect_type) >= self.min_count
+
+    def lessThan(self, left, right):
+        results = self.sourceModel().results
+        a, b = results[left.row()], results[right.row()]
+        # 数量相同时按文件名排
+        return (self._value(a, self.sort_key), a['name']) < (self._value(b, self.sort_key), b['name'])
+
+
+class BatchBrowserDialog(QDialog):
+    """批处理结果浏览窗口
+
+    folder: 批处理输出文件夹
+    open_image: 双击结果时调用的函数 open_image(结果图路径)
+    """
+
+    def __init__(self, folder, open_image=None, parent=None, workers=4):
+        super().__init__(parent)
+        self.folder = folder
+        self.open_image = open_image
+        self.setWindowTitle(f"批处理结果: {folder}")
+        self.setMinimumSize(1000, 700)
+        self.setWindowFlags(self.windowFlags() | Qt.WindowMaximizeButtonHint | Qt.WindowMinimizeButtonHint)
+
+        cache = ThumbnailCache.for_folder(folder)
+        self.model = BatchResultModel(batch_processor.load_results(folder), cache, workers, self)
+        self.proxy = BatchResultFilter(self)
+        self.proxy.setSourceModel(self.model)
+        self.initUI(cache.size)
+        self.model.is_wanted = self._row_visible
+        self.update_filter()
+        self.update_sort()
+
+    def initUI(self, thumbnail_size):
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("筛选:"))
+        self.type_combo = QComboBox()
+        self.type_combo.addItem("缺陷总数", 'total')
+        for key, name in DEFECT_NAMES:
+            self.type_combo.addItem(name, key)
+        controls.addWidget(self.type_combo)
+        controls.addWidget(QLabel("不少于"))
+        self.min_spin = QSpinBox()
+        self.min_spin.setRange(0, 9999)
+        controls.addWidget(self.min_spin)
+        self.hide_skipped_check = QCheckBox("隐藏跳过的图片")
+        controls.addWidget(self.hide_skipped_check)
+        controls.addSpacing(20)
+        controls.addWidget(QLabel("排序:"))
+        self.sort_combo = QComboBox()
+        for key, name in SORT_KEYS:
+            self.sort_combo.addItem(name, key)
+        controls.addWidget(self.sort_combo)
+        self.descending_check = QCheckBox("降序")
+        controls.addWidget(self.descending_check)
+        controls.addStretch()
+        self.count_label = QLabel()
+        controls.addWidget(self.count_label)
+        layout.addLayout(controls)
+
+        # 图标模式的列表视图：格子尺寸统一，视图只为可见的格子取数据
+        self.view = QListView()
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setMovement(QListView.Static)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.Batched)
+        self.view.setBatchSize(200)
+        self.view.setIconSize(QSize(thumbnail_size, thumbnail_size))
+        self.view.setGridSize(QSize(thumbnail_size + 24, thumbnail_size + 48))
+        self.view.setWordWrap(True)
+        self.view.setModel(self.proxy)
+        self.view.doubleClicked.connect(self.open_result)
+        layout.addWidget(self.view)
+
+        self.type_combo.currentIndexChanged.connect(self.update_filter)
+        self.min_spin.valueChanged.connect(self.update_filter)
+        self.hide_skipped_check.stateChanged.connect(self.update_filter)
+        self.sort_combo.currentIndexChanged.connect(self.update_sort)
+        self.descending_check.stateChanged.connect(self.update_sort)
+
+    def _row_visible(self, row):
+        """源模型的第 row 行当前是否在视图中可见"""
+        index = self.proxy.mapFromSource(self.model.index(row))
+        return index.isValid() and self.view.visualRect(index).intersects(self.view.viewport().rect())
+
+    def update_filter(self):
+        self.proxy.set_filter(self.type_combo.currentData(), self.min_spin.value(),
+                              self.hide_skipped_check.isChecked())
+        self.count_label.setText(f"显示 {self.proxy.rowCount()} / {self.model.rowCount()} 张")
+
+    def update_sort(self):
+        self.proxy.set_sort_key(self.sort_combo.currentData(), self.descending_check.isChecked())
+
+    def open_result(self, index):
+        path = index.data(PATH_ROLE)
+        if not path:
+            QMessageBox.information(self, "提示", "该图片没有结果图（近似重复帧或已跳过检测）")
+            return
+        if self.open_image is not None:
+            self.open_image(path)
+
+    def done(self, result):
+        self.model.shutdown()
+        super().done(result)
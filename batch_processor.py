@@ -0,0 +1,395 @@
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_processor import ImageProcessor
+from frame_dedup import FrameDeduplicator
+from quality_gate import QualityGate
+from road_roi import RoadROI
+from recipe import load_recipe
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+METHOD_NAMES = {'intelligent': '传统方法', 'ai': 'AI方法'}
+MODE_NAMES = {'bbox': '边界框检测', 'segment': '分割检测', 'both': '混合检测'}
+
+
+def list_images(dir_path):
+    """按文件名排序列出文件夹中支持的图片"""
+    return sorted(
+        os.path.join(dir_path, name) for name in os.listdir(dir_path)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def save_image(path, image):
+    """保存图片（使用 cv2.imencode 解决中文路径问题）"""
+    _, buffer = cv2.imencode(os.path.splitext(path)[1], image)
+    with open(path, 'wb') as f:
+        f.write(buffer)
+
+
+def write_info(info_path, method, defects, detection_mode=None, reused_from=None, image_name=None):
+    """保存单张图片的检测结果信息，image_name 为原图文件名（近似重复帧没有结果图，浏览结果时据此显示文件名）"""
+    with open(info_path, 'w', encoding='utf-8') as f:
+        if image_name:
+            f.write(f"原图: {image_name}\n")
+        f.write(f"检测方法: {METHOD_NAMES.get(method, method)}\n")
+        if method == 'ai':
+            f.write(f"检测模式: {MODE_NAMES.get(detection_mode, detection_mode)}\n")
+        if reused_from:
+            f.write(f"近似重复帧，复用 {reused_from} 的检测结果\n")
+        quality = defects.get('quality')
+        if quality is not None:
+            scores = quality['scores']
+            status = '合格' if quality['passed'] else f"不合格 ({', '.join(quality['reasons'])})"
+            f.write(f"图像质量: {status}\n")
+            f.write(f"- 清晰度: {scores['sharpness']:.1f}, 亮度: {scores['brightness']:.1f}, "
+                    f"暗部占比: {scores['dark_ratio']:.2f}, 过曝占比: {scores['bright_ratio']:.2f}, "
+                    f"有效覆盖率: {scores['coverage']:.2f}\n")
+            if quality['action'] == 'skip':
+                f.write("图像质量不合格，已跳过检测\n")
+                return
+            if quality['action'] == 'cheap':
+                f.write("图像质量不合格，已使用低开销检测\n")
+        roi = defects.get('roi')
+        if roi is not None:
+            x, y, w, h = roi['box']
+            f.write(f"路面ROI: ({x}, {y}, {w}, {h})，剔除ROI外候选 {roi['removed']} 处\n")
+        f.write("检测结果:\n")
+        if method == 'ai':
+            if 'stats' in defects:
+                if detection_mode in ['bbox', 'both']:
+                    bbox_stats = defects['stats']['bbox']
+                    f.write("边界框检测:\n")
+                    f.write(f"- 检测到坑洼: {bbox_stats['count']} 处\n")
+                    if bbox_stats['count'] > 0:
+                        f.write("- 各区域面积(像素):\n")
+                        for i, area in enumerate(bbox_stats['areas'], 1):
+                            f.write(f"  区域{i}: {area}\n")
+
+                if detection_mode in ['segment', 'both']:
+                    segment_stats = defects['stats']['segment']
+                    f.write("\n分割检测:\n")
+                    f.write(f"- 检测到目标: {segment_stats['count']} 处\n")
+                    if segment_stats['count'] > 0:
+                        f.write("- 各区域掩码面积(像素):\n")
+                        for i, area in enumerate(segment_stats['areas'], 1):
+                            f.write(f"  区域{i}: {area}\n")
+            else:
+                f.write(f"坑洼: {defects.count('potholes')} 处\n")
+        else:
+            counts = defects.counts()
+            f.write(f"裂缝: {counts['cracks']} 处\n")
+            f.write(f"坑洼: {counts['potholes']} 处\n")
+            f.write(f"积水: {counts['water']} 处\n")
+
+
+# 信息文件中各类缺陷数量所在的行（传统方法和按流程处理为“裂缝/坑洼/积水: N 处”，
+# AI方法为“- 检测到坑洼: N 处”（边界框）和“- 检测到目标: N 处”（分割））
+INFO_COUNT_PATTERNS = {
+    'cracks': re.compile(r'^裂缝: (\d+) 处'),
+    'potholes': re.compile(r'^(?:坑洼|- 检测到坑洼): (\d+) 处'),
+    'water': re.compile(r'^积水: (\d+) 处'),
+}
+SEGMENT_COUNT_PATTERN = re.compile(r'^- 检测到目标: (\d+) 处')
+IMAGE_NAME_PATTERN = re.compile(r'^原图: (.+)$')
+
+
+def read_info_counts(info_path):
+    """从信息文件读取各类缺陷数量 {'cracks', 'potholes', 'water'}，以及是否因质量不合格跳过了检测
+
+    AI混合模式中边界框和分割的结果是同一批坑洼，坑洼数取边界框的数量；只有分割结果时取分割的数量。
+    返回 (counts, skipped)，文件不存在时返回 (None, False)。
+    """
+    try:
+        with open(info_path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None, False
+    counts = dict.fromkeys(INFO_COUNT_PATTERNS, 0)
+    found = set()
+    segment_count = None
+    skipped = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith('图像质量不合格，已跳过检测'):
+            skipped = True
+        for defect_type, pattern in INFO_COUNT_PATTERNS.items():
+            match = pattern.match(line)
+            if match and defect_type not in found:
+                counts[defect_type] = int(match.group(1))
+                found.add(defect_type)
+        match = SEGMENT_COUNT_PATTERN.match(line)
+        if match and segment_count is None:
+            segment_count = int(match.group(1))
+    if 'potholes' not in found and segment_count is not None:
+        counts['potholes'] = segment_count
+    return counts, skipped
+
+
+def _source_name(output_dir, info_name, stem):
+    """没有结果图的记录的原图文件名：优先取信息文件中记录的文件名，
+    旧的信息文件没有记录时在默认的输入文件夹（输出文件夹的上一级）中按文件名查找"""
+    try:
+        with open(os.path.join(output_dir, info_name), encoding='utf-8') as f:
+            match = IMAGE_NAME_PATTERN.match(f.readline().strip())
+        if match:
+            return match.group(1)
+    except OSError:
+        pass
+    name = stem[len('processed_'):]
+    input_dir = os.path.dirname(os.path.abspath(output_dir))
+    for extension in IMAGE_EXTENSIONS:
+        for candidate in (name + extension, name + extension.upper()):
+            if os.path.exists(os.path.join(input_dir, candidate)):
+                return candidate
+    return name
+
+
+def load_results(output_dir):
+    """列出批处理输出文件夹中的结果图及其缺陷数量
+
+    返回 [{'path': 结果图路径, 'name': 原图文件名, 'counts': {类型: 数量}, 'total': 总数, 'skipped': 是否跳过}, ...]，
+    按文件名排序；近似重复帧和低质量帧没有结果图，只有信息文件，此时 'path' 为None。
+    """
+    names = sorted(os.listdir(output_dir))
+    images = {os.path.splitext(name)[0]: name for name in names if name.lower().endswith(IMAGE_EXTENSIONS)}
+    results = []
+    for name in names:
+        if not (name.startswith('processed_') and name.endswith('_info.txt')):
+            continue
+        stem = name[:-len('_info.txt')]
+        image_name = images.get(stem)
+        counts, skipped = read_info_counts(os.path.join(output_dir, name))
+        counts = counts or dict.fromkeys(INFO_COUNT_PATTERNS, 0)
+        results.append({'path': os.path.join(output_dir, image_name) if image_name else None,
+                        'name': image_name[len('processed_'):] if image_name else _source_name(output_dir, name, stem),
+                        'counts': counts, 'total': sum(counts.values()), 'skipped': skipped})
+    return results
+
+
+def process_image_file(processor, image_path, output_dir, method='intelligent', dedup=None):
+    """检测单张图片并保存结果图和信息文件
+
+    传入 dedup 时先做近似重复帧检查，重复帧直接复用最近一次的检测结果，
+    只写信息文件不再推理。返回 (defects, reused_from)。
+    """
+    processor.load_image(image_path)
+    name = os.path.basename(image_path)
+    output_path = os.path.join(output_dir, f'processed_{name}')
+    info_path = os.path.splitext(output_path)[0] + '_info.txt'
+
+    if dedup is not None:
+        h, entry = dedup.lookup(processor.current_image)
+        if entry is not None:
+            write_info(info_path, method, entry['result'], processor.detection_mode, entry['name'], name)
+            return entry['result'], entry['name']
+
+    start = time.perf_counter()
+    if method == 'ai':
+        result, defects = processor.detect_defects_ai()
+    else:
+        result, defects = processor.detect_defects_intelligent()
+    elapsed = time.perf_counter() - start
+
+    if dedup is not None:
+        dedup.add(h, defects, elapsed, name)
+
+    save_image(output_path, result)
+    write_info(info_path, method, defects, processor.detection_mode, image_name=name)
+    return defects, None
+
+
+def process_folder(input_dir, output_dir=None, method='intelligent', detection_mode='bbox',
+                   dedup=None, processor=None, image_files=None, quality_gate=None, road_roi=None,
+                   low_memory=False, refine=False):
+    """批量处理文件夹中的图片，返回成功处理的数量"""
+    processor = processor or ImageProcessor()
+    processor.low_memory = low_memory
+    processor.refine = refine
+    processor.detection_mode = detection_mode
+    processor.quality_gate = quality_gate
+    processor.road_roi = road_roi
+    output_dir = output_dir or os.path.join(input_dir, 'processed')
+    os.makedirs(output_dir, exist_ok=True)
+
+    processed = 0
+    for image_path in image_files if image_files is not None else list_images(input_dir):
+        try:
+            process_image_file(processor, image_path, output_dir, method, dedup)
+            processed += 1
+        except Exception as e:
+            print(f"处理图片 {image_path} 时出错: {str(e)}")
+    return processed
+
+
+def write_recipe_info(info_path, recipe, defects):
+    """保存按处理流程处理的单张图片的信息"""
+    with open(info_path, 'w', encoding='utf-8') as f:
+        f.write(f"处理流程: {' → '.join(step['op'] for step in recipe.steps)}\n")
+        counts = defects.counts()
+        f.write("检测结果:\n")
+        f.write(f"裂缝: {counts['cracks']} 处\n")
+        f.write(f"坑洼: {counts['potholes']} 处\n")
+        f.write(f"积水: {counts['water']} 处\n")
+
+
+def replay_recipe(recipe, input_dir, output_dir=None, workers=4, image_files=None, fuse=False,
+                  progress=None, stop_event=None):
+    """按处理流程并行处理文件夹中的图片，返回成功处理的数量
+
+    流程只编译一次，各线程共享；每个线程复用自己的结果数组，中间结果由缓冲池复用，
+    FFT滤波器等缓存也在图片之间共享。OpenCV 运算时释放GIL，多线程可以并行。
+    progress(done, total, image_path) 在每张图片处理完后调用（在工作线程中）。
+    """
+    recipe = load_recipe(recipe)
+    recipe.compile(fuse)
+    output_dir = output_dir or os.path.join(input_dir, 'processed_recipe')
+    os.makedirs(output_dir, exist_ok=True)
+    image_files = image_files if image_files is not None else list_images(input_dir)
+    local = threading.local()
+    lock = threading.Lock()
+    done = [0, 0]  # [已完成, 成功]
+
+    def process(image_path):
+        if stop_event is not None and stop_event.is_set():
+            return
+        ok = False
+        try:
+            # 处理中文路径
+            image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("无法读取图片")
+            out = getattr(local, 'out', None)
+            if out is None or out.shape != image.shape:
+                out = local.out = np.empty(image.shape, np.uint8)
+            result, defects = recipe.apply(image, out, fuse)
+            name = os.path.basename(image_path)
+            output_path = os.path.join(output_dir, f'processed_{name}')
+            save_image(output_path, result)
+            if defects is not None:
+                write_recipe_info(os.path.splitext(output_path)[0] + '_info.txt', recipe, defects)
+            ok = True
+        except Exception as e:
+            print(f"处理图片 {image_path} 时出错: {str(e)}")
+        with lock:
+            done[0] += 1
+            done[1] += ok
+            count = done[0]
+        if progress is not None:
+            progress(count, len(image_files), image_path)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(process, image_files))
+    return done[1]
+
+
+def watch_folder(input_dir, output_dir=None, method='intelligent', detection_mode='bbox',
+                 dedup=None, poll_interval=2.0, stop_event=None, quality_gate=None, road_roi=None,
+                 low_memory=False, refine=False):
+    """持续监视文件夹，处理新出现的图片，直到 stop_event 被设置或按 Ctrl+C
+
+    文件的大小和修改时间在相邻两轮检查中都不变时才认为已写完；处理失败的文件在被再次修改后重试。
+    """
+    processor = ImageProcessor()
+    seen = set()
+    last_stat = {}  # 上一轮检查时各新文件的 (大小, 修改时间)
+    failed = {}  # 处理失败的文件及失败时的 (大小, 修改时间)
+    try:
+        while stop_event is None or not stop_event.is_set():
+            ready = []
+            current = {}
+            for path in list_images(input_dir):
+                if path in seen:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                current[path] = (stat.st_size, stat.st_mtime_ns)
+                # 跳过仍在写入的文件：等到大小和修改时间不再变化再处理
+                if current[path][0] > 0 and last_stat.get(path) == current[path] and failed.get(path) != current[path]:
+                    ready.append(path)
+            last_stat = current
+            if ready:
+                for path in ready:
+                    if process_folder(input_dir, output_dir, method, detection_mode, dedup,
+                                      processor, [path], quality_gate, road_roi, low_memory, refine):
+                        seen.add(path)
+                        failed.pop(path, None)
+                    else:
+                        failed[path] = current[path]
+                if dedup is not None:
+                    print_dedup_report(dedup)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def print_dedup_report(dedup):
+    report = dedup.report()
+    print(f"已处理 {report['frames']} 张，跳过近似重复帧 {report['duplicates']} 张 "
+          f"({report['duplicate_rate']:.1%})，节省推理时间约 {report['saved_time']:.1f} 秒，"
+          f"哈希耗时 {report['hash_time']:.2f} 秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量缺陷检测')
+    parser.add_argument('--input', required=True, help='输入图片文件夹')
+    parser.add_argument('--output', default=None, help='输出文件夹，默认为 输入文件夹/processed')
+    parser.add_argument('--method', choices=['intelligent', 'ai'], default='intelligent')
+    parser.add_argument('--mode', choices=['bbox', 'segment', 'both'], default='bbox', help='AI检测模式')
+    parser.add_argument('--watch', action='store_true', help='持续监视文件夹中的新图片')
+    parser.add_argument('--dedup', type=int, default=None, metavar='THRESHOLD',
+                        help='跳过近似重复帧，参数为最大汉明距离（如 5）')
+    parser.add_argument('--quality-gate', choices=['skip', 'cheap'], default=None,
+                        help='低质量（模糊/过暗/过曝）图片跳过检测或使用低开销检测')
+    parser.add_argument('--roi-config', default=None, help='路面ROI配置文件（JSON，按相机ID配置多边形）')
+    parser.add_argument('--camera', default=None, help='使用ROI配置文件中的哪个相机')
+    parser.add_argument('--roi-auto', action='store_true', help='根据颜色和纹理自动估计路面区域')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='传统方法使用低内存模式（float32梯度，中间结果用完即释放），适合8K等大图')
+    parser.add_argument('--refine', action='store_true',
+                        help='传统方法使用由粗到精模式（细尺度只分析粗尺度候选框附近的区域，更快，结果可能有少量差异）')
+    parser.add_argument('--recipe', default=None, help='处理流程文件（JSON，界面中“保存处理流程”导出），按流程处理代替检测')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='按流程处理时的并行线程数')
+    parser.add_argument('--fuse', action='store_true', help='按流程处理时合并相邻的亮度通道步骤（更快，结果有少量差异）')
+    args = parser.parse_args()
+
+    if args.recipe:
+        start = time.perf_counter()
+        count = replay_recipe(args.recipe, args.input, args.output, args.workers, fuse=args.fuse)
+        print(f"按流程处理完成，成功处理 {count} 张图片，耗时 {time.perf_counter() - start:.1f} 秒")
+        return
+
+    dedup = FrameDeduplicator(threshold=args.dedup) if args.dedup is not None else None
+    quality_gate = QualityGate(action=args.quality_gate) if args.quality_gate else None
+    if args.roi_config:
+        if args.camera is None:
+            parser.error('使用 --roi-config 时需要指定 --camera')
+        road_roi = RoadROI.from_config(args.roi_config, args.camera)
+    else:
+        road_roi = RoadROI(auto=True) if args.roi_auto else None
+    if args.watch:
+        watch_folder(args.input, args.output, args.method, args.mode, dedup,
+                     quality_gate=quality_gate, road_roi=road_roi, low_memory=args.low_memory,
+                     refine=args.refine)
+    else:
+        count = process_folder(args.input, args.output, args.method, args.mode, dedup,
+                               quality_gate=quality_gate, road_roi=road_roi, low_memory=args.low_memory,
+                               refine=args.refine)
+        print(f"批量处理完成，成功处理 {count} 张图片")
+    if dedup is not None:
+        print_dedup_report(dedup)
+
+
+if __name__ == '__main__':
+    main()
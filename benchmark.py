@@ -0,0 +1,708 @@
+import argparse
+import multiprocessing
+import resource
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from scipy import fftpack
+
+import box_ops
+import cv_cache
+import fft_engine
+import image_ops
+import image_stats
+import morphology
+from buffer_pool import DEFAULT_POOL
+from components import external_contours
+from region_stats import RegionStats
+from image_processor import ImageProcessor
+from road_roi import RoadROI
+import batch_processor
+
+
+def time_call(func, repeat=3):
+    """多次调用取最短耗时（毫秒），返回 (耗时, 最后一次的返回值)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0, result
+
+
+def synthetic_road_image(width=1280, height=720, seed=0):
+    """生成带天空、路边植被、路面裂缝和坑洼的合成道路图像"""
+    rng = np.random.default_rng(seed)
+    image = np.zeros((height, width, 3), np.uint8)
+    horizon = int(height * 0.4)
+    # 天空：蓝色渐变加少量云（容易被误检为积水）
+    sky = np.linspace(230, 170, horizon, dtype=np.float32)[:, None]
+    image[:horizon, :, 0] = sky
+    image[:horizon, :, 1] = sky * 0.8
+    image[:horizon, :, 2] = sky * 0.55
+    for _ in range(4):
+        center = (int(rng.integers(0, width)), int(rng.integers(10, horizon - 10)))
+        cv2.ellipse(image, center, (int(rng.integers(40, 120)), int(rng.integers(10, 25))),
+                    0, 0, 360, (245, 245, 245), -1)
+    # 植被
+    image[horizon:, :] = (40, 120, 50)
+    # 路面梯形，带纹理噪声
+    road = np.array([[width * 0.42, horizon], [width * 0.58, horizon],
+                     [width * 0.98, height], [width * 0.02, height]], np.int32)
+    road_mask = np.zeros((height, width), np.uint8)
+    cv2.fillPoly(road_mask, [road], 255)
+    asphalt = rng.normal(110, 12, (height, width)).clip(0, 255).astype(np.uint8)
+    asphalt = cv2.cvtColor(asphalt, cv2.COLOR_GRAY2BGR)
+    image[road_mask > 0] = asphalt[road_mask > 0]
+    # 路面缺陷：裂缝和坑洼
+    for _ in range(3):
+        x = int(rng.integers(width * 0.3, width * 0.7))
+        y = int(rng.integers(horizon + 80, height - 40))
+        points = np.cumsum(rng.integers(-12, 13, (12, 2)), axis=0) + (x, y)
+        cv2.polylines(image, [points.astype(np.int32)], False, (35, 35, 35), 2)
+    for _ in range(2):
+        center = (int(rng.integers(width * 0.3, width * 0.7)), int(rng.integers(horizon + 100, height - 50)))
+        cv2.ellipse(image, center, (int(rng.integers(25, 50)), int(rng.integers(12, 25))),
+                    0, 0, 360, (50, 50, 55), -1)
+    return image
+
+
+def load_images(input_dir, count):
+    if input_dir:
+        images = []
+        for path in batch_processor.list_images(input_dir)[:count]:
+            image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append((path, image))
+        return images
+    return [(f'synthetic_{i}', synthetic_road_image(seed=i)) for i in range(count)]
+
+
+def count_defects(defects):
+    return len(defects)
+
+
+def bench_roi(args):
+    """对比启用路面ROI前后的检测耗时和检测数量"""
+    processor = ImageProcessor()
+    processor.detection_mode = args.mode
+    if args.roi_config:
+        road_roi = RoadROI.from_config(args.roi_config, args.camera)
+    else:
+        road_roi = RoadROI(auto=True)
+    detect = processor.detect_defects_ai if args.method == 'ai' else processor.detect_defects_intelligent
+
+    totals = {'full_ms': 0.0, 'roi_ms': 0.0, 'full_count': 0, 'roi_count': 0, 'removed': 0, 'roi_area': 0.0}
+    images = load_images(args.input, args.count)
+    print(f"{'图片':<30}{'全图(ms)':>10}{'ROI(ms)':>10}{'全图检测':>8}{'ROI检测':>8}{'剔除':>6}{'ROI占比':>8}")
+    for name, image in images:
+        processor.current_image = image
+        processor.road_roi = None
+        full_ms, (_, full_defects) = time_call(detect, args.repeat)
+        processor.road_roi = road_roi
+        roi_ms, (_, roi_defects) = time_call(detect, args.repeat)
+
+        roi = roi_defects.get('roi', {'box': (0, 0, image.shape[1], image.shape[0]), 'removed': 0})
+        roi_area = roi['box'][2] * roi['box'][3] / float(image.shape[0] * image.shape[1])
+        full_count, roi_count = count_defects(full_defects), count_defects(roi_defects)
+        print(f"{name[-30:]:<30}{full_ms:>10.1f}{roi_ms:>10.1f}{full_count:>8}{roi_count:>8}"
+              f"{roi['removed']:>6}{roi_area:>8.0%}")
+        totals['full_ms'] += full_ms
+        totals['roi_ms'] += roi_ms
+        totals['full_count'] += full_count
+        totals['roi_count'] += roi_count
+        totals['removed'] += roi['removed']
+        totals['roi_area'] += roi_area
+
+    if images:
+        n = len(images)
+        print(f"平均耗时: 全图 {totals['full_ms'] / n:.1f} ms，ROI {totals['roi_ms'] / n:.1f} ms，"
+              f"加速 {totals['full_ms'] / max(totals['roi_ms'], 1e-6):.2f}x")
+        print(f"检测总数: 全图 {totals['full_count']}，ROI {totals['roi_count']}，"
+              f"ROI外剔除候选 {totals['removed']}，ROI外接矩形平均占比 {totals['roi_area'] / n:.0%}")
+
+
+def legacy_fft_filter(gray, radius):
+    """原 ImageProcessor.fft_filter 的实现（complex128 全频谱FFT），作为对照基准"""
+    fshift = fftpack.fftshift(fftpack.fft2(gray))
+    rows, cols = gray.shape
+    crow, ccol = rows//2, cols//2
+    mask = np.ones((rows, cols), np.uint8)
+    mask[crow-radius:crow+radius, ccol-radius:ccol+radius] = 0
+    img_back = np.abs(fftpack.ifft2(fftpack.ifftshift(fshift * mask)))
+    return ((img_back - img_back.min()) * 255 /
+            (img_back.max() - img_back.min())).astype(np.uint8)
+
+
+def bench_fft(args):
+    """对比原FFT高通滤波与 fft_engine 在不同图像尺寸下的耗时和结果差异"""
+    sizes = [(480, 640), (720, 1280), (1080, 1920), (1081, 1917), (2160, 3840)]
+    radius = 30
+    print(f"{'尺寸':<12}{'原实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}{'平均差':>8}{'最大差':>8}"
+          f"{'circle(ms)':>12}{'butterworth(ms)':>16}")
+    for rows, cols in sizes:
+        gray = cv2.cvtColor(synthetic_road_image(cols, rows), cv2.COLOR_BGR2GRAY)
+        legacy_ms, expected = time_call(lambda: legacy_fft_filter(gray, radius), args.repeat)
+        fft_engine.highpass_mask.cache_clear()
+        new_ms, result = time_call(
+            lambda: fft_engine.normalize_to_uint8(fft_engine.highpass(gray, radius)), args.repeat)
+        circle_ms, _ = time_call(lambda: fft_engine.highpass(gray, radius, 'circle'), args.repeat)
+        butter_ms, _ = time_call(lambda: fft_engine.highpass(gray, radius, 'butterworth'), args.repeat)
+        diff = np.abs(expected.astype(np.int16) - result.astype(np.int16))
+        print(f"{rows}x{cols:<7}{legacy_ms:>12.1f}{new_ms:>12.1f}{legacy_ms / new_ms:>7.1f}x"
+              f"{diff.mean():>8.2f}{diff.max():>8d}{circle_ms:>12.1f}{butter_ms:>16.1f}")
+
+
+def legacy_connect_edges(edges, min_threshold=5, max_threshold=15):
+    """原 ImageProcessor.connect_edges 的实现（轮廓首尾端点 + Python网格逐点搜索），作为对照基准"""
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    connected = np.zeros_like(edges)
+    if len(contours) < 2:
+        return connected, 0
+    endpoints = []
+    for cnt in contours:
+        if len(cnt) >= 2:
+            endpoints.extend([tuple(cnt[0][0]), tuple(cnt[-1][0])])
+    grid = {}
+    grid_size = max(max_threshold, 5)
+    for idx, (x, y) in enumerate(endpoints):
+        grid.setdefault((x // grid_size, y // grid_size), []).append(idx)
+    cv2.drawContours(connected, contours, -1, 255, 1)
+    lines = 0
+    for i, (x, y) in enumerate(endpoints):
+        gx, gy = x // grid_size, y // grid_size
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((gx + dx, gy + dy), ()):
+                    if j <= i:
+                        continue
+                    x2, y2 = endpoints[j]
+                    distance = np.sqrt((x - x2)**2 + (y - y2)**2)
+                    if min_threshold <= distance <= max_threshold:
+                        cv2.line(connected, (x, y), (x2, y2), 255, 1)
+                        lines += 1
+    return connected, lines
+
+
+def bench_edges(args):
+    """在4K道路图像的Canny边缘图上对比新旧边缘连接的耗时（未平滑的路面纹理会产生大量短边缘）"""
+    processor = ImageProcessor()
+    print(f"{'边缘图':<16}{'边缘像素':>10}{'原实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}{'原连线数':>10}{'新增像素':>10}")
+    gray = cv2.cvtColor(synthetic_road_image(3840, 2160), cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    for name, source, low, high in (('平滑 100/200', blurred, 100, 200), ('平滑 30/90', blurred, 30, 90),
+                                    ('纹理 60/120', gray, 60, 120), ('纹理 30/90', gray, 30, 90)):
+        edges = cv2.Canny(source, low, high)
+        legacy_ms, (_, legacy_lines) = time_call(lambda: legacy_connect_edges(edges), args.repeat)
+        new_ms, connected = time_call(lambda: processor.connect_edges(edges), args.repeat)
+        added = int(np.count_nonzero(connected)) - int(np.count_nonzero(edges))
+        print(f"{name:<16}{np.count_nonzero(edges):>10}{legacy_ms:>12.1f}{new_ms:>12.1f}"
+              f"{legacy_ms / new_ms:>7.1f}x{legacy_lines:>10}{added:>10}")
+
+
+def bench_contours(args):
+    """对比逐轮廓过滤与连通域批量过滤在不同噪声密度掩码上的耗时，并校验结果一致"""
+    rng = np.random.default_rng(0)
+    print(f"{'掩码':<16}{'轮廓数':>8}{'保留':>6}{'原实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}{'一致':>6}")
+    gray = cv2.cvtColor(synthetic_road_image(1920, 1080), cv2.COLOR_BGR2GRAY)
+    masks = [('道路自适应阈值', cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                                     cv2.THRESH_BINARY_INV, 11, 2))]
+    for density in (0.05, 0.2, 0.4):
+        masks.append((f'随机噪声 {density:.0%}', ((rng.random(gray.shape) < density) * 255).astype(np.uint8)))
+    min_area = 200
+
+    def legacy(mask):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [(cnt, cv2.contourArea(cnt)) for cnt in contours if cv2.contourArea(cnt) >= min_area], len(contours)
+
+    for name, mask in masks:
+        legacy_ms, (expected, total) = time_call(lambda: legacy(mask), args.repeat)
+        new_ms, result = time_call(lambda: external_contours(mask, min_area), args.repeat)
+        same = len(expected) == len(result) and all(
+            np.array_equal(a[0], b[0]) for a, b in zip(expected, result))
+        print(f"{name:<16}{total:>8}{len(result):>6}{legacy_ms:>12.1f}{new_ms:>12.1f}"
+              f"{legacy_ms / new_ms:>7.1f}x{'是' if same else '否':>6}")
+
+
+def legacy_nms(boxes, iou_threshold=0.3):
+    """原 detect_defects_intelligent 中逐个保留框、用 np.delete 缩减下标数组的NMS，作为对照基准"""
+    areas = boxes[:, 2] * boxes[:, 3]
+    idxs = np.argsort(areas)[::-1]
+    keep = []
+    while len(idxs) > 0:
+        i = idxs[0]
+        keep.append(i)
+        if len(idxs) == 1:
+            break
+        xx1 = np.maximum(boxes[i, 0], boxes[idxs[1:], 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[idxs[1:], 1])
+        xx2 = np.minimum(boxes[i, 0] + boxes[i, 2], boxes[idxs[1:], 0] + boxes[idxs[1:], 2])
+        yy2 = np.minimum(boxes[i, 1] + boxes[i, 3], boxes[idxs[1:], 1] + boxes[idxs[1:], 3])
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+        overlap = (w * h) / (areas[idxs[1:]] + areas[i] - w * h)
+        idxs = np.delete(idxs, np.concatenate(([0], np.where(overlap > iou_threshold)[0] + 1)))
+    return keep
+
+
+def brute_force_pairs(boxes, iou_threshold, inclusive=False):
+    """用完整的IoU矩阵找出所有IoU超过阈值的框对，作为 box_ops.overlap_pairs 的对照"""
+    iou = box_ops.iou_matrix(boxes, boxes, inclusive)
+    return set(zip(*np.nonzero(np.triu(iou > iou_threshold, 1))))
+
+
+def check_overlap_pairs(rng):
+    """overlap_pairs 与完整IoU矩阵的结果是否一致，包括少数大框彼此重叠、周围有大量小框的情况"""
+    tiny = np.column_stack([rng.integers(0, 3000, (198, 2)) + 500, rng.integers(2, 6, (198, 2))])
+    cases = [(np.vstack([[[0, 0, 100, 100], [x, 0, 100, 100]], tiny]), threshold)
+             for x in (52, 90) for threshold in (0.0, 0.3)]
+    for n in (50, 500, 2000):
+        boxes = np.column_stack([rng.integers(0, 2000, (n, 2)), rng.integers(2, 40, (n, 2))])
+        big = rng.integers(0, n, max(n // 50, 2))
+        boxes[big, 2:] = rng.integers(100, 600, (len(big), 2))
+        cases += [(boxes, 0.0), (boxes, 0.3)]
+    for boxes, threshold in cases:
+        for inclusive in (False, True):
+            found = {tuple(sorted(pair)) for pair in box_ops.overlap_pairs(boxes, threshold, inclusive).tolist()}
+            if found != brute_force_pairs(boxes, threshold, inclusive):
+                return False
+    return True
+
+
+def bench_nms(args):
+    """在数千个候选框上对比原NMS循环与 box_ops 的各种NMS/融合方法"""
+    rng = np.random.default_rng(0)
+    print(f"overlap_pairs 与完整IoU矩阵一致: {'是' if check_overlap_pairs(rng) else '否'}")
+    print(f"{'框数':>8}{'原NMS(ms)':>12}{'nms(ms)':>10}{'加速':>8}{'3类原NMS':>12}{'batched':>10}"
+          f"{'soft_nms':>10}{'WBF':>10}{'保留一致':>8}")
+    for n in (500, 2000, 5000, 10000):
+        # 模拟多尺度检测：少量真实目标周围聚集大量抖动的候选框
+        centers = rng.integers(0, 3840, (max(n // 20, 1), 2))
+        picked = centers[rng.integers(0, len(centers), n)]
+        sizes = rng.integers(20, 200, (n, 2))
+        boxes = np.column_stack([picked + rng.integers(-15, 16, (n, 2)), sizes])
+        class_ids = rng.integers(0, 3, n)
+        areas = boxes[:, 2] * boxes[:, 3]
+
+        legacy_ms, expected = time_call(lambda: legacy_nms(boxes), args.repeat)
+        nms_ms, keep = time_call(lambda: box_ops.nms(boxes, box_ops.legacy_rank(areas), 0.3, inclusive=True),
+                                  args.repeat)
+        per_class_ms, _ = time_call(
+            lambda: [legacy_nms(boxes[class_ids == c]) for c in range(3)], args.repeat)
+        batched_ms, _ = time_call(
+            lambda: box_ops.batched_nms(boxes, areas, class_ids, 0.3, inclusive=True), args.repeat)
+        soft_ms, _ = time_call(lambda: box_ops.soft_nms(boxes, areas / areas.max()), 1)
+        wbf_ms, _ = time_call(lambda: box_ops.weighted_box_fusion(boxes, areas / areas.max(), class_ids), 1)
+        same = sorted(map(tuple, boxes[expected])) == sorted(map(tuple, boxes[keep]))
+        print(f"{n:>8}{legacy_ms:>12.1f}{nms_ms:>10.1f}{legacy_ms / nms_ms:>7.1f}x{per_class_ms:>12.1f}"
+              f"{batched_ms:>10.1f}{soft_ms:>10.1f}{wbf_ms:>10.1f}{'是' if same else '否':>8}")
+
+
+def legacy_enhance_chain(image, brightness, contrast):
+    """原 ImageProcessor 的增强实现（split/merge、int64锐化核和多余的 np.clip），之后再做亮度对比度调节"""
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    l = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(l)
+    l = cv2.GaussianBlur(l, (3, 3), 0)
+    enhanced = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+    kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+    enhanced = np.clip(cv2.filter2D(enhanced, -1, kernel), 0, 255).astype(np.uint8)
+    adjusted = enhanced.astype(np.float32)
+    mean = np.mean(adjusted)
+    adjusted = (adjusted - mean) * contrast + mean + brightness
+    return np.clip(adjusted, 0, 255).astype(np.uint8)
+
+
+def bench_enhance(args):
+    """对比原增强链（增强后再调亮度对比度）、逐个调用 image_ops 函数和 enhance_pipeline 的耗时"""
+    brightness, contrast = 15, 1.2
+    steps = list(image_ops.ENHANCE_STEPS) + [('brightness_contrast', {'brightness': brightness, 'contrast': contrast})]
+    print(f"{'尺寸':<12}{'原实现(ms)':>12}{'逐个调用(ms)':>14}{'流水线(ms)':>12}{'加速':>8}{'与逐个调用一致':>14}")
+    for rows, cols in [(720, 1280), (1080, 1920), (2160, 3840)]:
+        image = synthetic_road_image(cols, rows)
+        out = np.empty_like(image)
+        legacy_ms, _ = time_call(lambda: legacy_enhance_chain(image, brightness, contrast), args.repeat)
+        chain_ms, expected = time_call(lambda: image_ops.adjust_brightness_contrast(
+            image_ops.enhance_image(image), brightness, contrast), args.repeat)
+        fused_ms, result = time_call(lambda: image_ops.enhance_pipeline(image, steps, out), args.repeat)
+        same = np.array_equal(expected, result)
+        print(f"{rows}x{cols:<7}{legacy_ms:>12.1f}{chain_ms:>14.1f}{fused_ms:>12.1f}{legacy_ms / fused_ms:>7.1f}x"
+              f"{'是' if same else '否':>14}")
+
+
+# 内存基准中的各项操作：(名称, 函数, 输出数组的通道数；0 表示单通道)
+MEMORY_OPS = [
+    ('adjust', lambda image, out: image_ops.adjust_brightness_contrast(image, 20, 1.3, out=out), 3),
+    ('clahe', lambda image, out: image_ops.clahe_enhancement(image, out=out), 3),
+    ('enhance', lambda image, out: image_ops.enhance_image(image, out=out), 3),
+    ('fft', lambda image, out: image_ops.fft_filter(image, 30, out=out), 3),
+    ('edges', lambda image, out: image_ops.detect_edges(image, out=out), 3),
+    ('morph', lambda image, out: image_ops.morph(image, 'open', 5, out=out), 3),
+    ('cracks', lambda image, out: image_ops.detect_cracks_advanced(image, out=out), 3),
+    ('intelligent', lambda image, out: image_ops.detect_defects_intelligent(image, out=out), 3),
+]
+
+
+def _measure_memory(op_index, pooled, width, height, repeat):
+    """在当前进程中重复执行一项操作，返回 (耗时ms, 每次调用的峰值分配MB, 每次调用的缺页次数, 池分配数, 池复用数)
+
+    pooled 为False时关闭缓冲池且每次新分配输出（优化前），为True时启用缓冲池并复用同一个输出数组（优化后）。
+    """
+    _, func, channels = MEMORY_OPS[op_index]
+    image = synthetic_road_image(width, height)
+    DEFAULT_POOL.enabled = pooled
+    DEFAULT_POOL.clear()
+    out = np.empty(image.shape if channels == 3 else image.shape[:2], np.uint8) if pooled else None
+    func(image, out)  # 预热：首次调用填充缓冲池和各类缓存
+    DEFAULT_POOL.allocations = DEFAULT_POOL.reuses = 0
+
+    tracemalloc.start()
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    start = time.perf_counter()
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        func(image, out)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    elapsed = (time.perf_counter() - start) * 1000.0 / repeat
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, faults / repeat, DEFAULT_POOL.allocations / repeat, DEFAULT_POOL.reuses / repeat
+
+
+def _memory_worker(op_index, pooled, width, height, repeat, queue):
+    """在独立进程中测量，使峰值RSS只反映这一项操作"""
+    result = _measure_memory(op_index, pooled, width, height, repeat)
+    # Linux 上 ru_maxrss 的单位为KB
+    queue.put(result + (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,))
+
+
+def bench_memory(args):
+    """对比缓冲池和输出数组启用前后各项操作的耗时、内存分配和峰值RSS"""
+    width, height = 1920, 1080
+    repeat = max(args.repeat, 5)
+    context = multiprocessing.get_context('spawn')
+    print(f"图像尺寸 {width}x{height}，每项 {repeat} 次；峰值分配为 tracemalloc 统计的单次调用峰值，"
+          f"缺页为单次调用的次缺页中断数（新申请的内存首次写入时产生）")
+    print(f"{'操作':<12}{'配置':<6}{'耗时(ms)':>10}{'峰值分配(MB)':>14}{'缺页':>10}{'池分配':>8}{'池复用':>8}{'峰值RSS(MB)':>13}")
+    for op_index, (name, _, _) in enumerate(MEMORY_OPS):
+        for pooled in (False, True):
+            queue = context.Queue()
+            process = context.Process(target=_memory_worker,
+                                      args=(op_index, pooled, width, height, repeat, queue))
+            process.start()
+            elapsed, peak, faults, allocations, reuses, rss = queue.get()
+            process.join()
+            print(f"{name:<12}{'优化后' if pooled else '优化前':<6}{elapsed:>10.1f}{peak:>14.1f}{faults:>10.0f}"
+                  f"{allocations:>8.1f}{reuses:>8.1f}{rss:>13.1f}")
+
+
+def _lowmem_worker(low_memory, width, height, repeat, queue):
+    """在独立进程中测量一种模式的智能检测：(耗时ms, 单次调用峰值分配MB, 检测前RSS MB, 峰值RSS MB, 检测框)"""
+    image = synthetic_road_image(width, height)
+    image_ops.detect_defects_intelligent(image, low_memory=low_memory)  # 预热
+    # Linux 上 ru_maxrss 的单位为KB；预热后的峰值已包含一次检测，因此另取检测前的当前RSS作对照
+    with open('/proc/self/statm') as f:
+        base_rss = int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    tracemalloc.start()
+    elapsed, peak = float('inf'), 0
+    for _ in range(repeat):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        _, defects = image_ops.detect_defects_intelligent(image, low_memory=low_memory)
+        elapsed = min(elapsed, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    queue.put((elapsed * 1000.0, peak / 2**20, base_rss,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, defects.boxes.tolist()))
+
+
+def bench_lowmem(args):
+    """对比智能检测默认模式与低内存模式在不同图像尺寸下的耗时、内存峰值和检测结果"""
+    sizes = [(1080, 1920), (2160, 3840), (4320, 7680)]
+    context = multiprocessing.get_context('spawn')
+    print("峰值分配为 tracemalloc 统计的单次检测峰值；RSS在独立进程中测量（检测前 / 峰值）")
+    print(f"{'尺寸':<12}{'模式':<8}{'耗时(ms)':>10}{'峰值分配(MB)':>14}{'检测前RSS':>11}{'峰值RSS':>10}{'检测框':>8}{'与默认一致':>10}")
+    for rows, cols in sizes:
+        reference = None
+        for low_memory in (False, True):
+            queue = context.Queue()
+            process = context.Process(target=_lowmem_worker, args=(low_memory, cols, rows, args.repeat, queue))
+            process.start()
+            elapsed, peak, base_rss, max_rss, boxes = queue.get()
+            process.join()
+            reference = boxes if reference is None else reference
+            print(f"{rows}x{cols:<7}{'低内存' if low_memory else '默认':<8}{elapsed:>10.1f}{peak:>14.1f}{base_rss:>11.1f}"
+                  f"{max_rss:>10.1f}{len(boxes):>8}{'是' if boxes == reference else '否':>10}")
+
+
+def bench_budget(args):
+    """按预算检测：各预算下的实际耗时、超预算比例、执行的分支数以及与完整检测相比保留的检测框比例"""
+    start = time.perf_counter()
+    image_ops.default_cost_model()
+    print(f"启动标定耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
+    images = [image for _, image in load_images(args.input, args.count)]
+    full = []
+    for image in images:
+        full_ms, (_, defects) = time_call(lambda: image_ops.detect_defects_intelligent(image), 1)
+        full.append((full_ms, defects))
+    full_mean = np.mean([ms for ms, _ in full])
+    print(f"完整检测平均耗时 {full_mean:.1f} ms，{len(images)} 张图片")
+    print(f"{'预算(ms)':>10}{'平均耗时':>10}{'最大耗时':>10}{'超预算':>8}{'执行分支':>10}{'检测框召回':>10}")
+    for ratio in (1.5, 1.0, 0.75, 0.5, 0.25, 0.1):
+        budget_ms = full_mean * ratio
+        elapsed, ran, recalled, total = [], [], 0, 0
+        for image, (_, reference) in zip(images, full):
+            ms, (_, defects) = time_call(lambda: image_ops.detect_defects_intelligent(image, budget_ms=budget_ms), 1)
+            elapsed.append(ms)
+            ran.append(len(defects['budget']['ran']))
+            kept = set(map(tuple, defects.boxes.tolist()))
+            recalled += sum(tuple(box) in kept for box in reference.boxes.tolist())
+            total += len(reference)
+        elapsed = np.array(elapsed)
+        print(f"{budget_ms:>10.1f}{elapsed.mean():>10.1f}{elapsed.max():>10.1f}{np.mean(elapsed > budget_ms):>8.0%}"
+              f"{np.mean(ran):>10.1f}{recalled / max(total, 1):>10.0%}")
+
+
+def match_boxes(reference, defects, iou_threshold=0.5):
+    """同类别、IoU不低于阈值即视为一致，返回 (参考结果中被匹配的数量, 新结果中被匹配的数量)"""
+    ref_matched, new_matched = 0, 0
+    for class_id in range(len(image_ops.DEFECT_TYPES)):
+        a = reference.boxes[reference.class_ids == class_id]
+        b = defects.boxes[defects.class_ids == class_id]
+        if len(a) and len(b):
+            ious = box_ops.iou_matrix(a, b) >= iou_threshold
+            ref_matched += int(ious.any(axis=1).sum())
+            new_matched += int(ious.any(axis=0).sum())
+    return ref_matched, new_matched
+
+
+def bench_refine(args):
+    """由粗到精模式与逐尺度整幅处理的三尺度检测对比：耗时以及检测框一致性（同类别IoU>=0.5）"""
+    images = load_images(args.input, args.count)
+    print(f"{'图片':<30}{'三尺度(ms)':>12}{'粗到精(ms)':>12}{'加速':>8}{'原检测':>8}{'新检测':>8}{'召回':>8}{'精确':>8}")
+    totals = {'full_ms': 0.0, 'refine_ms': 0.0, 'full': 0, 'refine': 0, 'recalled': 0, 'precise': 0}
+    for name, image in images:
+        full_ms, (_, reference) = time_call(lambda: image_ops.detect_defects_intelligent(image), args.repeat)
+        refine_ms, (_, defects) = time_call(lambda: image_ops.detect_defects_intelligent(image, refine=True),
+                                            args.repeat)
+        recalled, precise = match_boxes(reference, defects)
+        print(f"{name[-30:]:<30}{full_ms:>12.1f}{refine_ms:>12.1f}{full_ms / max(refine_ms, 1e-6):>7.2f}x"
+              f"{len(reference):>8}{len(defects):>8}{recalled / max(len(reference), 1):>8.0%}"
+              f"{precise / max(len(defects), 1):>8.0%}")
+        totals['full_ms'] += full_ms
+        totals['refine_ms'] += refine_ms
+        totals['full'] += len(reference)
+        totals['refine'] += len(defects)
+        totals['recalled'] += recalled
+        totals['precise'] += precise
+
+    if images:
+        n = len(images)
+        print(f"平均耗时: 三尺度 {totals['full_ms'] / n:.1f} ms，粗到精 {totals['refine_ms'] / n:.1f} ms，"
+              f"加速 {totals['full_ms'] / max(totals['refine_ms'], 1e-6):.2f}x")
+        print(f"检测框一致性: 召回 {totals['recalled'] / max(totals['full'], 1):.1%}，"
+              f"精确 {totals['precise'] / max(totals['refine'], 1):.1%}")
+
+
+def legacy_morph(image, operation, size, shape='rect', iterations=1):
+    """原实现：每次调用新建结构元素，直接交给 cv2"""
+    kernel = cv2.getStructuringElement(morphology.SHAPES[shape], (size, size))
+    if operation == 'erode':
+        return cv2.erode(image, kernel, iterations=iterations)
+    if operation == 'dilate':
+        return cv2.dilate(image, kernel, iterations=iterations)
+    types = {'open': cv2.MORPH_OPEN, 'close': cv2.MORPH_CLOSE, 'gradient': cv2.MORPH_GRADIENT}
+    return cv2.morphologyEx(image, types[operation], kernel, iterations=iterations)
+
+
+def bench_morph(args):
+    """形态学运算：原实现与 morphology 模块（缓存结构元素、等价大核、矩形分解）的耗时对比"""
+    image = load_images(args.input, 1)[0][1]
+    mask = cv2.threshold(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 100, 255, cv2.THRESH_BINARY)[1]
+    cases = [('close', 5, 'rect', 7), ('gradient', 3, 'rect', 1), ('dilate', 21, 'rect', 1),
+             ('dilate', 161, 'rect', 1), ('close', 15, 'ellipse', 1), ('close', 41, 'ellipse', 1),
+             ('open', 81, 'ellipse', 1), ('dilate', 81, 'cross', 1)]
+    print(f"{'操作':<10}{'核':>6}{'形状':>9}{'迭代':>5}{'输入':>7}{'原实现(ms)':>12}{'新实现(ms)':>12}{'加速':>8}{'一致':>6}")
+    for operation, size, shape, iterations in cases:
+        for name, src in (('彩色', image), ('掩码', mask)):
+            old_ms, expected = time_call(lambda: legacy_morph(src, operation, size, shape, iterations), args.repeat)
+            new_ms, result = time_call(lambda: morphology.apply(src, operation, size, shape, iterations), args.repeat)
+            print(f"{operation:<10}{size:>6}{shape:>9}{iterations:>5}{name:>7}{old_ms:>12.2f}{new_ms:>12.2f}"
+                  f"{old_ms / max(new_ms, 1e-6):>7.2f}x{'是' if np.array_equal(expected, result) else '否':>6}")
+
+
+def bench_cvcache(args):
+    """缓存OpenCV算法对象前后的耗时对比：批量检测（整帧）和拖动滑块（小尺寸预览图上反复调节参数）"""
+    images = [image for _, image in load_images(args.input, args.count)]
+    previews = [cv2.resize(image, (320, 180), interpolation=cv2.INTER_AREA) for image in images]
+    clip_limits = np.linspace(1.0, 4.0, 30)
+
+    def batch():
+        for image in images:
+            image_ops.enhance_image(image)
+            image_ops.detect_cracks_advanced(image)
+            image_ops.detect_defects_intelligent(image)
+
+    def slider():
+        for preview in previews:
+            for clip_limit in clip_limits:
+                image_ops.clahe_enhancement(preview, clip_limit)
+                image_ops.enhance_pipeline(preview, [('sharpen', {'strength': clip_limit / 4})])
+
+    print(f"{'场景':<10}{'调用次数':>8}{'不缓存(ms)':>12}{'缓存(ms)':>10}{'加速':>8}")
+    for name, func, calls in (('批量检测', batch, len(images) * 3), ('滑块调节', slider, len(previews) * len(clip_limits) * 2)):
+        cv_cache.ENABLED = False
+        plain_ms, _ = time_call(func, args.repeat)
+        cv_cache.ENABLED = True
+        cv_cache.clear()
+        cached_ms, _ = time_call(func, args.repeat)
+        print(f"{name:<10}{calls:>8}{plain_ms:>12.1f}{cached_ms:>10.1f}{plain_ms / max(cached_ms, 1e-6):>7.2f}x")
+    print(f"缓存统计: {cv_cache.cache_info()}")
+
+
+def legacy_stats(image):
+    """原信息面板的统计方式：灰度图上分别求均值、标准差、中值（排序）、最值，float64 Sobel求平均梯度"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
+    return {'mean': float(np.mean(gray)), 'std': float(np.std(gray)), 'median': float(np.median(gray)),
+            'min': int(np.min(gray)), 'max': int(np.max(gray)),
+            'mean_gradient': float(np.mean(np.sqrt(grad_x**2 + grad_y**2)))}
+
+
+def bench_stats(args):
+    """图像统计：原实现、单次直方图统计（不缓存）和按版本缓存的耗时对比"""
+    images = [image for _, image in load_images(args.input, args.count)]
+    print(f"{'图像':<14}{'原实现(ms)':>12}{'直方图(ms)':>12}{'缓存命中(ms)':>14}{'加速':>8}{'最大误差':>10}")
+    for i, image in enumerate(images):
+        old_ms, expected = time_call(lambda: legacy_stats(image), args.repeat)
+        new_ms, result = time_call(lambda: image_stats.compute(image), args.repeat)
+        image_stats.DEFAULT_CACHE.clear()
+        image_stats.image_stats(image)
+        cached_ms, _ = time_call(lambda: image_stats.image_stats(image), args.repeat)
+        error = max(abs(expected[key] - result[key]) for key in expected)
+        print(f"{f'#{i} {image.shape[1]}x{image.shape[0]}':<14}{old_ms:>12.2f}{new_ms:>12.2f}{cached_ms:>14.3f}"
+              f"{old_ms / max(new_ms, 1e-6):>7.2f}x{error:>10.1e}")
+
+
+def legacy_histogram_pixmap(image, title):
+    """原界面的直方图绘制方式：每次新建matplotlib图形，绘制到Agg画布后转换为QPixmap"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PyQt5.QtGui import QImage, QPixmap
+
+    plt.figure(figsize=(5, 4))
+    plt.title(title, pad=10, fontsize=10)
+    for i, color in enumerate(('b', 'g', 'r')):
+        plt.plot(cv2.calcHist([image], [i], None, [256], [0, 256]), color=color, label=color)
+    plt.legend(loc='upper right', fontsize=8)
+    plt.xlim([0, 256])
+    canvas = FigureCanvasAgg(plt.gcf())
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    pixmap = QPixmap.fromImage(QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888))
+    plt.close()
+    return pixmap
+
+
+def bench_histogram(args):
+    """直方图显示：matplotlib出图（原实现）与 HistogramWidget 直接绘制的单次更新耗时对比（需要PyQt5）"""
+    import importlib.util
+    import os
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from histogram_widget import HistogramWidget
+
+    app = QApplication.instance() or QApplication([])  # 创建控件前需要QApplication，需保持引用
+    print(f"Qt平台: {app.platformName()}")
+    images = [image for _, image in load_images(args.input, args.count)]
+    widget = HistogramWidget()
+    widget.resize(500, 250)
+
+    def native(image):
+        # 与界面中一样复用同一个控件，grab 强制立即完成一次绘制
+        widget.set_image(image, '当前图像')
+        return widget.grab()
+
+    has_matplotlib = importlib.util.find_spec('matplotlib') is not None
+    if not has_matplotlib:
+        print("未安装matplotlib，只测试 HistogramWidget")
+    print(f"{'图像':<14}{'matplotlib(ms)':>16}{'QPainter(ms)':>14}{'加速':>8}")
+    for i, image in enumerate(images):
+        new_ms, _ = time_call(lambda: native(image), args.repeat)
+        old_ms = time_call(lambda: legacy_histogram_pixmap(image, '当前图像'), args.repeat)[0] if has_matplotlib else None
+        old_text = f"{old_ms:>16.1f}" if old_ms is not None else f"{'-':>16}"
+        speedup = f"{old_ms / max(new_ms, 1e-6):>7.1f}x" if old_ms is not None else f"{'-':>8}"
+        print(f"{f'#{i} {image.shape[1]}x{image.shape[0]}':<14}{old_text}{new_ms:>14.2f}{speedup}")
+
+
+def bench_roistats(args):
+    """ROI统计：对区域切片逐通道计算直方图和统计量（原实现）与积分直方图查询的耗时对比，模拟拖动ROI边缘"""
+    image = load_images(args.input, 1)[0][1]
+    height, width = image.shape[:2]
+    start = time.perf_counter()
+    region_stats = RegionStats(image)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(f"积分直方图: 分块 {region_stats.tile}，建表 {build_ms:.1f}ms，表大小 {region_stats.table.nbytes / 1e6:.1f}MB")
+
+    def legacy(x, y, w, h):
+        roi = image[y:y + h, x:x + w]
+        hists = [cv2.calcHist([roi], [i], None, [256], [0, 256]) for i in range(3)]
+        return hists, [(np.mean(roi[:, :, i]), np.std(roi[:, :, i]), np.min(roi[:, :, i]), np.max(roi[:, :, i]))
+                       for i in range(3)]
+
+    print(f"{'区域':<12}{'原实现(ms)':>12}{'积分直方图(ms)':>16}{'加速':>8}{'一致':>6}")
+    for fraction in (0.05, 0.25, 0.5, 0.9):
+        w, h = max(1, int(width * fraction)), max(1, int(height * fraction))
+        # 每次拖动一个像素，共30步
+        steps = [(7, 5, w + i, h) for i in range(30)]
+        old_ms, expected = time_call(lambda: [legacy(*rect) for rect in steps], args.repeat)
+        new_ms, result = time_call(lambda: [region_stats.stats(*rect) for rect in steps], args.repeat)
+        same = all(np.array_equal(np.stack([hist.ravel() for hist in old[0]]), new[1])
+                   and all(abs(a[0] - b['mean']) < 1e-9 and abs(a[1] - b['std']) < 1e-9 for a, b in zip(old[1], new[0]))
+                   for old, new in zip(expected, result))
+        print(f"{f'{w}x{h}':<12}{old_ms / len(steps):>12.3f}{new_ms / len(steps):>16.3f}"
+              f"{old_ms / max(new_ms, 1e-6):>7.1f}x{'是' if same else '否':>6}")
+
+
+BENCHMARKS = {
+    'roi': bench_roi,
+    'fft': bench_fft,
+    'edges': bench_edges,
+    'contours': bench_contours,
+    'nms': bench_nms,
+    'enhance': bench_enhance,
+    'memory': bench_memory,
+    'lowmem': bench_lowmem,
+    'budget': bench_budget,
+    'refine': bench_refine,
+    'morph': bench_morph,
+    'cvcache': bench_cvcache,
+    'stats': bench_stats,
+    'histogram': bench_histogram,
+    'roistats': bench_roistats,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--input', default=None, help='测试图片文件夹，默认使用合成道路图像')
+    parser.add_argument('--count', type=int, default=5, help='测试图片数量')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数（取最短耗时）')
+    parser.add_argument('--method', choices=['intelligent', 'ai'], default='intelligent')
+    parser.add_argument('--mode', choices=['bbox', 'segment', 'both'], default='bbox', help='AI检测模式')
+    parser.add_argument('--roi-config', default=None, help='路面ROI配置文件，默认自动估计路面')
+    parser.add_argument('--camera', default=None, help='ROI配置文件中的相机ID')
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
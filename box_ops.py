@@ -0,0 +1,221 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _as_boxes(boxes):
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def iou_matrix(boxes_a, boxes_b, inclusive=False):
+    """计算两组 (x, y, w, h) 边界框之间的IoU矩阵，形状为 (len(a), len(b))
+
+    inclusive为True时交集宽高按包含端点像素计算（+1），与 detect_defects_intelligent 原有的NMS一致。
+    """
+    a = _as_boxes(boxes_a)
+    b = _as_boxes(boxes_b)
+    pad = 1.0 if inclusive else 0.0
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, 0][:, None], b[:, 0][None, :]) + pad
+    ih = np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, 1][:, None], b[:, 1][None, :]) + pad
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def _score_order(scores):
+    # 稳定排序后倒序：分数相同时下标大的在前，且对整体排序与对某一类别单独排序得到的相对顺序相同。
+    # 原实现的 np.argsort（非稳定排序）只在元素很少时与此一致，需要原实现的顺序时用 legacy_rank 换算分数
+    return np.argsort(scores, kind='stable')[::-1]
+
+
+def legacy_rank(scores, class_ids=None):
+    """把分数换成互不相同的名次，使 nms / batched_nms 的保留顺序与原实现逐类别
+    np.argsort(scores)[::-1] 的顺序完全一致（包括分数相同的框）
+
+    原实现按类别分别排序，class_ids 给出时按类别分组换算，名次只在类别内有意义。
+    """
+    scores = np.asarray(scores)
+    rank = np.zeros(len(scores), np.int64)
+    groups = [np.arange(len(scores))] if class_ids is None else \
+        [np.flatnonzero(class_ids == c) for c in np.unique(class_ids)]
+    for idx in groups:
+        order = idx[np.argsort(scores[idx])[::-1]]
+        rank[order] = np.arange(len(idx), 0, -1)
+    return rank
+
+
+def _pair_iou(boxes, first, second, pad=0.0):
+    """逐对计算 boxes[first[k]] 与 boxes[second[k]] 的IoU"""
+    a, b = boxes[first], boxes[second]
+    iw = np.minimum(a[:, 0] + a[:, 2], b[:, 0] + b[:, 2]) - np.maximum(a[:, 0], b[:, 0]) + pad
+    ih = np.minimum(a[:, 1] + a[:, 3], b[:, 1] + b[:, 3]) - np.maximum(a[:, 1], b[:, 1]) + pad
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    union = a[:, 2] * a[:, 3] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def overlap_pairs(boxes, iou_threshold, inclusive=False):
+    """返回IoU超过阈值的所有框对 (i, j)，形状为 (K, 2)
+
+    两个框相交时中心点的切比雪夫距离不超过两框边长之和的一半，
+    因此用KD树按最大边长半径查找候选对；少数特别大的框按各自的边长单独查询，避免半径被拉大
+    （查询半径取自身边长与所有框中最大边长之和的一半，大框之间的框对也不会漏掉）。
+    """
+    boxes = _as_boxes(boxes)
+    n = len(boxes)
+    pad = 1.0 if inclusive else 0.0
+    size = np.maximum(boxes[:, 2], boxes[:, 3]) + 2 * pad
+    n_large = n // 100
+    radius = float(np.partition(size, n - 1 - n_large)[n - 1 - n_large])
+    centers = boxes[:, :2] + boxes[:, 2:] / 2
+    tree = cKDTree(centers)
+    pairs = tree.query_pairs(radius, p=np.inf, output_type='ndarray').reshape(-1, 2)
+
+    large = np.flatnonzero(size > radius)
+    if len(large) > 0:
+        neighbours = tree.query_ball_point(centers[large], (size[large] + size.max()) / 2, p=np.inf)
+        counts = np.array([len(items) for items in neighbours])
+        extra = np.column_stack([np.repeat(large, counts), np.concatenate(neighbours).astype(np.int64)])
+        pairs = np.concatenate([pairs, extra[extra[:, 0] != extra[:, 1]]])
+    if len(pairs) == 0:
+        return pairs.reshape(-1, 2)
+    return pairs[_pair_iou(boxes, pairs[:, 0], pairs[:, 1], pad) > iou_threshold]
+
+
+def nms(boxes, scores, iou_threshold=0.3, inclusive=False):
+    """贪心非极大值抑制，返回保留框的下标（按分数从高到低）
+
+    先一次性找出所有重叠超过阈值的框对（稀疏邻接表），
+    再按分数顺序逐个保留，只需把保留框的邻居标记为已抑制。
+    """
+    boxes = _as_boxes(boxes)
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, np.int64)
+    order = _score_order(np.asarray(scores))
+    pairs = overlap_pairs(boxes, iou_threshold, inclusive)
+
+    indptr, dst, _ = _adjacency(pairs, n)
+
+    suppressed = np.zeros(n, bool)
+    keep = []
+    for i in order.tolist():
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed[dst[indptr[i]:indptr[i + 1]]] = True
+    return np.asarray(keep, np.int64)
+
+
+def batched_nms(boxes, scores, class_ids, iou_threshold=0.3, inclusive=False):
+    """按类别分别做NMS，但只调用一次：把不同类别的框平移到互不重叠的区域
+
+    返回保留框的下标（按分数从高到低）
+    """
+    boxes = _as_boxes(boxes)
+    if len(boxes) == 0:
+        return np.zeros(0, np.int64)
+    class_ids = np.asarray(class_ids)
+    extent = float((boxes[:, :2] + boxes[:, 2:]).max() - min(boxes[:, :2].min(), 0.0)) + 2.0
+    shifted = boxes.copy()
+    shifted[:, :2] += (class_ids.astype(np.float64) * extent)[:, None]
+    return nms(shifted, scores, iou_threshold, inclusive)
+
+
+def _adjacency(pairs, n, values=None):
+    """把框对转换为无向邻接表（CSR格式），返回 (indptr, 邻居下标, 对应的值)"""
+    src = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    dst = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    order = np.argsort(src, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))])
+    if values is not None:
+        values = np.concatenate([values, values])[order]
+    return indptr, dst[order], values
+
+
+def soft_nms(boxes, scores, iou_threshold=0.3, sigma=0.5, method='gaussian', score_threshold=0.001):
+    """Soft-NMS：不直接删除重叠框，而是按重叠程度降低其分数
+
+    method: 'gaussian'（分数乘以 exp(-iou²/sigma)）或 'linear'（IoU超过阈值时乘以 1-iou）。
+    只有相交的框之间会互相衰减，因此同样基于稀疏的相交框对计算。
+    返回 (保留框下标, 衰减后的分数)，按衰减后分数从高到低排列。
+    """
+    if method not in ('gaussian', 'linear'):
+        raise ValueError(f"不支持的Soft-NMS方式: {method}")
+    boxes = _as_boxes(boxes)
+    scores = np.asarray(scores, dtype=np.float64).copy()
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, np.int64), scores
+    pairs = overlap_pairs(boxes, 0.0)
+    indptr, neighbours, ious = _adjacency(pairs, n, _pair_iou(boxes, pairs[:, 0], pairs[:, 1]))
+    if method == 'gaussian':
+        decay = np.exp(-(ious * ious) / sigma)
+    else:
+        decay = np.where(ious > iou_threshold, 1.0 - ious, 1.0)
+
+    alive = scores >= score_threshold
+    keep = []
+    while True:
+        best = int(np.argmax(np.where(alive, scores, -np.inf)))
+        if not alive[best]:
+            break
+        keep.append(best)
+        alive[best] = False
+        start, end = indptr[best], indptr[best + 1]
+        targets = neighbours[start:end]
+        active = alive[targets]
+        targets = targets[active]
+        scores[targets] *= decay[start:end][active]
+        alive[targets[scores[targets] < score_threshold]] = False
+    keep = np.asarray(keep, np.int64)
+    return keep, scores[keep]
+
+
+def weighted_box_fusion(boxes, scores, class_ids=None, iou_threshold=0.55):
+    """加权框融合（WBF），用于合并多个模型或多个尺度对同一目标的检测
+
+    按分数从高到低把每个框归入IoU超过阈值的已有簇（同类别），簇的坐标为成员框按分数加权的平均，
+    分数为成员平均分。返回 (融合后的框, 分数, 类别)。
+    """
+    boxes = _as_boxes(boxes)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    class_ids = np.zeros(len(boxes), np.int64) if class_ids is None else np.asarray(class_ids)
+    if len(boxes) == 0:
+        return boxes, scores, class_ids
+
+    fused_boxes, fused_scores, fused_classes = [], [], []
+    for cls in np.unique(class_ids):
+        idx = np.flatnonzero(class_ids == cls)
+        idx = idx[_score_order(scores[idx])]
+        # 每个簇累计的权重、加权角点坐标和成员数，融合框随成员加入实时更新
+        weight_sum = np.zeros(len(idx))
+        corner_sum = np.zeros((len(idx), 4))
+        members = np.zeros(len(idx), np.int64)
+        centers = np.zeros((len(idx), 4))
+        count = 0
+        for box, weight in zip(boxes[idx], scores[idx]):
+            k = -1
+            if count > 0:
+                overlap = iou_matrix(box, centers[:count])[0]
+                best = int(np.argmax(overlap))
+                if overlap[best] > iou_threshold:
+                    k = best
+            if k < 0:
+                k = count
+                count += 1
+            weight_sum[k] += weight
+            corner_sum[k] += weight * np.array([box[0], box[1], box[0] + box[2], box[1] + box[3]])
+            members[k] += 1
+            c = corner_sum[k] / max(weight_sum[k], 1e-12)
+            centers[k] = (c[0], c[1], c[2] - c[0], c[3] - c[1])
+        fused_boxes.append(centers[:count])
+        fused_scores.append(weight_sum[:count] / members[:count])
+        fused_classes.append(np.full(count, cls))
+
+    fused_boxes = np.concatenate(fused_boxes)
+    fused_scores = np.concatenate(fused_scores)
+    fused_classes = np.concatenate(fused_classes)
+    order = _score_order(fused_scores)
+    return fused_boxes[order], fused_scores[order], fused_classes[order]
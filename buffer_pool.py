@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# 默认的空闲数组总量上限：足够容纳4K图像上单个操作的全部中间结果
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class BufferPool:
+    """按 (形状, 数据类型) 回收帧大小的临时数组
+
+    连续处理同一分辨率的图像时，每次调用所需的中间结果（灰度图、LAB图、浮点缓冲等）
+    尺寸都相同，从池中取用并在用完后归还，避免每帧重新申请和释放大块内存。
+    取出的数组内容未初始化，在归还之前只属于取用者，可被多个线程共享使用。
+    处理不同分辨率的图像时每种尺寸都会留下空闲数组，总量超过 max_bytes 时按最久未用的
+    (形状, 数据类型) 依次丢弃，只有近期反复使用的尺寸留在池中。
+
+    max_per_key: 每种 (形状, 数据类型) 最多保留的空闲数组数
+    max_bytes: 所有空闲数组的总字节数上限
+    enabled: 为False时不复用，每次都重新分配（用于对比测试）
+    """
+
+    def __init__(self, max_per_key=4, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        if max_per_key < 0 or max_bytes < 0:
+            raise ValueError("缓冲池的容量上限必须为非负数")
+        self.max_per_key = max_per_key
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._free = OrderedDict()  # 按最近使用排序，最久未用的在前
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """取出一个指定形状和类型的数组（内容未初始化）"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        if self.enabled:
+            with self._lock:
+                free = self._free.get(key)
+                if free:
+                    self._free.move_to_end(key)
+                    self.reuses += 1
+                    array = free.pop()
+                    self._bytes -= array.nbytes
+                    return array
+                self.allocations += 1
+        else:
+            self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def release(self, array):
+        """归还 acquire 取出的数组，归还后调用方不能再使用它"""
+        if not self.enabled or array is None or array.base is not None:
+            return
+        key = (array.shape, array.dtype.str)
+        if array.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(free) < self.max_per_key and not any(item is array for item in free):
+                free.append(array)
+                self._bytes += array.nbytes
+                self._evict()
+
+    def _evict(self):
+        """总量超过 max_bytes 时从最久未用的尺寸开始丢弃空闲数组"""
+        while self._bytes > self.max_bytes and self._free:
+            key, free = next(iter(self._free.items()))
+            if free:
+                self._bytes -= free.pop(0).nbytes
+            if not free:
+                del self._free[key]
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        """with 语句中使用的临时数组，退出时自动归还"""
+        array = self.acquire(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.release(array)
+
+    @contextmanager
+    def scope(self):
+        """with 语句中可多次取用的一组临时数组，退出时全部归还
+
+        用法: with pool.scope() as acquire: gray = acquire(shape)
+        不复用时（enabled=False）不保留取出的数组，调用方删除引用后即可释放。
+        """
+        arrays = []
+
+        def acquire(shape, dtype=np.uint8):
+            array = self.acquire(shape, dtype)
+            if self.enabled:
+                arrays.append(array)
+            return array
+
+        try:
+            yield acquire
+        finally:
+            for array in arrays:
+                self.release(array)
+
+    def set_max_bytes(self, max_bytes):
+        """修改总字节数上限，超出的部分立即丢弃"""
+        if max_bytes < 0:
+            raise ValueError("缓冲池的容量上限必须为非负数")
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._bytes = 0
+
+    def nbytes(self):
+        """池中空闲数组占用的字节数"""
+        with self._lock:
+            return self._bytes
+
+
+# image_ops 默认使用的全局缓冲池
+DEFAULT_POOL = BufferPool()
+
+
+def output_array(out, shape, dtype=np.uint8):
+    """返回写入结果的数组：out 不为None时检查其形状和类型后直接使用，否则新分配
+
+    OpenCV 的 dst 参数在形状或类型不符时会静默地重新分配，因此必须先检查。
+    """
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != tuple(shape) or out.dtype != np.dtype(dtype) or not out.flags.c_contiguous:
+        raise ValueError(f"输出数组的形状或类型不匹配（或不连续）: 需要 {tuple(shape)} {np.dtype(dtype)}，"
+                         f"实际为 {out.shape} {out.dtype}")
+    return out
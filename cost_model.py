@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+
+
+class StageCostModel:
+    """各处理阶段的耗时模型：耗时(ms) = a * 像素数(百万) + b
+
+    由启动时的实测数据拟合（fit），运行中再用实际耗时按指数滑动平均修正各阶段的比例系数
+    （observe），以适应当前设备负载和图像纹理。
+    coefficients: {阶段名: (a, b)}
+    ema_alpha: 在线修正的平滑系数
+    """
+
+    def __init__(self, coefficients=None, ema_alpha=0.2):
+        self.coefficients = {stage: (float(a), float(b)) for stage, (a, b) in (coefficients or {}).items()}
+        self.ema_alpha = ema_alpha
+        self.corrections = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fit(cls, samples, ema_alpha=0.2):
+        """由实测样本 [(阶段名, 像素数, 耗时ms), ...] 拟合各阶段的线性模型
+
+        同一阶段只有一种像素数时退化为过原点的比例模型；系数截断为非负。
+        """
+        by_stage = {}
+        for stage, pixels, ms in samples:
+            by_stage.setdefault(stage, []).append((pixels / 1e6, ms))
+        coefficients = {}
+        for stage, points in by_stage.items():
+            mp, ms = np.array(points, np.float64).T
+            if len(np.unique(mp)) >= 2:
+                a, b = np.polyfit(mp, ms, 1)
+            else:
+                a, b = float(np.sum(ms) / max(np.sum(mp), 1e-9)), 0.0
+            if a < 0:
+                a, b = 0.0, float(ms.mean())
+            coefficients[stage] = (a, max(b, 0.0))
+        return cls(coefficients, ema_alpha)
+
+    def predict(self, stage, pixels):
+        """预测某阶段处理 pixels 个像素的耗时(ms)，未标定的阶段返回0"""
+        if stage not in self.coefficients:
+            return 0.0
+        a, b = self.coefficients[stage]
+        return (a * pixels / 1e6 + b) * self.corrections.get(stage, 1.0)
+
+    def observe(self, stage, pixels, ms):
+        """用一次实测耗时修正该阶段的预测"""
+        if stage not in self.coefficients:
+            return
+        a, b = self.coefficients[stage]
+        base = a * pixels / 1e6 + b
+        if base <= 0:
+            return
+        with self._lock:
+            correction = self.corrections.get(stage, 1.0)
+            self.corrections[stage] = (1 - self.ema_alpha) * correction + self.ema_alpha * (ms / base)
+
+    def plan(self, shape, scales, budget_ms, branches, overhead_ms=0.0):
+        """在预算内选择要执行的 (尺度, 分支)
+
+        先保证原始尺度（1.0），其余尺度按开销从小到大；同一尺度内按 branches 的顺序，
+        每个尺度的第一个分支还要计入该尺度的预处理开销（'prep'）。预算放不下的单元记入跳过列表，
+        后面更便宜的单元仍可选入。
+        返回 ({尺度: [分支, ...]}, [(尺度, 分支), ...] 跳过的单元, 预测总耗时ms)
+        """
+        remaining = budget_ms - overhead_ms
+        predicted = overhead_ms
+        selected, skipped = {}, []
+        for scale in sorted(scales, key=lambda s: (s != 1.0, s)):
+            pixels = round(shape[0] * scale) * round(shape[1] * scale)
+            prep = self.predict('prep', pixels)
+            for branch in branches:
+                cost = self.predict(branch, pixels) + (0.0 if scale in selected else prep)
+                if cost <= remaining:
+                    selected.setdefault(scale, []).append(branch)
+                    remaining -= cost
+                    predicted += cost
+                else:
+                    skipped.append((scale, branch))
+        return selected, skipped, predicted
+
+    def to_dict(self):
+        return {'coefficients': {stage: list(ab) for stage, ab in self.coefficients.items()},
+                'corrections': dict(self.corrections)}
+
+    @classmethod
+    def from_dict(cls, data, ema_alpha=0.2):
+        model = cls(data.get('coefficients'), ema_alpha)
+        model.corrections = dict(data.get('corrections', {}))
+        return model
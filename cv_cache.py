@@ -0,0 +1,81 @@
+import threading
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+
+# 按参数缓存的OpenCV算法对象和常量数组。
+# CLAHE 等算法对象内部保存中间缓冲，不能被多个线程同时使用，因此每个线程各缓存一份；
+# 常量数组（卷积核等）只读，所有线程共享同一份。
+
+_local = threading.local()
+
+# 为False时不缓存，每次调用都新建对象（用于对比测试）
+ENABLED = True
+
+
+def _objects():
+    objects = getattr(_local, 'objects', None)
+    if objects is None:
+        objects = _local.objects = {}
+        _local.hits = 0
+        _local.misses = 0
+    return objects
+
+
+def clahe(clip_limit=2.0, tile_size=8):
+    """当前线程的CLAHE对象，按网格大小缓存，裁剪阈值在取用时设置
+
+    裁剪阈值常由图像统计量连续计算（如坑洼分支），按网格大小缓存可避免为每个阈值各保存一个对象；
+    同一对象重复使用时，内部的查找表和缓冲不必每次重新分配。
+    """
+    objects = _objects()
+    key = ('clahe', tile_size)
+    obj = objects.get(key) if ENABLED else None
+    if obj is None:
+        _local.misses += 1
+        obj = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
+        if ENABLED:
+            objects[key] = obj
+    else:
+        _local.hits += 1
+        if obj.getClipLimit() != clip_limit:
+            obj.setClipLimit(clip_limit)
+    return obj
+
+
+def cache_info():
+    """当前线程的缓存统计：{'objects': 缓存的对象数, 'hits': 命中次数, 'misses': 新建次数}"""
+    objects = _objects()
+    return {'objects': len(objects), 'hits': _local.hits, 'misses': _local.misses}
+
+
+def clear():
+    """清空当前线程缓存的算法对象"""
+    _objects().clear()
+    _local.hits = 0
+    _local.misses = 0
+
+
+# 锐化卷积核
+SHARPEN_KERNEL = np.array([[-1,-1,-1],
+                           [-1, 9,-1],
+                           [-1,-1,-1]], np.float32)
+SHARPEN_KERNEL.flags.writeable = False
+
+
+def sharpen_kernel(strength=1):
+    """按强度在恒等核与 SHARPEN_KERNEL 之间插值的锐化核（只读），strength 为1时即 SHARPEN_KERNEL"""
+    return _sharpen_kernel(strength) if ENABLED else _sharpen_kernel.__wrapped__(strength)
+
+
+@lru_cache(maxsize=32)
+def _sharpen_kernel(strength):
+    if strength == 1:
+        return SHARPEN_KERNEL
+    identity = np.zeros((3, 3), np.float32)
+    identity[1, 1] = 1
+    kernel = identity + np.float32(strength) * (SHARPEN_KERNEL - identity)
+    kernel.flags.writeable = False
+    return kernel
@@ -0,0 +1,231 @@
+from collections import deque
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from box_ops import iou_matrix
+from detections import DEFECT_TYPES
+
+
+def _empty_summary():
+    return {'count': 0, 'total_area': 0, 'max_area': 0}
+
+
+def _add_to_summary(entry, area):
+    entry['count'] += 1
+    entry['total_area'] += area
+    entry['max_area'] = max(entry['max_area'], area)
+
+
+class DefectTracker:
+    """跨帧缺陷跟踪器
+
+    对连续帧的检测框做IoU/质心关联，为同一处物理缺陷分配固定的ID，
+    避免同一个坑洼在多帧中被重复计数。按缺陷类型分别跟踪。
+
+    iou_threshold: 关联所需的最小相似度
+    max_centroid_distance: 质心距离（以轨迹框尺寸归一化）小于该值时也视为相似，
+        用于车辆行驶中相邻帧IoU偏低的情况；设为0则只使用IoU
+    max_missed: 轨迹超过多少帧未被匹配后结束（按源帧编号计算，丢弃的帧也计入）
+    min_hits: 轨迹至少被检测到多少次才输出为有效缺陷
+    matcher: 'hungarian'（全局最优）或 'greedy'（按相似度贪心）
+    max_finished: 保留多少条已结束轨迹的详细记录（见 records()）；
+        已结束的轨迹在结束时计入 summary() 的数量和面积汇总，长时间运行时内存不随轨迹数增长
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=1.0, max_missed=3,
+                 min_hits=1, matcher='hungarian', max_finished=1000):
+        if matcher not in ('hungarian', 'greedy'):
+            raise ValueError(f"不支持的匹配方式: {matcher}")
+        if max_finished < 0:
+            raise ValueError("max_finished 必须为非负数")
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.matcher = matcher
+        self.max_finished = max_finished
+        self.reset()
+
+    def reset(self):
+        self.frame_index = -1
+        self.next_id = 1
+        self.active = {defect_type: [] for defect_type in DEFECT_TYPES}
+        self.finished = deque(maxlen=self.max_finished)  # 最近结束的轨迹的汇总记录
+        self._retired = {defect_type: _empty_summary() for defect_type in DEFECT_TYPES}
+
+    def update(self, boxes, scores=None, defect_type='potholes'):
+        """输入当前帧某一类型的检测框，返回每个框对应的缺陷ID列表
+
+        同一帧的多个类型应依次调用本方法后再调用 next_frame()，
+        或直接使用 update_defects() 一次处理整帧。
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.ones(len(boxes), np.float32) if scores is None else np.asarray(scores, np.float32)
+        tracks = self.active.setdefault(defect_type, [])
+        frame = max(self.frame_index, 0)
+
+        matches = self._associate(tracks, boxes)
+        ids = [0] * len(boxes)
+        matched_tracks = set()
+        for t, d in matches:
+            track = tracks[t]
+            self._update_track(track, boxes[d], scores[d], frame)
+            matched_tracks.add(t)
+            ids[d] = track['track_id']
+
+        for d in range(len(boxes)):
+            if ids[d] == 0:
+                track = self._new_track(boxes[d], scores[d], frame, defect_type)
+                tracks.append(track)
+                ids[d] = track['track_id']
+
+        for t, track in enumerate(tracks):
+            if t not in matched_tracks:
+                track['missed'] = frame - track['last_frame']
+
+        self.active[defect_type] = [t for t in tracks if t['missed'] <= self.max_missed]
+        for track in tracks:
+            if track['missed'] > self.max_missed:
+                self._retire(track)
+        return ids
+
+    def _retire(self, track):
+        """结束一条轨迹：计入汇总，只保留其汇总记录"""
+        record = self._record(track)
+        if record is None:
+            return
+        _add_to_summary(self._retired.setdefault(record['defect_type'], _empty_summary()), record['area'])
+        self.finished.append(record)
+
+    def update_defects(self, defects, frame_id=None):
+        """处理一帧 detect_defects_ai / detect_defects_intelligent 的输出
+
+        frame_id: 源帧编号（如 LatestFrameBuffer 给出的编号），实时流丢帧时据此计算轨迹间隔；
+            不传时按调用次数计帧
+        返回 {缺陷类型: [ID, ...]}，与 defects.select(缺陷类型) 中的框一一对应
+        """
+        self.next_frame(frame_id)
+        ids = {}
+        for defect_type in DEFECT_TYPES:
+            found = defects.select(defect_type)
+            ids[defect_type] = self.update(found.boxes, found.scores, defect_type=defect_type)
+        return ids
+
+    def next_frame(self, frame_id=None):
+        """进入下一帧；传入源帧编号时直接使用该编号（必须递增）"""
+        if frame_id is None:
+            self.frame_index += 1
+        elif frame_id <= self.frame_index:
+            raise ValueError(f"帧编号必须递增: {frame_id} <= {self.frame_index}")
+        else:
+            self.frame_index = frame_id
+
+    def _associate(self, tracks, boxes):
+        """计算轨迹与检测框的相似度矩阵并匹配，返回 [(轨迹下标, 检测下标), ...]"""
+        if not tracks or len(boxes) == 0:
+            return []
+        predicted = np.array([self._predict(t) for t in tracks], dtype=np.float32)
+        affinity = iou_matrix(predicted, boxes)
+
+        if self.max_centroid_distance > 0:
+            track_c = predicted[:, :2] + predicted[:, 2:] / 2
+            det_c = boxes[:, :2] + boxes[:, 2:] / 2
+            dist = np.linalg.norm(track_c[:, None, :] - det_c[None, :, :], axis=2)
+            scale = np.sqrt(predicted[:, 2] * predicted[:, 3])[:, None] + 1e-6
+            centroid_affinity = 1.0 - dist / (scale * self.max_centroid_distance)
+            affinity = np.maximum(affinity, centroid_affinity)
+
+        if self.matcher == 'hungarian':
+            rows, cols = linear_sum_assignment(-affinity)
+            keep = affinity[rows, cols] >= self.iou_threshold
+            return list(zip(rows[keep].tolist(), cols[keep].tolist()))
+
+        # 贪心匹配：按相似度从高到低依次接受未被占用的配对
+        flat = np.argsort(affinity, axis=None)[::-1]
+        rows, cols = np.unravel_index(flat, affinity.shape)
+        valid = affinity[rows, cols] >= self.iou_threshold
+        used_t, used_d, matches = set(), set(), []
+        for t, d in zip(rows[valid].tolist(), cols[valid].tolist()):
+            if t not in used_t and d not in used_d:
+                used_t.add(t)
+                used_d.add(d)
+                matches.append((t, d))
+        return matches
+
+    def _predict(self, track):
+        """按匀速模型预测轨迹在当前帧的位置"""
+        gap = max(self.frame_index, 0) - track['last_frame']
+        box = track['box'].copy()
+        box[:2] += track['velocity'] * gap
+        return box
+
+    def _new_track(self, box, score, frame, defect_type):
+        track = {
+            'track_id': self.next_id,
+            'defect_type': defect_type,
+            'box': box.copy(),
+            'velocity': np.zeros(2, np.float32),
+            'best_box': box.copy(),
+            'best_score': float(score),
+            'max_area': float(box[2] * box[3]),
+            'first_frame': frame,
+            'last_frame': frame,
+            'hits': 1,
+            'missed': 0,
+        }
+        self.next_id += 1
+        return track
+
+    def _update_track(self, track, box, score, frame):
+        gap = max(frame - track['last_frame'], 1)
+        velocity = (box[:2] - track['box'][:2]) / gap
+        track['velocity'] = 0.5 * track['velocity'] + 0.5 * velocity
+        track['box'] = box.copy()
+        track['last_frame'] = frame
+        track['hits'] += 1
+        track['missed'] = 0
+        area = float(box[2] * box[3])
+        # 以面积最大（通常离相机最近、最完整）的一次检测作为该缺陷的代表
+        if area > track['max_area']:
+            track['max_area'] = area
+            track['best_box'] = box.copy()
+        track['best_score'] = max(track['best_score'], float(score))
+
+    def _record(self, track):
+        """轨迹的汇总记录，检测次数不足 min_hits 时返回None"""
+        if track['hits'] < self.min_hits:
+            return None
+        x, y, w, h = (int(round(v)) for v in track['best_box'])
+        return {
+            'track_id': track['track_id'],
+            'defect_type': track['defect_type'],
+            'box': (x, y, w, h),
+            'area': int(round(track['max_area'])),
+            'score': track['best_score'],
+            'first_frame': track['first_frame'],
+            'last_frame': track['last_frame'],
+            'hits': track['hits'],
+        }
+
+    def _active_records(self):
+        records = (self._record(track) for tracks in self.active.values() for track in tracks)
+        return [record for record in records if record is not None]
+
+    def records(self, include_active=True):
+        """返回每处物理缺陷一条的汇总记录（已结束的轨迹只保留最近 max_finished 条）"""
+        records = list(self.finished)
+        if include_active:
+            records.extend(self._active_records())
+        return sorted(records, key=lambda record: record['track_id'])
+
+    def summary(self):
+        """按缺陷类型汇总去重后的数量和面积（包括所有已结束的轨迹）
+
+        返回 {缺陷类型: {'count': 数量, 'total_area': 面积之和, 'max_area': 最大面积}}，
+        各处缺陷的面积见 records()
+        """
+        summary = {defect_type: dict(entry) for defect_type, entry in self._retired.items()}
+        for record in self._active_records():
+            _add_to_summary(summary.setdefault(record['defect_type'], _empty_summary()), record['area'])
+        return summary
@@ -0,0 +1,292 @@
+import io
+import json
+
+import numpy as np
+
+
+DEFECT_TYPES = ('cracks', 'potholes', 'water')
+
+
+def rle_encode(mask):
+    """按行优先顺序对二值掩码做游程编码，第一个游程为0值像素（可以为0长度）"""
+    flat = np.asarray(mask, bool).ravel()
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate([[0], changes, [flat.size]])
+    counts = np.diff(bounds)
+    if flat.size and flat[0]:
+        counts = np.concatenate([[0], counts])
+    return counts.astype(np.int32)
+
+
+def rle_decode(counts, shape):
+    """将 rle_encode 的结果还原为布尔掩码"""
+    values = np.zeros(len(counts), bool)
+    values[1::2] = True
+    return np.repeat(values, counts).reshape(shape)
+
+
+def _jsonable(value):
+    """把检测结果附加信息中的NumPy类型转换为可JSON序列化的Python类型"""
+    if isinstance(value, Detections):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class Detections:
+    """检测结果容器，按结构数组存储
+
+    boxes: (N, 4) int32，(x, y, w, h)
+    scores: (N,) float32 置信度（传统方法没有置信度，为1）
+    class_ids: (N,) int32，对应 class_names 中的类别
+    areas: (N,) int64，面积（有掩码时为掩码像素数，否则为框面积）
+    掩码可选，以游程编码存储：所有掩码的游程拼接在 mask_counts 中，
+    第 i 个掩码为 mask_counts[mask_starts[i]:mask_ends[i]]，子集和切片共享同一份游程数据。
+    track_ids: 可选，(N,) int64 跨帧跟踪的缺陷ID（见 defect_tracker），取子集时随检测框一起索引
+    meta: 整组结果的附加信息（如 'quality'、'roi'、'stats'），子集和变换后的副本各自持有一份浅拷贝；
+        与单个检测框对应的数据不要放在 meta 中
+
+    为兼容原来的字典格式，defects['cracks'] 返回该类别的 (N, 4) 边界框数组，
+    其余字符串键读写 meta。
+    """
+
+    def __init__(self, boxes=None, scores=None, class_ids=None, areas=None, class_names=DEFECT_TYPES,
+                 mask_counts=None, mask_starts=None, mask_ends=None, mask_shape=None, meta=None,
+                 track_ids=None):
+        self.boxes = np.asarray(np.zeros((0, 4)) if boxes is None else boxes).astype(np.int32, copy=False).reshape(-1, 4)
+        n = len(self.boxes)
+        self.scores = (np.ones(n, np.float32) if scores is None
+                       else np.asarray(scores).astype(np.float32, copy=False).reshape(n))
+        self.class_ids = (np.zeros(n, np.int32) if class_ids is None
+                          else np.asarray(class_ids).astype(np.int32, copy=False).reshape(n))
+        self.areas = (self.boxes[:, 2].astype(np.int64) * self.boxes[:, 3] if areas is None
+                      else np.asarray(areas).astype(np.int64, copy=False).reshape(n))
+        self.class_names = tuple(class_names)
+        self.mask_counts = mask_counts
+        self.mask_starts = mask_starts
+        self.mask_ends = mask_ends
+        self.mask_shape = None if mask_shape is None else tuple(mask_shape)
+        self.meta = {} if meta is None else meta
+        self.track_ids = None if track_ids is None else np.asarray(track_ids).astype(np.int64, copy=False).reshape(n)
+
+    @classmethod
+    def empty(cls, class_names=DEFECT_TYPES, meta=None):
+        return cls(class_names=class_names, meta=meta)
+
+    @classmethod
+    def from_xyxy(cls, xyxy, scores=None, class_ids=None, class_names=DEFECT_TYPES, masks=None, meta=None):
+        """由 (x1, y1, x2, y2) 坐标创建，masks 为 (N, H, W) 二值掩码时编码后一并保存
+
+        坐标先截断为整数（与 int() 一致）再换算宽高。
+        """
+        xyxy = np.asarray(xyxy, np.float64).reshape(-1, 4).astype(np.int32)
+        xywh = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]])
+        detections = cls(xywh, scores, class_ids, class_names=class_names, meta=meta)
+        if masks is not None and len(masks) == len(xywh):
+            detections.set_masks(masks)
+        return detections
+
+    @classmethod
+    def from_lists(cls, boxes_by_type, class_names=DEFECT_TYPES, meta=None):
+        """由 {类别: [(x, y, w, h), ...]} 形式的旧格式创建"""
+        boxes, class_ids = [], []
+        for class_id, name in enumerate(class_names):
+            items = list(boxes_by_type.get(name, []))
+            boxes.extend(items)
+            class_ids.extend([class_id] * len(items))
+        return cls(boxes, class_ids=class_ids, class_names=class_names, meta=meta)
+
+    @classmethod
+    def concatenate(cls, items, meta=None):
+        """拼接多组类别相同的检测结果"""
+        items = [item for item in items if item is not None]
+        if not items:
+            return cls.empty(meta=meta)
+        class_names = items[0].class_names
+        if any(item.class_names != class_names for item in items):
+            raise ValueError("只能拼接类别相同的检测结果")
+        result = cls(np.concatenate([item.boxes for item in items]),
+                     np.concatenate([item.scores for item in items]),
+                     np.concatenate([item.class_ids for item in items]),
+                     np.concatenate([item.areas for item in items]),
+                     class_names, meta=meta)
+        if all(item.has_masks for item in items) and len(result):
+            counts, starts, ends, offset = [], [], [], 0
+            for item in items:
+                counts.append(item.mask_counts)
+                starts.append(item.mask_starts + offset)
+                ends.append(item.mask_ends + offset)
+                offset += len(item.mask_counts)
+            result.mask_counts = np.concatenate(counts)
+            result.mask_starts = np.concatenate(starts)
+            result.mask_ends = np.concatenate(ends)
+            result.mask_shape = items[0].mask_shape
+        if all(item.track_ids is not None for item in items):
+            result.track_ids = np.concatenate([item.track_ids for item in items])
+        return result
+
+    @property
+    def has_masks(self):
+        return self.mask_counts is not None
+
+    def set_masks(self, masks):
+        """对 (N, H, W) 二值掩码做游程编码保存，面积改为掩码像素数"""
+        masks = np.asarray(masks)
+        runs = [rle_encode(mask) for mask in masks]
+        lengths = np.array([len(r) for r in runs], np.int64)
+        self.mask_ends = np.cumsum(lengths)
+        self.mask_starts = self.mask_ends - lengths
+        self.mask_counts = np.concatenate(runs) if runs else np.zeros(0, np.int32)
+        self.mask_shape = tuple(masks.shape[1:3])
+        self.areas = masks.reshape(len(masks), -1).sum(axis=1).astype(np.int64)
+
+    def set_track_ids(self, ids_by_type):
+        """保存 DefectTracker.update_defects 返回的 {类别: [ID, ...]}，各列表与 select(类别) 的框一一对应"""
+        track_ids = np.zeros(len(self), np.int64)
+        for name, ids in ids_by_type.items():
+            if name in self.class_names:
+                track_ids[self.class_ids == self.class_names.index(name)] = ids
+        self.track_ids = track_ids
+
+    def mask(self, i):
+        """解码第 i 个检测的掩码"""
+        if not self.has_masks:
+            return None
+        return rle_decode(self.mask_counts[self.mask_starts[i]:self.mask_ends[i]], self.mask_shape)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _subset(self, index):
+        """按切片、布尔数组或下标数组取子集；切片时各数组都是视图，不复制数据"""
+        subset = Detections(self.boxes[index], self.scores[index], self.class_ids[index], self.areas[index],
+                            self.class_names, meta=dict(self.meta),
+                            track_ids=None if self.track_ids is None else self.track_ids[index])
+        if self.has_masks:
+            subset.mask_counts = self.mask_counts
+            subset.mask_starts = self.mask_starts[index]
+            subset.mask_ends = self.mask_ends[index]
+            subset.mask_shape = self.mask_shape
+        return subset
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in self.class_names:
+                return self.boxes[self.class_ids == self.class_names.index(key)]
+            return self.meta[key]
+        if isinstance(key, (int, np.integer)):
+            n = len(self)
+            if not -n <= key < n:
+                raise IndexError(f"检测结果下标越界: {key}")
+            key = key % n
+            key = slice(key, key + 1)
+        return self._subset(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __setitem__(self, key, value):
+        if key in self.class_names:
+            raise KeyError(f"检测框为只读字段，不能直接替换: {key}")
+        self.meta[key] = value
+
+    def __contains__(self, key):
+        return key in self.class_names or key in self.meta
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def select(self, name):
+        """返回某一类别的检测结果"""
+        if name not in self.class_names:
+            return self._subset(np.zeros(len(self), bool))
+        return self._subset(self.class_ids == self.class_names.index(name))
+
+    def count(self, name):
+        if name not in self.class_names:
+            return 0
+        return int(np.count_nonzero(self.class_ids == self.class_names.index(name)))
+
+    def counts(self):
+        """各类别的检测数量"""
+        counts = np.bincount(self.class_ids, minlength=len(self.class_names))
+        return {name: int(n) for name, n in zip(self.class_names, counts)}
+
+    def transformed(self, scale=1.0, offset=(0, 0)):
+        """返回坐标先缩放再平移后的副本，面积按缩放比例换算
+
+        掩码是模型输出分辨率下的结果，不随坐标变换，副本与原结果共享掩码数据。
+        """
+        boxes = self.boxes.astype(np.float64) * scale
+        boxes[:, 0] += offset[0]
+        boxes[:, 1] += offset[1]
+        areas = self.areas if scale == 1.0 else np.round(self.areas * scale * scale)
+        result = Detections(np.round(boxes), self.scores, self.class_ids, areas, self.class_names,
+                            self.mask_counts, self.mask_starts, self.mask_ends, self.mask_shape, dict(self.meta),
+                            self.track_ids)
+        return result
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        data = {
+            'class_names': list(self.class_names),
+            'boxes': self.boxes.tolist(),
+            'scores': [round(s, 4) for s in self.scores.tolist()],
+            'class_ids': self.class_ids.tolist(),
+            'areas': self.areas.tolist(),
+            'counts': self.counts(),
+        }
+        if self.has_masks:
+            data['mask_shape'] = list(self.mask_shape)
+            data['masks'] = [self.mask_counts[s:e].tolist() for s, e in zip(self.mask_starts, self.mask_ends)]
+        if self.track_ids is not None:
+            data['track_ids'] = self.track_ids.tolist()
+        if self.meta:
+            data['meta'] = _jsonable(self.meta)
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def to_bytes(self):
+        """序列化为紧凑的二进制格式（npz，不使用pickle）"""
+        arrays = {'boxes': self.boxes, 'scores': self.scores, 'class_ids': self.class_ids, 'areas': self.areas}
+        header = {'class_names': list(self.class_names), 'meta': _jsonable(self.meta)}
+        if self.has_masks:
+            lengths = self.mask_ends - self.mask_starts
+            arrays['mask_lengths'] = lengths
+            arrays['mask_counts'] = (np.concatenate([self.mask_counts[s:e] for s, e in zip(self.mask_starts, self.mask_ends)])
+                                     if len(self) else np.zeros(0, np.int32))
+            header['mask_shape'] = list(self.mask_shape)
+        if self.track_ids is not None:
+            arrays['track_ids'] = self.track_ids
+        arrays['header'] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), np.uint8)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            header = json.loads(arrays['header'].tobytes().decode('utf-8'))
+            detections = cls(arrays['boxes'], arrays['scores'], arrays['class_ids'], arrays['areas'],
+                             header['class_names'], meta=header.get('meta') or {},
+                             track_ids=arrays['track_ids'] if 'track_ids' in arrays else None)
+            if 'mask_counts' in arrays:
+                detections.mask_ends = np.cumsum(arrays['mask_lengths'])
+                detections.mask_starts = detections.mask_ends - arrays['mask_lengths']
+                detections.mask_counts = arrays['mask_counts']
+                detections.mask_shape = tuple(header['mask_shape'])
+        return detections
+
+    def __repr__(self):
+        counts = ', '.join(f'{name}={n}' for name, n in self.counts().items())
+        return f"Detections({counts})"
@@ -0,0 +1,129 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+from scipy import fft as sfft
+
+
+FILTER_KINDS = ('square', 'circle', 'butterworth')
+
+# scipy.fft 的并行线程数，-1 表示使用全部CPU核心
+WORKERS = -1
+
+
+def optimal_shape(shape):
+    """返回不小于 shape 的最优DFT尺寸（只含2、3、5等小质因子）"""
+    return sfft.next_fast_len(shape[0], real=True), sfft.next_fast_len(shape[1], real=True)
+
+
+@lru_cache(maxsize=32)
+def highpass_mask(shape, radius, kind='square', order=2, source_shape=None):
+    """构造 rfft2 频谱布局（未中心化）的高通滤波器，按参数缓存
+
+    shape: 变换尺寸；source_shape: 填充前的图像尺寸，半径以原图的频率单位计，
+    保证填充前后截止频率一致。
+    square: |fy|<radius 且 |fx|<radius 的低频方块置零（关于零频对称；原实现的方块还多出
+        fy=-radius 和 fx=-radius 两条边，由 highpass 单独补上）；
+    circle: 频率距离小于 radius 的圆形区域置零；
+    butterworth: n阶巴特沃斯高通，H = 1 / (1 + (radius/d)^(2n))，无振铃。
+    返回的数组只读，可被多次调用共享。
+    """
+    if kind not in FILTER_KINDS:
+        raise ValueError(f"不支持的滤波器类型: {kind}")
+    rows, cols = shape
+    src_rows, src_cols = source_shape or shape
+    fy = np.abs(sfft.fftfreq(rows) * src_rows).astype(np.float32)[:, None]
+    fx = np.abs(sfft.rfftfreq(cols) * src_cols).astype(np.float32)[None, :]
+
+    if kind == 'square':
+        mask = ~((fy < radius) & (fx < radius))
+        mask = mask.astype(np.float32)
+    else:
+        dist = np.sqrt(fy * fy + fx * fx)
+        if kind == 'circle':
+            mask = (dist >= radius).astype(np.float32)
+        else:
+            with np.errstate(divide='ignore'):
+                mask = 1.0 / (1.0 + (radius / dist) ** (2 * order))
+            mask = mask.astype(np.float32)
+    mask.flags.writeable = False
+    return mask
+
+
+def _legacy_square(gray, radius, workers):
+    """与原实现（fftshift 后把 [c-radius, c+radius) 的方块置零）结果一致的方形高通，返回float64幅值图
+
+    原实现的方块为 [-radius, radius-1]，不关于零频对称，结果是复数。这里先用实数FFT做对称部分
+    （|k| <= radius-1），再减去 ky=-radius 和 kx=-radius 两条边上的频率分量：每条边只有一行（列），
+    其逆变换是两个向量的外积，不需要完整的复数FFT。不做填充，也不降为float32，以保证结果一致。
+    """
+    rows, cols = gray.shape[:2]
+    if not 1 <= radius <= min(rows // 2, cols // 2):
+        # 半径超过图像一半时原实现的切片行为特殊，直接按原实现计算
+        shifted = sfft.fftshift(sfft.fft2(gray.astype(np.float64), workers=workers))
+        mask = np.ones((rows, cols), np.uint8)
+        mask[rows // 2 - radius:rows // 2 + radius, cols // 2 - radius:cols // 2 + radius] = 0
+        return np.abs(sfft.ifft2(sfft.ifftshift(shifted * mask), workers=workers))
+
+    spectrum = sfft.rfft2(gray.astype(np.float64), workers=workers)
+    # 完整频谱 F[ky, kx]：kx >= 0 时为 spectrum[ky, kx]，kx < 0 时为 conj(spectrum[-ky, -kx])
+    kx = np.arange(-radius, radius)
+    ky = np.arange(-radius + 1, radius)
+    row_line = np.where(kx >= 0, spectrum[-radius % rows, np.abs(kx)],
+                        np.conj(spectrum[radius % rows, np.abs(kx)]))  # F[-radius, kx]
+    col_line = np.conj(spectrum[-ky % rows, radius])  # F[ky, -radius]
+
+    # 对称部分 |ky|, |kx| <= radius-1 置零（与 highpass_mask 的 square 相同，只改写低频的几行几列）
+    spectrum[:radius, :radius] = 0
+    spectrum[rows - radius + 1:, :radius] = 0
+    back = sfft.irfft2(spectrum, s=(rows, cols), workers=workers)
+    y = np.arange(rows)
+    x = np.arange(cols)
+    # ky=-radius 一行的逆变换 = 列向量 row_phase ⊗ 行向量 row_values，kx=-radius 一列同理，
+    # 两项的实部和虚部各用一次 (rows×4)@(4×cols) 的矩阵乘法算出，不生成复数图像
+    scale = 1.0 / (rows * cols)
+    row_phase = np.exp(-2j * np.pi * radius * y / rows) * scale
+    row_values = row_line @ np.exp(2j * np.pi * np.outer(kx, x) / cols)
+    col_values = col_line @ np.exp(2j * np.pi * np.outer(ky, y) / rows) * scale
+    col_phase = np.exp(-2j * np.pi * radius * x / cols)
+    left = np.column_stack([row_phase.real, row_phase.imag, col_values.real, col_values.imag])
+    real_part = np.vstack([row_values.real, -row_values.imag, col_phase.real, -col_phase.imag])
+    imag_part = np.vstack([row_values.imag, row_values.real, col_phase.imag, col_phase.real])
+    back -= left @ real_part
+    return np.hypot(back, left @ imag_part, out=back)
+
+
+def highpass(gray, radius=30, kind='square', order=2, pad=True, workers=None):
+    """对灰度图做FFT高通滤波，返回幅值图
+
+    square 与原实现结果一致（见 _legacy_square，float64，不填充）；circle / butterworth
+    使用float32实数FFT（rfft2/irfft2），只计算一半频谱，pad为True且图像尺寸不是最优DFT尺寸时，
+    先按边缘镜像填充到最优尺寸，结果再裁剪回原尺寸。
+    """
+    workers = WORKERS if workers is None else workers
+    if kind == 'square':
+        return _legacy_square(gray, radius, workers)
+    rows, cols = gray.shape[:2]
+    shape = optimal_shape((rows, cols)) if pad else (rows, cols)
+    src = gray.astype(np.float32)
+    if shape != (rows, cols):
+        src = cv2.copyMakeBorder(src, 0, shape[0] - rows, 0, shape[1] - cols, cv2.BORDER_REFLECT)
+
+    spectrum = sfft.rfft2(src, workers=workers)
+    spectrum *= highpass_mask(shape, radius, kind, order, (rows, cols))
+    back = sfft.irfft2(spectrum, s=shape, workers=workers)[:rows, :cols]
+    return np.abs(back, out=back)
+
+
+def normalize_to_uint8(image, out=None):
+    """线性拉伸到0-255并向下取整（与原实现一致），out 为可选的uint8结果数组"""
+    out = np.empty(image.shape, np.uint8) if out is None else out
+    low, high = float(image.min()), float(image.max())
+    if high > low:
+        scaled = image - low
+        scaled *= 255
+        scaled /= high - low
+        np.copyto(out, scaled, casting='unsafe')
+    else:
+        out.fill(0)
+    return out
@@ -0,0 +1,129 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def dhash(image, hash_size=8):
+    """计算差值感知哈希（dHash），返回 hash_size*hash_size 位的整数
+
+    先缩小到 (hash_size+1)×hash_size 再转灰度，比较水平相邻像素的明暗关系。
+    缩放使用INTER_AREA，对噪声和JPEG压缩差异不敏感。
+    """
+    # 大图先按步长抽样到约256像素宽，再做区域平均缩放，避免对整帧做面积插值
+    step = max(1, min(image.shape[0], image.shape[1]) // 256)
+    if step > 1:
+        image = image[::step, ::step]
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameDeduplicator:
+    """推理前的近似重复帧检测
+
+    对最近 window 帧的哈希建立多索引：把哈希切成 threshold+1 段，
+    由抽屉原理，汉明距离不超过 threshold 的两个哈希至少有一段完全相同，
+    因此只需比较与当前帧某一段相同的候选，查找开销与窗口大小基本无关。
+
+    threshold: 判定为重复的最大汉明距离
+    window: 参与比较的最近帧数
+    """
+
+    def __init__(self, threshold=5, window=50, hash_size=8):
+        self.threshold = threshold
+        self.window = window
+        self.hash_size = hash_size
+        bits = hash_size * hash_size
+        segments = min(threshold + 1, bits)
+        width = bits // segments
+        # 每段的 (右移位数, 掩码)，最后一段包含剩余的所有位
+        self._segments = []
+        for i in range(segments):
+            shift = i * width
+            seg_bits = width if i < segments - 1 else bits - shift
+            self._segments.append((shift, (1 << seg_bits) - 1))
+        self.reset()
+
+    def reset(self):
+        self._order = deque()
+        self._entries = {}
+        self._index = [dict() for _ in self._segments]
+        self._next_id = 0
+        self.frames = 0
+        self.duplicates = 0
+        self.inference_time = 0.0
+        self.saved_time = 0.0
+        self.hash_time = 0.0
+
+    def _keys(self, h):
+        return [(h >> shift) & mask for shift, mask in self._segments]
+
+    def lookup(self, image):
+        """查找与 image 近似重复的最近帧
+
+        返回 (hash, entry)，entry 为 None 表示没有重复帧，需要正常推理；
+        否则 entry['result'] 为可复用的检测结果。
+        """
+        start = time.perf_counter()
+        h = dhash(image, self.hash_size)
+        self.frames += 1
+
+        candidates = set()
+        for index, key in zip(self._index, self._keys(h)):
+            candidates.update(index.get(key, ()))
+        best = None
+        best_distance = self.threshold + 1
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            distance = hamming_distance(h, entry['hash'])
+            # 距离相同时优先复用最近的帧
+            if distance < best_distance or (distance == best_distance and best is not None
+                                            and entry_id > best['id']):
+                best, best_distance = entry, distance
+        self.hash_time += time.perf_counter() - start
+
+        if best is not None:
+            self.duplicates += 1
+            self.saved_time += best['elapsed']
+            best['reused'] += 1
+        return h, best
+
+    def add(self, h, result, elapsed=0.0, name=None):
+        """登记一帧的推理结果，elapsed为该帧推理耗时（秒），用于估算节省的时间"""
+        self.inference_time += elapsed
+        entry = {'id': self._next_id, 'hash': h, 'result': result,
+                 'elapsed': elapsed, 'name': name, 'reused': 0}
+        self._next_id += 1
+        self._order.append(entry['id'])
+        self._entries[entry['id']] = entry
+        for index, key in zip(self._index, self._keys(h)):
+            index.setdefault(key, set()).add(entry['id'])
+
+        while len(self._order) > self.window:
+            old = self._entries.pop(self._order.popleft())
+            for index, key in zip(self._index, self._keys(old['hash'])):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(old['id'])
+                    if not ids:
+                        del index[key]
+        return entry
+
+    def report(self):
+        """汇总重复帧数量和节省的推理时间"""
+        return {
+            'frames': self.frames,
+            'duplicates': self.duplicates,
+            'duplicate_rate': self.duplicates / self.frames if self.frames else 0.0,
+            'inference_time': self.inference_time,
+            'saved_time': self.saved_time,
+            'hash_time': self.hash_time,
+        }
@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QSizePolicy, QWidget
+
+
+# 各通道的曲线颜色和图例名称（BGR顺序，与 cv2.calcHist 的通道编号对应）
+CHANNELS = ((QColor(0, 0, 255), '蓝色'), (QColor(0, 128, 0), '绿色'), (QColor(255, 0, 0), '红色'))
+GRAY_CHANNEL = (QColor(60, 60, 60), '灰度')
+
+# 绘图区四周的留白（像素）：左侧为纵轴刻度，底部为横轴刻度和标题
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 52, 12, 24, 36
+
+
+def channel_curves(histograms):
+    """把各通道的直方图（B/G/R三个或灰度一个）配上颜色和名称 [(直方图, 颜色, 名称), ...]"""
+    if len(histograms) == 1:
+        return [(histograms[0],) + GRAY_CHANNEL]
+    return [(hist, color, name) for hist, (color, name) in zip(histograms, CHANNELS)]
+
+
+def channel_histograms(image):
+    """图像各通道的256级直方图 [(直方图, 颜色, 名称), ...]，彩色图为B/G/R三条，灰度图为一条"""
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    return channel_curves([cv2.calcHist([image], [i], None, [256], [0, 256]).ravel() for i in range(channels)])
+
+
+def _nice_step(value, ticks=4):
+    """纵轴刻度间隔：取 1、2、5 乘以10的幂中使刻度数不超过 ticks 的最小值"""
+    if value <= 0:
+        return 1.0
+    raw = value / ticks
+    magnitude = 10 ** np.floor(np.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if factor * magnitude >= raw:
+            return float(factor * magnitude)
+    return float(10 * magnitude)
+
+
+def _tick_label(value):
+    if value >= 10000:
+        return f"{value / 1000:g}k"
+    return f"{value:g}"
+
+
+class HistogramWidget(QWidget):
+    """用 QPainter 直接绘制各通道直方图曲线的控件，可多幅并排（如对比视图）
+
+    只在数据更新时计算直方图，绘制时按控件当前尺寸把256个点映射到绘图区，
+    同一个控件在多次更新之间重复使用，不创建任何图形对象。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._panels = []
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def set_image(self, image, title=''):
+        """显示一幅图像的各通道直方图"""
+        self.set_images([(title, image)])
+
+    def set_images(self, titled_images):
+        """并排显示多幅图像的直方图，titled_images 为 [(标题, 图像), ...]"""
+        self.set_panels([(title, channel_histograms(image)) for title, image in titled_images])
+
+    def set_histograms(self, histograms, title=''):
+        """显示已计算好的各通道直方图（B/G/R三个或灰度一个）"""
+        self.set_panels([(title, channel_curves(histograms))])
+
+    def set_panels(self, panels):
+        """直接设置直方图数据 [(标题, [(直方图, 颜色, 名称), ...]), ...]"""
+        self._panels = [(title, [(np.asarray(hist, np.float64).ravel(), color, name)
+                                 for hist, color, name in curves]) for title, curves in panels]
+        self.update()
+
+    def panels(self):
+        """当前显示的直方图数据，格式同 set_panels"""
+        return list(self._panels)
+
+    def clear(self):
+        self._panels = []
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+        if self._panels:
+            width = self.width() / len(self._panels)
+            for i, (title, curves) in enumerate(self._panels):
+                self._paint_panel(painter, QRectF(i * width, 0, width, self.height()), title, curves)
+        painter.end()
+
+    def _paint_panel(self, painter, area, title, curves):
+        plot = area.adjusted(MARGIN_LEFT, MARGIN_TOP, -MARGIN_RIGHT, -MARGIN_BOTTOM)
+        if plot.width() <= 0 or plot.height() <= 0:
+            return
+        font = QFont(painter.font())
+        font.setPointSizeF(8)
+        painter.setFont(font)
+        metrics = painter.fontMetrics()
+
+        # 纵轴上限与matplotlib自动缩放相同：最大值再留5%的余量
+        peak = max((float(hist.max()) for hist, _, _ in curves if hist.size), default=0.0)
+        top = peak * 1.05 if peak > 0 else 1.0
+        step = _nice_step(top)
+
+        # 网格和刻度
+        painter.setPen(QPen(QColor(220, 220, 220), 1))
+        for x in range(0, 257, 50):
+            px = plot.left() + plot.width() * x / 256
+            painter.drawLine(QPointF(px, plot.top()), QPointF(px, plot.bottom()))
+        y = 0.0
+        while y <= top:
+            py = plot.bottom() - plot.height() * y / top
+            painter.drawLine(QPointF(plot.left(), py), QPointF(plot.right(), py))
+            y += step
+        painter.setPen(Qt.black)
+        painter.drawRect(plot)
+        for x in range(0, 257, 50):
+            px = plot.left() + plot.width() * x / 256
+            label = str(x)
+            painter.drawText(QPointF(px - metrics.width(label) / 2, plot.bottom() + metrics.ascent() + 3), label)
+        y = 0.0
+        while y <= top:
+            py = plot.bottom() - plot.height() * y / top
+            label = _tick_label(y)
+            painter.drawText(QPointF(plot.left() - metrics.width(label) - 4, py + metrics.ascent() / 2 - 1), label)
+            y += step
+
+        # 坐标轴名称和标题
+        label = '像素值'
+        painter.drawText(QPointF(plot.center().x() - metrics.width(label) / 2, area.bottom() - 4), label)
+        painter.save()
+        painter.translate(area.left() + metrics.height() - 2, plot.center().y())
+        painter.rotate(-90)
+        painter.drawText(QPointF(-metrics.width('频率') / 2, 0), '频率')
+        painter.restore()
+        if title:
+            bold = QFont(font)
+            bold.setBold(True)
+            painter.setFont(bold)
+            title_width = painter.fontMetrics().width(title)
+            painter.drawText(QPointF(plot.center().x() - title_width / 2, area.top() + metrics.ascent() + 4), title)
+            painter.setFont(font)
+
+        # 各通道曲线：256个点按绘图区尺寸一次换算坐标
+        painter.save()
+        painter.setClipRect(plot)
+        xs = plot.left() + plot.width() * np.arange(256) / 256
+        for hist, color, _ in curves:
+            ys = plot.bottom() - plot.height() * hist / top
+            painter.setPen(QPen(color, 1.2))
+            painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())]))
+        painter.restore()
+
+        # 图例（右上角）
+        if len(curves) > 1:
+            line_height = metrics.height()
+            legend_width = max(metrics.width(name) for _, _, name in curves) + 30
+            box = QRectF(plot.right() - legend_width - 6, plot.top() + 6, legend_width, line_height * len(curves) + 6)
+            painter.setPen(QColor(200, 200, 200))
+            painter.setBrush(QColor(255, 255, 255, 220))
+            painter.drawRect(box)
+            painter.setBrush(Qt.NoBrush)
+            for i, (_, color, name) in enumerate(curves):
+                y = box.top() + 3 + line_height * i + line_height / 2
+                painter.setPen(QPen(color, 2))
+                painter.drawLine(QPointF(box.left() + 5, y), QPointF(box.left() + 20, y))
+                painter.setPen(Qt.black)
+                painter.drawText(QPointF(box.left() + 25, y + metrics.ascent() / 2 - 1), name)
@@ -0,0 +1,188 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+# 操作历史：每条记录在内存中只保存压缩后的缩略图，全分辨率结果在内存预算内保留在内存中，
+# 超出预算时按最近最少使用的顺序写到本地缓存目录（.npy 文件，读取时内存映射，不占用内存），
+# 缓存目录也超出预算时删除最久未用的全分辨率结果（只保留缩略图），记录总数超过上限时整条删除。
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+DEFAULT_DISK_BUDGET = 4 * 1024 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 200
+THUMBNAIL_WIDTH = 280
+THUMBNAIL_QUALITY = 85
+
+
+class HistoryEntry:
+    """一条历史记录。image 为内存中的全分辨率结果，path 为写入缓存目录后的文件，两者至多一个非空"""
+
+    def __init__(self, entry_id, name, image, thumbnail):
+        self.id = entry_id
+        self.name = name
+        self.timestamp = time.time()
+        self.shape = image.shape
+        self.nbytes = image.nbytes
+        self.thumbnail = thumbnail
+        self.image = image
+        self.path = None
+
+    @property
+    def location(self):
+        """全分辨率结果的位置：'memory' / 'disk' / None（已删除，只剩缩略图）"""
+        if self.image is not None:
+            return 'memory'
+        return 'disk' if self.path else None
+
+
+class HistoryStore:
+    """容量受限的操作历史
+
+    memory_budget: 内存中全分辨率结果的总字节数上限
+    disk_budget: 缓存目录中全分辨率结果的总字节数上限
+    max_entries: 记录条数上限
+    cache_dir: 缓存目录，默认在系统临时目录下新建，close() 时删除
+    保存的图像与 image_ops 的输入一样不能被原地修改（记录直接引用结果数组，不复制）。
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, disk_budget=DEFAULT_DISK_BUDGET,
+                 max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None, thumbnail_width=THUMBNAIL_WIDTH):
+        if memory_budget < 0 or disk_budget < 0 or max_entries < 1:
+            raise ValueError("历史记录的容量上限必须为非负数，条数上限至少为1")
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.max_entries = max_entries
+        self.thumbnail_width = thumbnail_width
+        self._owns_dir = cache_dir is None
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # 按最近使用排序，最久未用的在前
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _make_thumbnail(self, image):
+        height, width = image.shape[:2]
+        size = (self.thumbnail_width, max(1, round(self.thumbnail_width * height / width)))
+        thumb = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if not ok:
+            raise ValueError("缩略图编码失败")
+        return data.tobytes()
+
+    def add(self, image, name):
+        """添加一条记录，返回 (记录ID, 因超过条数上限被整条删除的记录ID列表)"""
+        thumbnail = self._make_thumbnail(image)
+        with self._lock:
+            entry = HistoryEntry(next(self._ids), name, image, thumbnail)
+            self._entries[entry.id] = entry
+            removed = []
+            while len(self._entries) > self.max_entries:
+                _, oldest = self._entries.popitem(last=False)
+                self._drop_file(oldest)
+                removed.append(oldest.id)
+            self._enforce_budgets()
+        return entry.id, removed
+
+    def set_memory_budget(self, memory_budget):
+        """修改内存预算，超出的部分立即写入缓存目录"""
+        if memory_budget < 0:
+            raise ValueError("历史记录的内存上限必须为非负数")
+        with self._lock:
+            self.memory_budget = memory_budget
+            self._enforce_budgets()
+
+    def entry(self, entry_id):
+        return self._entries.get(entry_id)
+
+    def entries(self):
+        """所有记录，按添加时间从新到旧"""
+        return sorted(self._entries.values(), key=lambda entry: entry.id, reverse=True)
+
+    def thumbnail(self, entry_id):
+        """解码后的缩略图（BGR），记录不存在时返回None"""
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return None
+        return cv2.imdecode(np.frombuffer(entry.thumbnail, np.uint8), cv2.IMREAD_COLOR)
+
+    def load(self, entry_id):
+        """取出全分辨率结果：在内存中时直接返回，已写入缓存目录时以只读内存映射打开；
+        记录不存在或全分辨率结果已被删除时返回None"""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(entry_id)
+            if entry.image is not None:
+                return entry.image
+            path = entry.path
+        if path is None:
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def memory_bytes(self):
+        """内存中全分辨率结果和缩略图的总字节数"""
+        return sum((entry.nbytes if entry.image is not None else 0) + len(entry.thumbnail)
+                   for entry in self._entries.values())
+
+    def disk_bytes(self):
+        return sum(entry.nbytes for entry in self._entries.values() if entry.path)
+
+    def _enforce_budgets(self):
+        """超出内存预算时把最久未用的结果写入缓存目录，超出磁盘预算时删除最久未用的文件"""
+        in_memory = sum(entry.nbytes for entry in self._entries.values() if entry.image is not None)
+        for entry in self._entries.values():
+            if in_memory <= self.memory_budget:
+                break
+            if entry.image is not None:
+                self._spill(entry)
+                in_memory -= entry.nbytes
+        on_disk = self.disk_bytes()
+        for entry in self._entries.values():
+            if on_disk <= self.disk_budget:
+                break
+            if entry.path:
+                on_disk -= entry.nbytes
+                self._drop_file(entry)
+
+    def _spill(self, entry):
+        if entry.nbytes > self.disk_budget:
+            entry.image = None
+            return
+        if self.cache_dir is None:
+            self.cache_dir = tempfile.mkdtemp(prefix='history_')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f'{entry.id}.npy')
+        try:
+            np.save(path, np.ascontiguousarray(entry.image))
+            entry.path = path
+        except OSError as e:
+            print(f"历史记录写入缓存失败: {str(e)}")
+        entry.image = None
+
+    def _drop_file(self, entry):
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            entry.path = None
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._drop_file(entry)
+            self._entries.clear()
+
+    def close(self):
+        """清空记录并删除自动创建的缓存目录"""
+        self.clear()
+        if self._owns_dir and self.cache_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir = None
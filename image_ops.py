@@ -0,0 +1,1057 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+
+import box_ops
+import cv_cache
+import fft_engine
+import image_stats
+import morphology
+from buffer_pool import DEFAULT_POOL, BufferPool, output_array
+from components import external_contours
+from cost_model import StageCostModel
+from detections import DEFECT_TYPES, Detections
+
+try:
+    from ultralytics import YOLO
+    YOLO_AVAILABLE = True
+except ImportError:
+    YOLO_AVAILABLE = False
+    print("警告: 未安装ultralytics库，AI检测功能将不可用")
+
+
+# 图像处理和缺陷检测的无状态函数：输入图像和参数，返回结果，不修改输入也不依赖任何全局可变状态，
+# 可在多个线程中并发调用。ImageProcessor 是在这些函数之上保存当前图像和参数的封装。
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_YOLO_WEIGHTS = os.path.join(MODEL_DIR, 'yolov12', 'weights', 'best.pt')
+DEFAULT_SEGMENT_WEIGHTS = os.path.join(MODEL_DIR, 'segment', 'train3', 'weights', 'best.pt')
+DEFAULT_CLASSES = ('pothole',)
+
+# 8邻域偏移量 (dy, dx)，用于边缘连接中的端点判断
+NEIGHBOUR_OFFSETS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+def draw_segments(image, segments, max_length, value=255, chunk=65536):
+    """在单通道图像上批量绘制线段，segments 形状为 (N, 2, 2)，每条线段长度不超过 max_length
+
+    沿每条线段等间隔取 max_length+2 个点直接写入像素，避免逐条调用 cv2.line。
+    """
+    steps = int(np.ceil(max_length)) + 1
+    t = (np.arange(steps + 1, dtype=np.float32) / steps)[None, :]
+    flat = image.reshape(-1)
+    width = image.shape[1]
+    for start in range(0, len(segments), chunk):
+        seg = segments[start:start + chunk].astype(np.float32)
+        p0, delta = seg[:, 0], seg[:, 1] - seg[:, 0]
+        x = (p0[:, 0:1] + delta[:, 0:1] * t + 0.5).astype(np.int32)
+        y = (p0[:, 1:2] + delta[:, 1:2] * t + 0.5).astype(np.int32)
+        flat[(y * width + x).ravel()] = value
+
+
+class SharedModel:
+    """可被多个线程共享的模型
+
+    ultralytics 的预测器在推理时会修改自身状态，不能并发调用，因此推理时加锁串行执行；
+    模型只需加载一次，不必为每个线程各保存一份。
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+
+def load_model(model_path):
+    """加载YOLO模型（边界框或分割）"""
+    if not YOLO_AVAILABLE:
+        raise ImportError("未安装ultralytics库，无法使用AI检测功能")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"模型文件不存在: {model_path}")
+    return YOLO(model_path)
+
+
+def adjust_brightness_contrast(image, brightness=0, contrast=1, out=None):
+    """调整亮度和对比度
+    brightness: -100 到 100
+    contrast: 0 到 3
+    out: 可选的结果数组（与 image 同形状的uint8数组）
+    """
+    return enhance_pipeline(image, [('brightness_contrast', {'brightness': brightness, 'contrast': contrast})], out)
+
+
+def clahe_enhancement(image, clip_limit=2.0, tile_size=8, out=None):
+    """CLAHE自适应直方图均衡化"""
+    return enhance_pipeline(image, [('clahe', {'clip_limit': clip_limit, 'tile_size': tile_size})], out)
+
+
+def fft_filter(image, radius=30, mode='square', out=None):
+    """FFT高通滤波（滤波器类型 mode：square / circle / butterworth）"""
+    result = output_array(out, image.shape)
+    with DEFAULT_POOL.borrow(image.shape[:2]) as gray:
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+        img_back = fft_engine.highpass(gray, radius, mode)
+        cv2.cvtColor(fft_engine.normalize_to_uint8(img_back, out=gray), cv2.COLOR_GRAY2BGR, dst=result)
+    return result
+
+
+def detect_edges(image, canny_low=50, canny_high=150, out=None):
+    """Canny边缘检测"""
+    result = output_array(out, image.shape)
+    with DEFAULT_POOL.borrow(image.shape[:2]) as gray, DEFAULT_POOL.borrow(image.shape[:2]) as edges:
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=gray)
+        cv2.Canny(gray, canny_low, canny_high, edges=edges)
+        cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR, dst=result)
+    return result
+
+
+# 锐化卷积核（只读）
+SHARPEN_KERNEL = cv_cache.SHARPEN_KERNEL
+
+# enhance_image 的处理步骤：CLAHE + 去噪 + 锐化
+ENHANCE_STEPS = (
+    ('clahe', {'clip_limit': 3.0, 'tile_size': 8}),
+    ('denoise', {'ksize': 3}),
+    ('sharpen', {}),
+)
+
+
+def enhance_image(image, out=None):
+    """综合图像增强处理（CLAHE + 去噪 + 锐化），出错时返回原图"""
+    try:
+        return enhance_pipeline(image, ENHANCE_STEPS, out)
+    except Exception as e:
+        print(f"图像增强处理出错: {str(e)}")
+        return image
+
+
+# 增强步骤按作用的数据分为三类：逐像素映射（合并为一张查找表）、LAB亮度通道上的处理
+# （共用一次颜色空间转换）和BGR图像上的滤波
+POINT_STEPS = ('brightness_contrast',)
+LIGHTNESS_STEPS = ('equalize', 'clahe', 'denoise')
+FILTER_STEPS = ('sharpen',)
+ENHANCE_STEP_NAMES = POINT_STEPS + LIGHTNESS_STEPS + FILTER_STEPS
+
+
+def _parse_step(step):
+    """把 'name' 或 (name, params) 形式的步骤统一为 (name, params)"""
+    name, params = (step, {}) if isinstance(step, str) else (step[0], dict(step[1] or {}))
+    if name not in ENHANCE_STEP_NAMES:
+        raise ValueError(f"不支持的增强步骤: {name}")
+    return name, params
+
+
+def _is_noop(name, params):
+    """不改变图像的步骤（如亮度0、对比度1）直接跳过"""
+    if name == 'brightness_contrast':
+        return params.get('brightness', 0) == 0 and params.get('contrast', 1) == 1
+    if name == 'denoise':
+        return params.get('ksize', 3) <= 1
+    if name == 'sharpen':
+        return params.get('strength', 1) == 0
+    return False
+
+
+def _brightness_contrast_lut(lut, hist, brightness=0, contrast=1):
+    """在查找表 lut 之后叠加一次亮度对比度调节，返回新的查找表
+
+    对比度以当前图像的均值为中心，均值由原图直方图经 lut 映射后求得（整数求和，与 np.mean 完全一致）；
+    逐值的计算顺序和精度与逐像素 float32 计算相同，结果逐位一致。
+    """
+    values = lut.astype(np.float32)
+    if contrast != 1:
+        mean = np.float32(float(np.dot(hist, lut.astype(np.int64))) / hist.sum())
+        values -= mean
+        values *= np.float32(contrast)
+        values += mean
+    if brightness != 0:
+        values += np.float32(brightness)
+    np.clip(values, 0, 255, out=values)
+    return values.astype(np.uint8)
+
+
+def _apply_point_steps(src, dst, steps):
+    """把连续的逐像素步骤合并为一张查找表，只遍历一次图像"""
+    hist = image_stats.histogram_u8(src) if any(params.get('contrast', 1) != 1 for _, params in steps) else None
+    lut = np.arange(256, dtype=np.uint8)
+    for _, params in steps:
+        lut = _brightness_contrast_lut(lut, hist, params.get('brightness', 0), params.get('contrast', 1))
+    cv2.LUT(src, lut, dst=dst)
+
+
+def _apply_lightness_steps(src, dst, steps):
+    """在LAB空间中对亮度通道 L 原地依次处理，整组步骤只做一次颜色空间往返转换"""
+    with DEFAULT_POOL.borrow(src.shape) as lab, DEFAULT_POOL.borrow(src.shape[:2]) as l:
+        cv2.cvtColor(src, cv2.COLOR_BGR2LAB, dst=lab)
+        cv2.extractChannel(lab, 0, dst=l)
+        for name, params in steps:
+            if name == 'equalize':
+                cv2.equalizeHist(l, dst=l)
+            elif name == 'clahe':
+                cv_cache.clahe(params.get('clip_limit', 2.0), params.get('tile_size', 8)).apply(l, dst=l)
+            else:
+                ksize = params.get('ksize', 3)
+                cv2.GaussianBlur(l, (ksize, ksize), 0, dst=l)
+        cv2.insertChannel(l, lab, 0)
+        cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=dst)
+
+
+def _apply_filter_step(src, dst, params):
+    """锐化：strength 为1时即 SHARPEN_KERNEL（uint8输出本身已饱和到合法范围）"""
+    cv2.filter2D(src, -1, cv_cache.sharpen_kernel(params.get('strength', 1)), dst=dst)
+
+
+def enhance_pipeline(image, steps, out=None):
+    """按顺序执行一组增强步骤，中间结果在缓冲池的数组间交替传递，不产生额外的整帧拷贝
+
+    steps: 步骤列表，每项为名称或 (名称, 参数字典)：
+        ('brightness_contrast', {'brightness': 0, 'contrast': 1})  亮度对比度
+        'equalize'                                                 亮度通道直方图均衡化
+        ('clahe', {'clip_limit': 2.0, 'tile_size': 8})             亮度通道CLAHE
+        ('denoise', {'ksize': 3})                                  亮度通道高斯去噪
+        ('sharpen', {'strength': 1})                               锐化
+    相邻的逐像素步骤合并为一张查找表（与逐个调用逐位一致），不改变图像的步骤被跳过；
+    相邻的亮度通道步骤共用一次LAB转换，中间不再转回BGR取整，因此与逐个调用对应函数相比有少量像素差异。
+    """
+    steps = [_parse_step(step) for step in steps]
+    steps = [(name, params) for name, params in steps if not _is_noop(name, params)]
+
+    # 相邻的同类步骤合为一组
+    groups = []
+    for name, params in steps:
+        kind = POINT_STEPS if name in POINT_STEPS else LIGHTNESS_STEPS if name in LIGHTNESS_STEPS else None
+        if kind is not None and groups and groups[-1][0] is kind:
+            groups[-1][1].append((name, params))
+        else:
+            groups.append((kind, [(name, params)]))
+
+    result = output_array(out, image.shape)
+    if not groups:
+        np.copyto(result, image)
+        return result
+
+    with DEFAULT_POOL.scope() as acquire:
+        buffers = []
+        src = image
+        for i, (kind, group) in enumerate(groups):
+            if i == len(groups) - 1:
+                dst = result
+            else:
+                # 在两个临时数组间交替，目标数组不与输入相同
+                if len(buffers) < 2:
+                    buffers.append(acquire(image.shape))
+                dst = buffers[0] if src is not buffers[0] else buffers[1]
+            if kind is POINT_STEPS:
+                _apply_point_steps(src, dst, group)
+            elif kind is LIGHTNESS_STEPS:
+                _apply_lightness_steps(src, dst, group)
+            else:
+                _apply_filter_step(src, dst, group[0][1])
+            src = dst
+    return result
+
+
+def morph(image, morph_type='erode', size=3, out=None, shape='rect'):
+    """形态学操作：erode / dilate / open / close / gradient，shape 为结构元素形状（rect / ellipse / cross）"""
+    return morphology.apply(image, morph_type, size, shape, dst=out)
+
+
+def _copy_to_output(image, out=None):
+    """把 image 复制到 out（为None时新分配）中，作为绘制检测结果的底图"""
+    result = output_array(out, image.shape, image.dtype)
+    np.copyto(result, image)
+    return result
+
+
+def detect_cracks(image, out=None):
+    """检测裂缝，返回 (结果图, Detections)，out 为可选的结果图数组"""
+    with DEFAULT_POOL.borrow(image.shape[:2]) as gray, DEFAULT_POOL.borrow(image.shape[:2]) as mask:
+        # 预处理
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+        cv2.GaussianBlur(gray, (7, 7), 0, dst=gray)
+
+        # 自适应阈值分割
+        cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, 11, 2, dst=mask
+        )
+
+        # 形态学操作
+        morphology.apply(mask, 'open', 3, iterations=2, dst=mask)
+
+        # 查找轮廓（先按连通域批量过滤小区域）
+        contours = external_contours(mask, min_area=100)
+
+    # 绘制边界框
+    result_image = _copy_to_output(image, out)
+    boxes = []
+    for cnt, area in contours:
+        if area > 100:  # 过滤小区域
+            x, y, w, h = cv2.boundingRect(cnt)
+            boxes.append((x, y, w, h))
+            cv2.rectangle(result_image, (x, y), 
+                        (x+w, y+h), (0, 255, 0), 2)
+
+    return result_image, Detections.from_lists({'cracks': boxes})
+
+
+def detect_cracks_advanced(image, out=None):
+    """高级裂缝检测算法，返回 (结果图, Detections)，out 为可选的结果图数组"""
+    try:
+        with DEFAULT_POOL.borrow(image.shape[:2]) as gray, DEFAULT_POOL.borrow(image.shape[:2]) as mask:
+            # 预处理
+            cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+
+            # 自适应直方图均衡化
+            cv_cache.clahe(2.0, 8).apply(gray, dst=gray)
+
+            # 高斯滤波去噪
+            cv2.GaussianBlur(gray, (5, 5), 0, dst=gray)
+
+            # 形态学梯度
+            morphology.apply(gray, 'gradient', 3, dst=mask)
+
+            # Otsu自适应阈值分割
+            cv2.threshold(mask, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=mask)
+
+            # 形态学操作
+            morphology.apply(mask, 'open', 3, dst=mask)
+            morphology.apply(mask, 'close', 3, iterations=2, dst=mask)
+
+            # 查找轮廓（先按连通域批量过滤小区域）
+            contours = external_contours(mask, min_area=50)
+
+        # 分析和绘制结果
+        result_image = _copy_to_output(image, out)
+        boxes = []
+
+        for cnt, area in contours:
+            if area > 50:  # 面积阈值
+                # 计算最小外接矩形
+                rect = cv2.minAreaRect(cnt)
+                box = cv2.boxPoints(rect)
+                box = box.astype(np.int32)
+
+                # 计算矩形的长宽比
+                width = rect[1][0]
+                height = rect[1][1]
+                aspect_ratio = max(width, height) / (min(width, height) + 1e-6)
+
+                # 根据形状特征筛选
+                if aspect_ratio > 2:  # 裂缝通常细长
+                    x, y, w, h = cv2.boundingRect(cnt)
+                    boxes.append((x, y, w, h))
+                    # 绘制轮廓和边界框
+                    cv2.drawContours(result_image, [box], 0, (0, 255, 0), 2)
+                    cv2.rectangle(result_image, (x,y), (x+w,y+h), (255, 0, 0), 2)
+
+        return result_image, Detections.from_lists({'cracks': boxes})
+    except Exception as e:
+        print(f"缺陷检测出错: {str(e)}")
+        return image, Detections.empty()
+
+
+def _road_roi_region(image, road_roi):
+    """计算图像的路面ROI掩码及其外接矩形，未设置ROI时返回 (None, None)"""
+    if road_roi is None:
+        return None, None
+    roi_mask = road_roi.build_mask(image)
+    return roi_mask, cv2.boundingRect(roi_mask)
+
+
+def _mean_std(gray):
+    """单通道图像的均值和标准差（不生成整幅的浮点临时数组）"""
+    mean, std = cv2.meanStdDev(gray)
+    return float(mean[0, 0]), float(std[0, 0])
+
+
+def _percentiles_u8(gray, percentiles):
+    """uint8图像的百分位数，与 np.percentile（线性插值）结果相同，但用直方图代替对整幅图像排序"""
+    return image_stats.percentiles_from_histogram(image_stats.histogram_u8(gray), percentiles)
+
+
+# 低内存模式、非原尺寸的尺度和由粗到精模式的局部区域中的临时数组不放回缓冲池，用完即释放
+_UNPOOLED = BufferPool(enabled=False)
+
+
+def _to_original(rect, scale_factor, offset=(0, 0)):
+    """把某一尺度上的 (x, y, w, h) 换算回原始图像尺寸，offset 为所在区域在该尺度图像中的左上角"""
+    x, y, w, h = rect
+    return (int((x + offset[0])/scale_factor), int((y + offset[1])/scale_factor),
+            int(w/scale_factor), int(h/scale_factor))
+
+
+# 以下三个分支函数既处理整幅图像，也处理由粗到精模式中的局部区域（见 _refine_branch）。处理局部区域时，
+# frame_shape 为整幅图像在该尺度下的尺寸（核大小和面积阈值与整幅处理一致），阈值等全局统计量
+# 由整幅图像上的结果传入。
+
+def _crack_candidates(gray, global_contrast, scale_factor, mask, acquire, low_memory,
+                      frame_shape=None, raw_threshold=None):
+    """裂缝分支：自适应梯度 + 长条形轮廓
+
+    raw_threshold: 处理局部区域时对未归一化的梯度幅值使用的阈值（见 _crack_raw_threshold），
+    整幅处理时为 None，阈值由归一化后的梯度统计得到。
+    """
+    shape = gray.shape
+    frame_shape = frame_shape or shape
+    # 自适应梯度特征
+    ksize = 3 if global_contrast > 0.4 else 5
+    gradient_type, gradient_dtype = (cv2.CV_32F, np.float32) if low_memory else (cv2.CV_64F, np.float64)
+    gradient_x = cv2.Sobel(gray, gradient_type, 1, 0, dst=acquire(shape, gradient_dtype), ksize=ksize)
+    gradient_y = cv2.Sobel(gray, gradient_type, 0, 1, dst=acquire(shape, gradient_dtype), ksize=ksize)
+    magnitude = cv2.magnitude(gradient_x, gradient_y, magnitude=gradient_x)
+    if raw_threshold is not None:
+        cv2.compare(magnitude, raw_threshold, cv2.CMP_GE, dst=mask)
+    else:
+        cv2.normalize(magnitude, magnitude, 0, 255, cv2.NORM_MINMAX)
+        gradient_mag = acquire(shape)
+        np.copyto(gradient_mag, magnitude, casting='unsafe')
+        grad_mean, grad_std = _mean_std(gradient_mag)
+        cv2.threshold(gradient_mag, grad_mean + 1.5 * grad_std, 255, cv2.THRESH_BINARY, dst=mask)
+        del gradient_mag
+    del gradient_x, gradient_y, magnitude
+
+    # 自适应形态学处理
+    crack_kernel_size = max(3, min(7, int(frame_shape[0] * 0.005)))
+    if crack_kernel_size % 2 == 0:
+        crack_kernel_size += 1
+    morphology.apply(mask, 'close', crack_kernel_size, dst=mask)
+
+    min_crack_area = frame_shape[0] * frame_shape[1] * 0.0001
+    candidates = []
+    for cnt, area in external_contours(mask, min_crack_area):
+        rect = cv2.minAreaRect(cnt)
+
+        width = rect[1][0]
+        height = rect[1][1]
+        aspect_ratio = max(width, height) / (min(width, height) + 1e-6)
+        aspect_thresh = 2.5 if global_contrast > 0.5 else 2.0
+
+        if aspect_ratio > aspect_thresh:
+            candidates.append(_to_original(cv2.boundingRect(cnt), scale_factor))
+    return candidates
+
+
+def _crack_raw_threshold(gray, global_contrast, acquire):
+    """整幅灰度图上裂缝分支的梯度阈值，换算为未归一化的梯度幅值（与 cv2.CMP_GE 比较）
+
+    整幅处理时梯度幅值按 [min, max] 线性归一化到0-255并截断为uint8，阈值 t 为其 均值 + 1.5 × 标准差，
+    uint8值 > t 等价于原始幅值 >= min + (floor(t) + 1) × (max - min) / 255。
+    这里梯度用float32计算（比float64快一倍），阈值只受浮点舍入影响。
+    """
+    shape = gray.shape
+    ksize = 3 if global_contrast > 0.4 else 5
+    gradient_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=acquire(shape, np.float32), ksize=ksize)
+    gradient_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1, dst=acquire(shape, np.float32), ksize=ksize)
+    magnitude = cv2.magnitude(gradient_x, gradient_y, magnitude=gradient_x)
+    low, high, _, _ = cv2.minMaxLoc(magnitude)
+    cv2.normalize(magnitude, magnitude, 0, 255, cv2.NORM_MINMAX)
+    gradient_mag = acquire(shape)
+    np.copyto(gradient_mag, magnitude, casting='unsafe')
+    grad_mean, grad_std = _mean_std(gradient_mag)
+    return low + (np.floor(grad_mean + 1.5 * grad_std) + 1) * (high - low) / 255.0
+
+
+def _pothole_candidates(scale_img, global_contrast, std_brightness, scale_factor, mask, acquire,
+                        frame_shape=None):
+    """坑洼分支：LAB亮度通道CLAHE增强后自适应阈值分割"""
+    shape = scale_img.shape[:2]
+    frame_shape = frame_shape or shape
+    # 自适应CLAHE增强（只需要LAB的L通道）
+    lab = cv2.cvtColor(scale_img, cv2.COLOR_BGR2LAB, dst=acquire(scale_img.shape))
+    clip_limit = max(2.0, min(4.0, 3.0 * (1 - global_contrast)))
+    l_enhanced = cv2.extractChannel(lab, 0, dst=acquire(shape))
+    del lab
+    cv_cache.clahe(clip_limit, 8).apply(l_enhanced, dst=l_enhanced)
+
+    block_size = int(min(frame_shape) * 0.02) // 2 * 2 + 1
+    block_size = max(3, min(block_size, 21))  # 确保block_size为奇数且在合理范围内
+    c_value = max(5, min(15, int(std_brightness * 0.3)))
+
+    cv2.adaptiveThreshold(
+        l_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV, block_size, c_value, dst=mask
+    )
+    del l_enhanced
+
+    pothole_kernel_size = max(3, min(5, int(frame_shape[0] * 0.01)))
+    if pothole_kernel_size % 2 == 0:
+        pothole_kernel_size += 1
+    morphology.apply(mask, 'open', pothole_kernel_size, dst=mask)
+    # 闭运算迭代7次，等价于一次 7×(k-1)+1 的矩形核
+    morphology.apply(mask, 'close', pothole_kernel_size, iterations=7, dst=mask)
+    min_pothole_area = frame_shape[0] * frame_shape[1] * 0.005
+    return [_to_original(cv2.boundingRect(cnt), scale_factor)
+            for cnt, area in external_contours(mask, min_pothole_area)]
+
+
+def _water_candidates(scale_img, std_brightness, scale_factor, mask, acquire,
+                      frame_shape=None, hsv_means=None):
+    """积水分支：HSV空间中高亮度、低饱和度的区域，返回 (候选框, (饱和度均值, 亮度均值))"""
+    shape = scale_img.shape[:2]
+    frame_shape = frame_shape or shape
+    hsv = cv2.cvtColor(scale_img, cv2.COLOR_BGR2HSV, dst=acquire(scale_img.shape))
+    if hsv_means is None:
+        _, mean_s, mean_v, _ = cv2.mean(hsv)
+        hsv_means = (mean_s, mean_v)
+    mean_s, mean_v = hsv_means
+
+    v_thresh = mean_v + std_brightness * 0.5
+    s_thresh = mean_s * 0.5
+
+    cv2.inRange(hsv, (0, 0, v_thresh), (180, s_thresh, 255), dst=mask)
+    del hsv
+
+    water_kernel_size = max(7, min(15, int(frame_shape[0] * 0.015)))
+    if water_kernel_size % 2 == 0:
+        water_kernel_size += 1
+    morphology.apply(mask, 'open', water_kernel_size, dst=mask)
+
+    min_water_area = frame_shape[0] * frame_shape[1] * 0.005
+    max_water_area = frame_shape[0] * frame_shape[1] * 0.1
+    candidates = [_to_original(cv2.boundingRect(cnt), scale_factor)
+                  for cnt, area in external_contours(mask, min_water_area) if area <= max_water_area]
+    return candidates, hsv_means
+
+
+def _refine_regions(boxes, scale_factor, shape, pad=32, max_coverage=0.5, cell=8):
+    """把粗尺度的候选框（原始图像坐标）换算到 scale_factor 尺度、外扩后合并为互不重叠的矩形区域
+
+    外扩量为 pad 像素加上框边长的四分之一（均为原始图像尺寸），足以覆盖各分支形态学处理的作用范围。
+    在 cell×cell 的网格上标记外扩后的框，按连通域取外接矩形 [(x, y, w, h), ...]（该尺度图像坐标）；
+    区域总面积超过图像的 max_coverage 时返回 None，表示直接处理整幅图像更划算。
+    """
+    h, w = shape
+    grid = np.zeros((-(-h // cell), -(-w // cell)), np.uint8)
+    for x, y, bw, bh in boxes:
+        margin = pad + max(bw, bh) // 4
+        x0, y0 = max(int((x - margin) * scale_factor), 0), max(int((y - margin) * scale_factor), 0)
+        x1 = min(int((x + bw + margin) * scale_factor), w - 1)
+        y1 = min(int((y + bh + margin) * scale_factor), h - 1)
+        grid[y0 // cell:y1 // cell + 1, x0 // cell:x1 // cell + 1] = 1
+    if grid.mean() > max_coverage:
+        return None
+    count, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+    regions = []
+    for gx, gy, gw, gh, _ in stats[1:count]:
+        x, y = gx * cell, gy * cell
+        regions.append((x, y, min((gx + gw) * cell, w) - x, min((gy + gh) * cell, h) - y))
+    return regions
+
+
+def _inside_region(box, region, shape):
+    """区域内的候选框（该尺度图像坐标）是否离开了区域边界：贴着区域边界（且该边界不是图像边界）的
+    候选只是区域外目标的一部分"""
+    x, y, w, h = box
+    rx, ry, rw, rh = region
+    return ((rx == 0 or x > 0) and (ry == 0 or y > 0)
+            and (rx + rw == shape[1] or x + w < rw) and (ry + rh == shape[0] or y + h < rh))
+
+
+def _refine_branch(branch, scale_img, gray, regions, global_contrast, std_brightness, hsv_means,
+                   scale_factor, acquire, low_memory):
+    """由粗到精模式下在某一细尺度上只对 regions（见 _refine_regions）运行一个分支，返回候选框
+
+    尺度图像、灰度统计量和裂缝的梯度阈值都来自该尺度的整幅图像，与整幅处理一致；积水分支的HSV均值
+    沿用粗尺度的值，坑洼分支的CLAHE按区域计算，因此结果与整幅处理相比可能有少量差异。
+    """
+    shape = scale_img.shape[:2]
+    if not regions:
+        return []
+    if branch == 'cracks':
+        raw_threshold = _crack_raw_threshold(gray, global_contrast, acquire)
+    candidates = []
+    for region in regions:
+        x, y, w, h = region
+        mask = acquire((h, w))
+        if branch == 'cracks':
+            found = _crack_candidates(gray[y:y+h, x:x+w], global_contrast, 1.0, mask, acquire, low_memory,
+                                      shape, raw_threshold)
+        elif branch == 'potholes':
+            found = _pothole_candidates(scale_img[y:y+h, x:x+w], global_contrast, std_brightness, 1.0, mask,
+                                        acquire, shape)
+        else:
+            found = _water_candidates(scale_img[y:y+h, x:x+w], std_brightness, 1.0, mask, acquire, shape,
+                                      hsv_means)[0]
+        # 先在区域坐标中剔除贴边的候选，再换算回原始图像尺寸
+        candidates += [_to_original(box, scale_factor, (x, y)) for box in found
+                       if _inside_region(box, region, shape)]
+    return candidates
+
+
+def detect_defects_intelligent(image, scales=(0.5, 1.0, 1.5), quality_gate=None, road_roi=None, out=None,
+                               low_memory=False, budget_ms=None, cost_model=None, stage_times=None,
+                               refine=False, refine_pad=32, refine_min_candidates=3):
+    """智能路面缺陷检测算法 - 自适应增强版
+    scales: 参与检测的尺度，减少尺度可降低耗时（实时模式下使用）
+    quality_gate: 可选的图像质量门限（quality_gate.QualityGate），低质量帧跳过或降级检测
+    road_roi: 可选的路面区域（road_roi.RoadROI），只在ROI内检测
+    out: 可选的结果图数组（与 image 同形状），检测框绘制在其中
+    low_memory: 低内存模式（用于8K等大图）：梯度使用float32而非float64，中间结果不放回缓冲池，
+        每个分支用完后立即释放，同一时刻只保留当前分支所需的数组；梯度精度不同，检测结果可能有少量差异
+    budget_ms: 时间预算（毫秒）。按 cost_model（默认为启动时标定的 default_cost_model()）预测的各阶段耗时
+        选择在预算内执行的尺度和缺陷分支，执行中实际耗时超出预算时跳过剩余分支；
+        结果仍是完整有效的检测结果，defects['budget'] 记录执行和跳过的 (尺度, 分支)
+    stage_times: 传入列表时追加各阶段的实测 (阶段名, 像素数, 耗时ms)，用于标定耗时模型
+    refine: 由粗到精模式：不大于原尺寸的尺度（粗尺度）处理整幅图像，放大的尺度中各分支只重新分析该分支
+        粗尺度候选框外扩 refine_pad 像素后的区域，见 _refine_branch；输出格式不变。粗尺度候选少于
+        refine_min_candidates 个或区域过大的分支仍处理整幅图像：只在细尺度上出现的目标附近往往没有粗尺度候选
+    """
+    if refine and budget_ms is not None:
+        raise ValueError("由粗到精模式(refine)不能与时间预算(budget_ms)同时使用")
+    try:
+        start = time.perf_counter()
+        # 0. 图像质量门限：低质量帧跳过检测或只在最小尺度上检测
+        quality = None
+        if quality_gate is not None:
+            quality = quality_gate.evaluate(image)
+            if quality['action'] == 'skip':
+                return image, Detections.empty(meta={'quality': quality})
+            if quality['action'] == 'cheap':
+                scales = scales[:1]
+
+        # 0.1 路面ROI：只在ROI外接矩形内检测
+        roi_mask, roi_box = _road_roi_region(image, road_roi)
+        if roi_mask is not None and roi_box[2] * roi_box[3] == 0:
+            return image, Detections.empty(meta={'roi': {'box': roi_box, 'removed': 0}})
+
+        # 1. 预处理：ROI模式下只取外接矩形区域（只读视图，不复制）
+        if roi_mask is not None:
+            x0, y0, w0, h0 = roi_box
+            img = image[y0:y0+h0, x0:x0+w0]
+        else:
+            img = image
+
+        # 1.1 时间预算：按耗时模型选择要执行的尺度和分支（结果绘制等收尾开销预先扣除）
+        branches = {scale_factor: DEFECT_TYPES for scale_factor in scales}
+        budget = None
+        if budget_ms is not None:
+            cost_model = cost_model or default_cost_model()
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            overhead_ms = elapsed_ms + cost_model.predict('finish', image.shape[0] * image.shape[1])
+            selected, skipped, predicted_ms = cost_model.plan(img.shape[:2], scales, budget_ms, DEFECT_TYPES,
+                                                              overhead_ms)
+            branches = {scale_factor: tuple(b for b in DEFECT_TYPES if b in selected.get(scale_factor, ()))
+                        for scale_factor in scales}
+            budget = {'budget_ms': budget_ms, 'predicted_ms': predicted_ms, 'ran': [],
+                      'skipped': [{'scale': s, 'branch': b, 'reason': 'predicted'} for s, b in skipped]}
+            deadline = start + budget_ms / 1000.0
+
+        def timed(stage, pixels, since):
+            # 记录一个阶段的耗时：用于标定，以及预算模式下修正耗时模型
+            ms = (time.perf_counter() - since) * 1000.0
+            if stage_times is not None:
+                stage_times.append((stage, pixels, ms))
+            if budget is not None:
+                cost_model.observe(stage, pixels, ms)
+
+        # 2. 多尺度特征提取：逐个尺度计算，原尺寸的中间结果使用缓冲池中的数组，用完即归还；
+        # 其余尺度的数组只在本次调用中用到一次，放回池中只会增加常驻内存，因此直接分配
+        defect_candidates = {'cracks': [], 'potholes': [], 'water': []}
+        # 由粗到精模式：粗尺度最先处理整幅图像并累积各分支的候选框，放大的尺度只分析候选框附近的区域
+        coarse_scales, coarse, hsv_means = (), {branch: [] for branch in DEFECT_TYPES}, None
+        if refine:
+            coarse_scales = [s for s in scales if s <= 1.0] or [min(scales)]
+            scales = sorted(coarse_scales) + [s for s in scales if s not in coarse_scales]
+
+        for scale_factor in scales:
+            if not branches[scale_factor]:
+                continue
+            pool = DEFAULT_POOL if scale_factor == 1.0 and not low_memory else _UNPOOLED
+            with pool.scope() as acquire:
+                since = time.perf_counter()
+                # 2.1 多尺度处理
+                if scale_factor == 1.0:
+                    scale_img = img
+                else:
+                    size = (round(img.shape[0] * scale_factor), round(img.shape[1] * scale_factor))
+                    scale_img = cv2.resize(img, None, dst=acquire(size + img.shape[2:]),
+                                           fx=scale_factor, fy=scale_factor)
+                shape = scale_img.shape[:2]
+                pixels = shape[0] * shape[1]
+
+                # 2.2 灰度统计特征（HSV和LAB在用到的分支中才计算）
+                gray = cv2.cvtColor(scale_img, cv2.COLOR_BGR2GRAY, dst=acquire(shape))
+
+                mean_brightness, std_brightness = _mean_std(gray)
+                p5, p95 = _percentiles_u8(gray, (5, 95))
+                global_contrast = (p95 - p5) / 255.0
+                mask = acquire(shape)
+                timed('prep', pixels, since)
+
+                # 3. 缺陷检测：裂缝、坑洼、积水三个分支共用同一个掩码数组
+                for branch in branches[scale_factor]:
+                    if budget is not None:
+                        remaining_ms = (deadline - time.perf_counter()) * 1000.0
+                        if cost_model.predict(branch, pixels) > remaining_ms:
+                            budget['skipped'].append({'scale': scale_factor, 'branch': branch, 'reason': 'overrun'})
+                            continue
+                        budget['ran'].append({'scale': scale_factor, 'branch': branch})
+                    since = time.perf_counter()
+                    regions = None
+                    if (refine and scale_factor not in coarse_scales
+                            and len(coarse[branch]) >= refine_min_candidates):
+                        regions = _refine_regions(coarse[branch], scale_factor, shape, refine_pad)
+                    if regions is not None:
+                        # 各区域尺寸不同，临时数组不放回缓冲池
+                        found = _refine_branch(branch, scale_img, gray if branch == 'cracks' else None, regions,
+                                               global_contrast, std_brightness, hsv_means, scale_factor,
+                                               _UNPOOLED.acquire, low_memory)
+                    elif branch == 'cracks':
+                        found = _crack_candidates(
+                            gray, global_contrast, scale_factor, mask, acquire, low_memory)
+                    elif branch == 'potholes':
+                        found = _pothole_candidates(
+                            scale_img, global_contrast, std_brightness, scale_factor, mask, acquire)
+                    else:
+                        found, hsv_means = _water_candidates(
+                            scale_img, std_brightness, scale_factor, mask, acquire)
+                    defect_candidates[branch] += found
+                    timed(branch if regions is None else 'refine', pixels, since)
+                    if scale_factor in coarse_scales:
+                        coarse[branch] += found
+                    if branch == 'cracks':
+                        # 之后的分支不再需要灰度图
+                        del gray
+                del mask
+
+        since = time.perf_counter()
+        # 3.4 ROI模式下将候选框还原到整幅图像坐标，并剔除ROI外的候选
+        roi_removed = 0
+        if roi_mask is not None:
+            for defect_type, boxes in defect_candidates.items():
+                boxes = [(x + roi_box[0], y + roi_box[1], w, h) for (x, y, w, h) in boxes]
+                keep = road_roi.filter_boxes(boxes, roi_mask)
+                defect_candidates[defect_type] = [box for box, k in zip(boxes, keep) if k]
+                roi_removed += len(boxes) - len(defect_candidates[defect_type])
+
+        # 4. 非极大值抑制和结果融合
+        result_image = _copy_to_output(image, out)
+        meta = {}
+        if quality is not None:
+            meta['quality'] = quality
+        if roi_mask is not None:
+            meta['roi'] = {'box': roi_box, 'removed': roi_removed}
+        candidates = Detections.from_lists(defect_candidates, meta=meta)
+
+        # 按缺陷类型批量NMS，面积大的框优先保留（面积相同时的顺序与原实现一致）；结果按类别排列，类别内按面积从大到小
+        keep = box_ops.batched_nms(candidates.boxes, box_ops.legacy_rank(candidates.areas, candidates.class_ids),
+                                   candidates.class_ids, 0.3, inclusive=True)
+        keep = keep[np.argsort(candidates.class_ids[keep], kind='stable')]
+        defects = candidates[keep]
+
+        # 5. 绘制结果
+        colors = [(0, 255, 0), (255, 0, 0), (0, 0, 255)]
+        labels = ['Crack', 'Pothole', 'Water']
+
+        for (x, y, w, h), class_id in zip(defects.boxes.tolist(), defects.class_ids.tolist()):
+            cv2.rectangle(result_image, (x, y), (x+w, y+h), colors[class_id], 2)
+            cv2.putText(result_image, labels[class_id], (x, y-5),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[class_id], 2)
+        timed('finish', image.shape[0] * image.shape[1], since)
+
+        if budget is not None:
+            budget['elapsed_ms'] = (time.perf_counter() - start) * 1000.0
+            defects['budget'] = budget
+        return result_image, defects
+
+    except Exception as e:
+        print(f"智能检测出错: {str(e)}")
+        return image, Detections.empty()
+
+
+def _calibration_image(width, height, seed=0):
+    """标定用的合成路面图像：沥青纹理上叠加少量裂缝和坑洼，使各分支都有轮廓可处理"""
+    rng = np.random.default_rng(seed)
+    image = cv2.cvtColor(rng.normal(110, 15, (height, width)).clip(0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    for _ in range(4):
+        points = np.cumsum(rng.integers(-12, 13, (12, 2)), axis=0) + (rng.integers(0, width), rng.integers(0, height))
+        cv2.polylines(image, [points.astype(np.int32)], False, (35, 35, 35), 2)
+    for _ in range(2):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.ellipse(image, center, (width // 25, height // 30), 0, 0, 360, (50, 50, 55), -1)
+    return image
+
+
+def calibrate_intelligent_costs(sample=None, sizes=((360, 640), (720, 1280)), repeat=2):
+    """测量智能检测各阶段（预处理、三个分支、收尾）的耗时，拟合 StageCostModel
+
+    sample: 标定用的图像（如视频的第一帧），缩放到 sizes 中的各尺寸；为None时使用合成路面图像
+    """
+    samples = []
+    for height, width in sizes:
+        image = (_calibration_image(width, height) if sample is None
+                 else cv2.resize(sample, (width, height), interpolation=cv2.INTER_AREA))
+        detect_defects_intelligent(image)  # 预热，不计入
+        for _ in range(repeat):
+            detect_defects_intelligent(image, stage_times=samples)
+    return StageCostModel.fit(samples)
+
+
+_default_cost_model = None
+_default_cost_model_lock = threading.Lock()
+
+
+def default_cost_model():
+    """首次使用时标定的全局耗时模型（各线程共享，在线修正）"""
+    global _default_cost_model
+    with _default_cost_model_lock:
+        if _default_cost_model is None:
+            _default_cost_model = calibrate_intelligent_costs()
+        return _default_cost_model
+
+
+def draw_yolo_box(image, x1, y1, x2, y2, cls_id, conf, class_names=DEFAULT_CLASSES):
+    """在图像上绘制一个YOLO检测框及标签"""
+    class_name = class_names[cls_id] if cls_id < len(class_names) else "unknown"
+    label = f"{class_name} {conf:.2f}"
+
+    # 使用红色绘制边界框
+    cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+
+    # 绘制标签背景
+    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+    cv2.rectangle(image, (x1, y1 - th - 4), (x1 + tw, y1), (0, 0, 255), -1)
+
+    # 添加白色文本
+    cv2.putText(image, label, (x1, y1 - 5),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+
+def detect_with_yolo(model, image, class_names=DEFAULT_CLASSES, confidence=0.3, iou=0.45, draw=True, out=None):
+    """使用YOLOv12进行检测，返回 (结果图, Detections)
+
+    draw为False时不绘制结果（返回的结果图即输入图像）；out 为可选的结果图数组
+    """
+    if model is None:
+        raise RuntimeError("YOLOv12模型未加载")
+
+    # 推理预测（直接传入内存中的BGR数组，避免临时文件的编解码开销和多线程共用同名文件的冲突）
+    result = model.predict(image, conf=confidence, iou=iou)[0]
+
+    # 转换为检测结果数组
+    boxes = result.boxes
+    detections = Detections.from_xyxy(
+        boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(),
+        class_names=class_names)
+
+    # 创建结果图像
+    result_image = _copy_to_output(image, out) if draw else image
+    if draw:
+        for (x, y, w, h), cls_id, conf in zip(detections.boxes.tolist(), detections.class_ids.tolist(),
+                                              detections.scores.tolist()):
+            draw_yolo_box(result_image, x, y, x + w, y + h, cls_id, conf, class_names)
+
+    return result_image, detections
+
+
+def detect_with_segment(model, image, confidence=0.3, iou=0.45):
+    """使用分割模型进行检测，返回 (标注图, Detections, 模型原始结果)
+
+    原始结果只用于ROI过滤后重新绘制标注图。
+    """
+    if model is None:
+        raise RuntimeError("分割模型未加载")
+
+    # 推理预测（直接传入内存中的BGR数组）
+    result = model.predict(image, conf=confidence, iou=iou, imgsz=640)[0]
+
+    # 获取标注后的图像，掩码按游程编码保存，面积为掩码像素数
+    names = result.names or {}
+    class_names = [names.get(i, 'unknown') for i in range(max(names, default=-1) + 1)]
+    boxes = result.boxes
+    masks = None
+    if hasattr(result, 'masks') and result.masks is not None:
+        annotated_image = result.plot()
+        masks = result.masks.data.cpu().numpy() > 0.5
+    else:
+        # 没有检测结果时标注图就是输入图像（各函数都不修改输入，无需复制）
+        annotated_image = image
+    detections = Detections.from_xyxy(
+        boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(),
+        class_names=class_names, masks=masks)
+
+    return annotated_image, detections, result
+
+
+def detect_defects_ai(image, yolo_model=None, segment_model=None, detection_mode='bbox',
+                      class_names=DEFAULT_CLASSES, confidence=0.3, iou=0.45, quality_gate=None, road_roi=None,
+                      out=None):
+    """使用AI方法进行缺陷检测
+
+    返回的 Detections 中为坑洼检测结果，附加信息 'stats' 为两个模型的统计，
+    'segment' 为分割模型的全部检测结果（含掩码）。
+    yolo_model / segment_model: 已加载的边界框/分割模型（可为 SharedModel），按 detection_mode 使用
+    out: 可选的结果图数组（与 image 同形状）
+    """
+    if image is None:
+        return image, Detections.empty(meta={'stats': {}})
+
+    try:
+        # 图像质量门限：低质量帧跳过检测或只做边界框检测
+        meta = {'stats': {}}
+        if quality_gate is not None:
+            meta['quality'] = quality_gate.evaluate(image)
+            if meta['quality']['action'] == 'skip':
+                return image, Detections.empty(meta=meta)
+            if meta['quality']['action'] == 'cheap':
+                detection_mode = 'bbox'
+
+        # 路面ROI：模型只在ROI外接矩形内推理，ROI外的检测结果被剔除
+        roi_mask, roi_box = _road_roi_region(image, road_roi)
+        source = image
+        roi_removed = 0
+        if roi_mask is not None:
+            x0, y0, w0, h0 = roi_box
+            if w0 * h0 == 0:
+                meta['roi'] = {'box': roi_box, 'removed': 0}
+                return image, Detections.empty(meta=meta)
+            source = image[y0:y0+h0, x0:x0+w0]
+
+        # 结果图只在需要时分配：边界框结果直接画在 out 上，分割标注图由模型生成
+        result_image = None
+        meta['stats'] = {
+            'bbox': {'count': 0, 'areas': []},
+            'segment': {'count': 0, 'areas': []}
+        }
+        potholes = Detections.empty()
+
+        if detection_mode in ['bbox', 'both']:
+            # 使用YOLOv12进行边界框检测（ROI模式下在整幅图上自行绘制保留的框）
+            result_image, bbox_detections = detect_with_yolo(
+                yolo_model, source, class_names, confidence, iou, draw=roi_mask is None, out=out)
+            if roi_mask is not None:
+                bbox_detections = bbox_detections.transformed(offset=roi_box[:2])
+                keep = road_roi.filter_boxes(bbox_detections.boxes, roi_mask)
+                roi_removed += len(keep) - int(np.count_nonzero(keep))
+                bbox_detections = bbox_detections[keep]
+                result_image = _copy_to_output(image, out)
+                for (x, y, w, h), cls_id, conf in zip(bbox_detections.boxes.tolist(),
+                                                      bbox_detections.class_ids.tolist(),
+                                                      bbox_detections.scores.tolist()):
+                    draw_yolo_box(result_image, x, y, x + w, y + h, cls_id, conf, class_names)
+
+            # 模型的 pothole 类别对应缺陷类型 potholes
+            found = bbox_detections.select('pothole')
+            potholes = Detections(found.boxes, found.scores, np.full(len(found), DEFECT_TYPES.index('potholes')),
+                                  found.areas)
+            meta['stats']['bbox'] = {
+                'count': len(potholes),
+                'areas': bbox_detections.areas.tolist()
+            }
+
+        if detection_mode in ['segment', 'both']:
+            with DEFAULT_POOL.scope() as acquire:
+                # 使用分割模型进行检测
+                segment_image, segment_detections, segment_result = detect_with_segment(
+                    segment_model, source, confidence, iou)
+
+                if roi_mask is not None:
+                    # 分割模式下标注图直接贴在 out 上；融合模式下 out 已用于边界框结果，使用临时缓冲
+                    full = out if detection_mode == 'segment' else acquire(image.shape)
+                    segment_image, segment_detections, removed = _filter_segment_by_roi(
+                        image, road_roi, segment_image, segment_detections, segment_result, roi_mask, roi_box, full)
+                    roi_removed += removed
+
+                # 更新分割统计信息
+                meta['stats']['segment'] = {
+                    'count': len(segment_detections),
+                    'areas': segment_detections.areas.tolist() if segment_detections.has_masks else []
+                }
+                meta['segment'] = segment_detections
+
+                if detection_mode == 'segment':
+                    result_image = segment_image
+                elif detection_mode == 'both':
+                    # 两个模型对同一坑洼的检测框做加权融合
+                    potholes = _fuse_potholes(potholes, segment_detections)
+
+                    # 确保图像大小一致，与边界框结果图原地混合
+                    if segment_image.shape != result_image.shape:
+                        segment_image = cv2.resize(segment_image, (result_image.shape[1], result_image.shape[0]))
+                    alpha = 0.5
+                    cv2.addWeighted(result_image, 1-alpha, segment_image, alpha, 0, dst=result_image)
+
+        if result_image is None:
+            result_image = _copy_to_output(image, out)
+        elif out is not None and result_image is not out:
+            np.copyto(out, result_image)
+            result_image = out
+
+        if roi_mask is not None:
+            meta['roi'] = {'box': roi_box, 'removed': roi_removed}
+        potholes.meta = meta
+        return result_image, potholes
+
+    except Exception as e:
+        print(f"AI检测出错: {str(e)}")
+        return image, Detections.empty(meta={'stats': {}})
+
+
+def _fuse_potholes(potholes, segment_detections):
+    """将边界框模型的坑洼检测与分割模型中类别为 pothole 的检测做加权框融合"""
+    found = segment_detections.select('pothole')
+    if len(found) == 0:
+        return potholes
+    fused, scores, _ = box_ops.weighted_box_fusion(
+        np.concatenate([potholes.boxes, found.boxes]), np.concatenate([potholes.scores, found.scores]))
+    return Detections(np.round(fused), scores, np.full(len(fused), DEFECT_TYPES.index('potholes')))
+
+
+def _filter_segment_by_roi(image, road_roi, segment_image, detections, result, roi_mask, roi_box, out=None):
+    """把分割结果还原到整幅图像坐标并剔除ROI外的检测，ROI外接矩形内的标注图贴回整幅图像"""
+    x0, y0, w0, h0 = roi_box
+    detections = detections.transformed(offset=(x0, y0))
+    keep = road_roi.filter_boxes(detections.boxes, roi_mask)
+    idx = np.flatnonzero(keep)
+    removed = len(keep) - len(idx)
+    if removed:
+        detections = detections[idx]
+        segment_image = result[idx].plot() if len(idx) else result.orig_img
+
+    full_image = _copy_to_output(image, out)
+    full_image[y0:y0+h0, x0:x0+w0] = segment_image
+    return full_image, detections, removed
+
+
+def connect_edges(edges, min_threshold=5, max_threshold=15):
+    """边缘连接：连接距离在 [min_threshold, max_threshold] 范围内的边缘端点
+
+    端点取所有8邻域内恰好只有一个边缘像素的像素（骨架端点），
+    用KD树一次性查找阈值范围内的端点对，并批量绘制连接线。
+    """
+    _, connected = cv2.threshold(edges, 0, 255, cv2.THRESH_BINARY)
+    points = cv2.findNonZero(connected)
+    if points is None or len(points) < 2:
+        return connected
+    points = points.reshape(-1, 2)
+
+    # 向量化提取端点：只在边缘像素处统计8邻域边缘像素数，恰好为1的是端点
+    padded = cv2.copyMakeBorder(connected, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    xs, ys = points[:, 0] + 1, points[:, 1] + 1
+    neighbours = np.zeros(len(points), np.uint8)
+    for dy, dx in NEIGHBOUR_OFFSETS:
+        neighbours += padded[ys + dy, xs + dx] > 0
+    endpoints = points[neighbours == 1]
+    if len(endpoints) < 2:
+        return connected
+
+    # KD树查找最大阈值内的端点对，再按最小阈值过滤
+    pairs = cKDTree(endpoints).query_pairs(max_threshold, output_type='ndarray')
+    if len(pairs) == 0:
+        return connected
+    diff = endpoints[pairs[:, 0]] - endpoints[pairs[:, 1]]
+    distance = np.sqrt((diff * diff).sum(axis=1))
+    pairs = pairs[distance >= min_threshold]
+
+    # 批量绘制所有连接线
+    draw_segments(connected, endpoints[pairs], max_threshold)
+
+    return connected
@@ -1,18 +1,18 @@
+import os
+
 import cv2
 import numpy as np
-from scipy import fftpack
-import os
-import sys
 
-# 添加YOLOv12的导入
-try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
-    YOLO_AVAILABLE = False
-    print("警告: 未安装ultralytics库，AI检测功能将不可用")
+import image_ops
+from detections import Detections
+
 
 class ImageProcessor:
+    """保存当前图像和处理参数的封装，各操作由 image_ops 中的无状态函数完成
+
+    同一个实例不应被多个线程同时使用；需要并发时直接调用 image_ops。
+    """
+
     def __init__(self):
         self.original_image = None
         self.current_image = None
@@ -20,9 +20,15 @@ class ImageProcessor:
         self.brightness = 0
         self.contrast = 1.0
         self.fft_radius = 30
+        self.connect_threshold = 5  # 边缘连接的最小/最大端点距离
+        self.connect_max_threshold = 15
+        self.fft_mode = 'square'  # FFT高通滤波器类型，见 fft_engine.FILTER_KINDS
         self.morph_size = 3
+        self.morph_shape = 'rect'  # 结构元素形状，见 morphology.SHAPES
         self.canny_low = 50
         self.canny_high = 150
+        self.low_memory = False  # 智能检测使用低内存模式（8K等大图）
+        self.refine = False  # 智能检测使用由粗到精模式（细尺度只分析粗尺度候选区域）
         
         # 添加YOLOv12相关属性
         self.yolo_model = None
@@ -32,6 +38,8 @@ class ImageProcessor:
         self.yolo_confidence = 0.3
         self.yolo_iou = 0.45
         self.detection_mode = 'bbox'  # 新增检测模式：'bbox', 'segment', 'both'
+        self.quality_gate = None  # 可选的图像质量门限（quality_gate.QualityGate），低质量帧跳过或降级检测
+        self.road_roi = None  # 可选的路面区域（road_roi.RoadROI），只在ROI内检测
         
     def load_image(self, image_path):
         """加载图片并进行错误处理"""
@@ -41,13 +49,14 @@ class ImageProcessor:
             if img is None:
                 raise ValueError(f"无法读取图片: {image_path}\n请确保文件格式正确且未损坏")
             self.original_image = img
-            self.current_image = self.original_image.copy()
+            # image_ops 中的函数都不修改输入图像，当前图像可以直接与原图共享
+            self.current_image = self.original_image
             return self.original_image
         except Exception as e:
             raise ValueError(f"加载图片失败: {image_path}\n错误信息: {str(e)}")
         
     def reset_image(self):
-        self.current_image = self.original_image.copy()
+        self.current_image = self.original_image
         
     def adjust_brightness_contrast(self, brightness=0, contrast=1):
         """调整亮度和对比度
@@ -55,681 +64,140 @@ class ImageProcessor:
         contrast: 0 到 3
         """
         # 每次调节都基于原始图像
-        image = self.original_image.astype(np.float32)
-        
-        # 对比度调节
-        if contrast != 1:
-            mean = np.mean(image)
-            adjusted = (image - mean) * contrast + mean
-        else:
-            adjusted = image
-        
-        # 亮度调节
-        if brightness != 0:
-            adjusted = adjusted + brightness
-        
-        # 确保值在0-255范围内
-        adjusted = np.clip(adjusted, 0, 255)
-        
-        # 转换回uint8类型
-        self.current_image = adjusted.astype(np.uint8)
+        self.current_image = image_ops.adjust_brightness_contrast(self.original_image, brightness, contrast)
         return self.current_image
 
     def clahe_enhancement(self, clip_limit=2.0, tile_size=8):
         """CLAHE自适应直方图均衡化"""
-        lab = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
-        l = clahe.apply(l)
-        lab = cv2.merge((l, a, b))
-        self.current_image = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        self.current_image = image_ops.clahe_enhancement(self.current_image, clip_limit, tile_size)
         return self.current_image
 
     def fft_filter(self):
-        """FFT高通滤波"""
+        """FFT高通滤波（滤波器类型由 fft_mode 指定：square / circle / butterworth）"""
         # 使用当前图像进行处理，而不是原图
-        gray = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2GRAY)
-        f = fftpack.fft2(gray)
-        fshift = fftpack.fftshift(f)
-        
-        rows, cols = gray.shape
-        crow, ccol = rows//2, cols//2
-        mask = np.ones((rows, cols), np.uint8)
-        mask[crow-self.fft_radius:crow+self.fft_radius, 
-             ccol-self.fft_radius:ccol+self.fft_radius] = 0
-        
-        fshift = fshift * mask
-        f_ishift = fftpack.ifftshift(fshift)
-        img_back = fftpack.ifft2(f_ishift)
-        img_back = np.abs(img_back)
-        
-        img_back = ((img_back - img_back.min()) * 255 / 
-                   (img_back.max() - img_back.min())).astype(np.uint8)
-        return cv2.cvtColor(img_back, cv2.COLOR_GRAY2BGR)
+        return image_ops.fft_filter(self.current_image, self.fft_radius, self.fft_mode)
 
     def detect_edges(self):
         """Canny边缘检测"""
         # 使用当前图像进行处理，而不是原图
-        gray = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, self.canny_low, self.canny_high)
-        return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
+        return image_ops.detect_edges(self.current_image, self.canny_low, self.canny_high)
 
     def enhance_image(self):
         """综合图像增强处理"""
-        try:
-            # 转换到LAB颜色空间
-            lab = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            
-            # CLAHE处理
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            l = clahe.apply(l)
-            
-            # 高斯滤波去噪
-            l = cv2.GaussianBlur(l, (3,3), 0)
-            
-            # 合并通道
-            enhanced_lab = cv2.merge([l, a, b])
-            enhanced = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-            
-            # 锐化处理
-            kernel = np.array([[-1,-1,-1],
-                              [-1, 9,-1],
-                              [-1,-1,-1]])
-            enhanced = cv2.filter2D(enhanced, -1, kernel)
-            
-            # 确保值在合法范围内
-            enhanced = np.clip(enhanced, 0, 255).astype(np.uint8)
-            
-            self.current_image = enhanced
-            return self.current_image
-        except Exception as e:
-            print(f"图像增强处理出错: {str(e)}")
-            return self.current_image
+        self.current_image = image_ops.enhance_image(self.current_image)
+        return self.current_image
+
+    def morph(self, morph_type='erode'):
+        """对当前图像做形态学操作，核大小为 morph_size，结构元素形状为 morph_shape"""
+        return image_ops.morph(self.current_image, morph_type, self.morph_size, shape=self.morph_shape)
 
     def detect_cracks(self):
         """检测裂缝并返回边界框"""
-        # 预处理
-        gray = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (7, 7), 0)
-        
-        # 自适应阈值分割
-        thresh = cv2.adaptiveThreshold(
-            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
-        
-        # 形态学操作
-        kernel = np.ones((3,3), np.uint8)
-        opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
-        
-        # 查找轮廓
-        contours, _ = cv2.findContours(
-            opening, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-        )
-        
-        # 绘制边界框
-        result_image = self.current_image.copy()
-        boxes = []
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area > 100:  # 过滤小区域
-                x, y, w, h = cv2.boundingRect(cnt)
-                boxes.append((x, y, w, h))
-                cv2.rectangle(result_image, (x, y), 
-                            (x+w, y+h), (0, 255, 0), 2)
-        
-        self.current_image = result_image
-        return self.current_image, boxes
+        self.current_image, detections = image_ops.detect_cracks(self.current_image)
+        return self.current_image, detections
 
     def detect_cracks_advanced(self):
         """高级裂缝检测算法"""
-        try:
-            # 预处理
-            gray = cv2.cvtColor(self.current_image, cv2.COLOR_BGR2GRAY)
-            
-            # 自适应直方图均衡化
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            gray = clahe.apply(gray)
-            
-            # 高斯滤波去噪
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            
-            # 形态学梯度
-            kernel = np.ones((3,3), np.uint8)
-            gradient = cv2.morphologyEx(blurred, cv2.MORPH_GRADIENT, kernel)
-            
-            # Otsu自适应阈值分割
-            _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # 形态学操作
-            kernel = np.ones((3,3), np.uint8)
-            opened = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=1)
-            closed = cv2.morphologyEx(opened, cv2.MORPH_CLOSE, kernel, iterations=2)
-            
-            # 查找轮廓
-            contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # 分析和绘制结果
-            result_image = self.current_image.copy()
-            boxes = []
-            
-            for cnt in contours:
-                try:
-                    area = cv2.contourArea(cnt)
-                    if area > 50:  # 面积阈值
-                        # 计算最小外接矩形
-                        rect = cv2.minAreaRect(cnt)
-                        box = cv2.boxPoints(rect)
-                        box = box.astype(np.int32)
-                        
-                        # 计算矩形的长宽比
-                        width = rect[1][0]
-                        height = rect[1][1]
-                        aspect_ratio = max(width, height) / (min(width, height) + 1e-6)
-                        
-                        # 根据形状特征筛选
-                        if aspect_ratio > 2:  # 裂缝通常细长
-                            x, y, w, h = cv2.boundingRect(cnt)
-                            boxes.append((x, y, w, h))
-                            # 绘制轮廓和边界框
-                            cv2.drawContours(result_image, [box], 0, (0, 255, 0), 2)
-                            cv2.rectangle(result_image, (x,y), (x+w,y+h), (255, 0, 0), 2)
-                except Exception as e:
-                    print(f"处理轮廓时出错: {str(e)}")
-                    continue
-            
-            self.current_image = result_image
-            return self.current_image, boxes
-        except Exception as e:
-            print(f"缺陷检测出错: {str(e)}")
-            return self.current_image, []
-
-    def detect_defects_intelligent(self):
-        """智能路面缺陷检测算法 - 自适应增强版"""
-        try:
-            # 1. 预处理和自适应参数计算
-            img = self.current_image.copy()
-            
-            # 1.1 多尺度处理
-            img_small = cv2.resize(img, None, fx=0.5, fy=0.5)
-            img_large = cv2.resize(img, None, fx=1.5, fy=1.5)
-            images = [img_small, img, img_large]
-            
-            # 1.2 颜色空间转换和统计特征计算
-            features = []
-            stats = []
-            for scale_img in images:
-                # 转换颜色空间
-                gray = cv2.cvtColor(scale_img, cv2.COLOR_BGR2GRAY)
-                hsv = cv2.cvtColor(scale_img, cv2.COLOR_BGR2HSV)
-                lab = cv2.cvtColor(scale_img, cv2.COLOR_BGR2LAB)
-                
-                # 计算统计特征
-                mean_brightness = np.mean(gray)
-                std_brightness = np.std(gray)
-                global_contrast = (np.percentile(gray, 95) - np.percentile(gray, 5)) / 255.0
-                
-                features.append((gray, hsv, lab))
-                stats.append((mean_brightness, std_brightness, global_contrast))
-            
-            # 2. 多尺度特征提取
-            defect_candidates = {'cracks': [], 'potholes': [], 'water': []}
-            
-            for idx, ((gray, hsv, lab), (mean_brightness, std_brightness, global_contrast)) in enumerate(zip(features, stats)):
-                scale_factor = 0.5 if idx == 0 else (1.5 if idx == 2 else 1.0)
-                
-                # 2.1 自适应CLAHE增强
-                clip_limit = max(2.0, min(4.0, 3.0 * (1 - global_contrast)))
-                clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8,8))
-                l_enhanced = clahe.apply(lab[:,:,0])
-                
-                # 2.2 自适应梯度特征
-                ksize = 3 if global_contrast > 0.4 else 5
-                gradient_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=ksize)
-                gradient_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=ksize)
-                gradient_mag = np.sqrt(gradient_x**2 + gradient_y**2)
-                gradient_mag = cv2.normalize(gradient_mag, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-                
-                # 3. 缺陷检测
-                # 3.1 裂缝检测
-                crack_thresh = np.mean(gradient_mag) + 1.5 * np.std(gradient_mag)
-                _, crack_binary = cv2.threshold(gradient_mag, crack_thresh, 255, cv2.THRESH_BINARY)
-                
-                # 自适应形态学处理
-                crack_kernel_size = max(3, min(7, int(gray.shape[0] * 0.005)))
-                if crack_kernel_size % 2 == 0:
-                    crack_kernel_size += 1
-                crack_kernel = np.ones((crack_kernel_size, crack_kernel_size), np.uint8)
-                crack_mask = cv2.morphologyEx(crack_binary, cv2.MORPH_CLOSE, crack_kernel)
-                
-                crack_contours, _ = cv2.findContours(crack_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for cnt in crack_contours:
-                    area = cv2.contourArea(cnt)
-                    min_crack_area = gray.shape[0] * gray.shape[1] * 0.0001
-                    if area < min_crack_area:
-                        continue
-                    
-                    rect = cv2.minAreaRect(cnt)
-                    box = cv2.boxPoints(rect)
-                    box = np.int32(box)  
-                    
-                    width = rect[1][0]
-                    height = rect[1][1]
-                    aspect_ratio = max(width, height) / (min(width, height) + 1e-6)
-                    aspect_thresh = 2.5 if global_contrast > 0.5 else 2.0
-                    
-                    if aspect_ratio > aspect_thresh:
-                        x, y, w, h = cv2.boundingRect(cnt)
-                        # 调整坐标到原始图像尺寸
-                        x, y = int(x/scale_factor), int(y/scale_factor)
-                        w, h = int(w/scale_factor), int(h/scale_factor)
-                        defect_candidates['cracks'].append((x, y, w, h))
-                
-                # 3.2 坑洼检测
-                block_size = int(min(gray.shape) * 0.02) // 2 * 2 + 1
-                block_size = max(3, min(block_size, 21))  # 确保block_size为奇数且在合理范围内
-                c_value = max(5, min(15, int(std_brightness * 0.3)))
-
-                pothole_binary = cv2.adaptiveThreshold(
-                    l_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                    cv2.THRESH_BINARY_INV, block_size, c_value
-                )
-                
-                pothole_kernel_size = max(3, min(5, int(gray.shape[0] * 0.01)))
-                if pothole_kernel_size % 2 == 0:
-                    pothole_kernel_size += 1
-                pothole_kernel = np.ones((pothole_kernel_size, pothole_kernel_size), np.uint8)
-                pothole_mask = cv2.morphologyEx(pothole_binary, cv2.MORPH_OPEN, pothole_kernel)
-                pothole_mask = cv2.morphologyEx(pothole_mask, cv2.MORPH_CLOSE, pothole_kernel*2, iterations=7)
-                pothole_contours, _ = cv2.findContours(pothole_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for cnt in pothole_contours:
-                    area = cv2.contourArea(cnt)
-                    min_pothole_area = gray.shape[0] * gray.shape[1] * 0.005
-                    if area < min_pothole_area:
-                        continue
-                    
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    # 调整坐标到原始图像尺寸
-                    x, y = int(x/scale_factor), int(y/scale_factor)
-                    w, h = int(w/scale_factor), int(h/scale_factor)
-                    defect_candidates['potholes'].append((x, y, w, h))
-                
-                # 3.3 积水检测
-                h, s, v = cv2.split(hsv)
-                mean_v = np.mean(v)
-                mean_s = np.mean(s)
-                
-                v_thresh = mean_v + std_brightness * 0.5
-                s_thresh = mean_s * 0.5
-                
-                water_mask = cv2.inRange(hsv, (0, 0, v_thresh), (180, s_thresh, 255))
-                
-                water_kernel_size = max(7, min(15, int(gray.shape[0] * 0.015)))
-                if water_kernel_size % 2 == 0:
-                    water_kernel_size += 1
-                water_kernel = np.ones((water_kernel_size, water_kernel_size), np.uint8)
-                water_mask = cv2.morphologyEx(water_mask, cv2.MORPH_OPEN, water_kernel, iterations=1)
-                # cv2.imshow('water_mask', water_mask)
-                # cv2.waitKey(0)
-
-                water_contours, _ = cv2.findContours(water_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                for cnt in water_contours:
-                    area = cv2.contourArea(cnt)
-                    min_water_area = gray.shape[0] * gray.shape[1] * 0.005
-                    max_water_area = gray.shape[0] * gray.shape[1] * 0.1
-                    if area < min_water_area:
-                        continue
-                    if area > max_water_area:
-                        continue
+        self.current_image, detections = image_ops.detect_cracks_advanced(self.current_image)
+        return self.current_image, detections
 
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    # 调整坐标到原始图像尺寸
-                    x, y = int(x/scale_factor), int(y/scale_factor)
-                    w, h = int(w/scale_factor), int(h/scale_factor)
-                    defect_candidates['water'].append((x, y, w, h))
-            
-            # 4. 非极大值抑制和结果融合
-            result_image = self.current_image.copy()
-            defects = {'cracks': [], 'potholes': [], 'water': []}
-            
-            for defect_type in defect_candidates:
-                boxes = np.array(defect_candidates[defect_type])
-                if len(boxes) == 0:
-                    continue
-                    
-                # 计算boxes的面积
-                areas = boxes[:,2] * boxes[:,3]
-                
-                # 按面积排序
-                idxs = np.argsort(areas)[::-1]
-                
-                while len(idxs) > 0:
-                    i = idxs[0]
-                    defects[defect_type].append(tuple(boxes[i]))
-                    
-                    if len(idxs) == 1:
-                        break
-                    
-                    # 计算IoU
-                    xx1 = np.maximum(boxes[i,0], boxes[idxs[1:],0])
-                    yy1 = np.maximum(boxes[i,1], boxes[idxs[1:],1])
-                    xx2 = np.minimum(boxes[i,0] + boxes[i,2], boxes[idxs[1:],0] + boxes[idxs[1:],2])
-                    yy2 = np.minimum(boxes[i,1] + boxes[i,3], boxes[idxs[1:],1] + boxes[idxs[1:],3])
-                    
-                    w = np.maximum(0, xx2 - xx1 + 1)
-                    h = np.maximum(0, yy2 - yy1 + 1)
-                    
-                    overlap = (w * h) / (areas[idxs[1:]] + areas[i] - w * h)
-                    
-                    # 删除重叠较大的框
-                    idxs = np.delete(idxs, np.concatenate(([0], np.where(overlap > 0.3)[0] + 1)))
-            
-            # 5. 绘制结果
-            colors = {
-                'cracks': (0, 255, 0),
-                'potholes': (255, 0, 0),
-                'water': (0, 0, 255)
-            }
-            
-            labels = {
-                'cracks': 'Crack',
-                'potholes': 'Pothole',
-                'water': 'Water'
-            }
-            
-            for defect_type, boxes in defects.items():
-                for (x, y, w, h) in boxes:
-                    cv2.rectangle(result_image, (x, y), (x+w, y+h), colors[defect_type], 2)
-                    cv2.putText(result_image, labels[defect_type], (x, y-5),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[defect_type], 2)
-            
-            return result_image, defects
-            
-        except Exception as e:
-            print(f"智能检测出错: {str(e)}")
-            return self.current_image, {'cracks': [], 'potholes': [], 'water': []} 
+    def detect_defects_intelligent(self, scales=(0.5, 1.0, 1.5), budget_ms=None):
+        """智能路面缺陷检测算法 - 自适应增强版
+        scales: 参与检测的尺度，减少尺度可降低耗时（实时模式下使用）
+        budget_ms: 可选的时间预算（毫秒），按标定的耗时模型只执行预算内的尺度和分支
+        """
+        return image_ops.detect_defects_intelligent(self.current_image, scales, self.quality_gate, self.road_roi,
+                                                    low_memory=self.low_memory, budget_ms=budget_ms,
+                                                    refine=self.refine and budget_ms is None)
 
     def load_yolo_model(self, model_path=None):
         """加载YOLOv12模型"""
-        if not YOLO_AVAILABLE:
+        if not image_ops.YOLO_AVAILABLE:
             raise ImportError("未安装ultralytics库，无法使用YOLOv12功能")
             
-        if model_path is None:
-            # 使用默认模型路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            model_path = os.path.join(current_dir, 'yolov12','weights','best.pt')
-            
+        # 未指定时使用默认模型路径
+        model_path = model_path or image_ops.DEFAULT_YOLO_WEIGHTS
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
             
         try:
-            self.yolo_model = YOLO(model_path)
+            self.yolo_model = image_ops.load_model(model_path)
             return True
         except Exception as e:
             print(f"加载YOLOv12模型失败: {str(e)}")
             return False
-            
-    def detect_with_yolo(self, image=None):
-        """使用YOLOv12进行检测"""
-        if not YOLO_AVAILABLE:
-            raise ImportError("未安装ultralytics库，无法使用YOLOv12功能")
-            
-        if self.yolo_model is None:
-            if not self.load_yolo_model():
+
+    def draw_yolo_box(self, image, x1, y1, x2, y2, cls_id, conf):
+        """在图像上绘制一个YOLO检测框及标签"""
+        image_ops.draw_yolo_box(image, x1, y1, x2, y2, cls_id, conf, self.yolo_classes)
+
+    def _require_model(self, kind):
+        """确保边界框（'bbox'）或分割（'segment'）模型已加载，返回该模型"""
+        if kind == 'bbox':
+            if self.yolo_model is None and not self.load_yolo_model():
                 raise RuntimeError("YOLOv12模型未加载")
-                
-        if image is None:
-            if self.current_image is None:
-                raise ValueError("没有可处理的图像")
-            image = self.current_image.copy()
-            
-        # 保存临时图像用于YOLO处理
-        temp_path = "temp_for_yolo.jpg"
-        cv2.imwrite(temp_path, image)
-        
-        try:
-            # 推理预测
-            results = self.yolo_model.predict(temp_path, conf=self.yolo_confidence, iou=self.yolo_iou)
-            result = results[0]
-            
-            # 创建结果图像
-            result_image = image.copy()
-            areas = []
-            
-            # 处理检测结果
-            if len(result.boxes) > 0:
-                for box in result.boxes:
-                    # 获取边界框坐标
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    # 计算面积
-                    area = (x2 - x1) * (y2 - y1)
-                    areas.append(area)
-                    
-                    # 获取类别和置信度
-                    cls_id = int(box.cls)
-                    conf = float(box.conf)
-                    
-                    # 获取标签
-                    class_name = self.yolo_classes[cls_id] if cls_id < len(self.yolo_classes) else "unknown"
-                    label = f"{class_name} {conf:.2f}"
-                    
-                    # 使用红色绘制边界框
-                    cv2.rectangle(result_image, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    
-                    # 绘制标签背景
-                    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-                    cv2.rectangle(result_image, (x1, y1 - th - 4), (x1 + tw, y1), (0, 0, 255), -1)
-                    
-                    # 添加白色文本
-                    cv2.putText(result_image, label, (x1, y1 - 5),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
-            return result_image, result.boxes, areas
-            
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            return self.yolo_model
+        if self.segment_model is None and not self.load_segment_model():
+            raise RuntimeError("分割模型未加载")
+        return self.segment_model
+
+    def _input_image(self, image):
+        if image is not None:
+            return image
+        if self.current_image is None:
+            raise ValueError("没有可处理的图像")
+        return self.current_image
+
+    def detect_with_yolo(self, image=None, draw=True):
+        """使用YOLOv12进行检测，返回 (结果图, Detections)
+
+        draw为False时不绘制结果（返回的结果图即输入图像）
+        """
+        model = self._require_model('bbox')
+        return image_ops.detect_with_yolo(model, self._input_image(image), self.yolo_classes,
+                                          self.yolo_confidence, self.yolo_iou, draw)
 
     def load_segment_model(self, model_path=None):
         """加载分割模型"""
-        if not YOLO_AVAILABLE:
+        if not image_ops.YOLO_AVAILABLE:
             raise ImportError("未安装ultralytics库，无法使用分割功能")
             
-        if model_path is None:
-            # 使用默认模型路径
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            model_path = os.path.join(current_dir, 'segment', 'train3', 'weights', 'best.pt')
-            
+        # 未指定时使用默认模型路径
+        model_path = model_path or image_ops.DEFAULT_SEGMENT_WEIGHTS
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"分割模型文件不存在: {model_path}")
             
         try:
-            self.segment_model = YOLO(model_path)
+            self.segment_model = image_ops.load_model(model_path)
             return True
         except Exception as e:
             print(f"加载分割模型失败: {str(e)}")
             return False
 
     def detect_with_segment(self, image=None):
-        """使用分割模型进行检测"""
-        if not YOLO_AVAILABLE:
-            raise ImportError("未安装ultralytics库，无法使用分割功能")
-            
-        if self.segment_model is None:
-            if not self.load_segment_model():
-                raise RuntimeError("分割模型未加载")
-                
-        if image is None:
-            if self.current_image is None:
-                raise ValueError("没有可处理的图像")
-            image = self.current_image.copy()
-            
-        # 保存临时图像用于处理
-        temp_path = "temp_for_segment.jpg"
-        cv2.imwrite(temp_path, image)
-        
-        try:
-            # 推理预测
-            results = self.segment_model.predict(
-                temp_path,
-                conf=self.yolo_confidence,
-                iou=self.yolo_iou,
-                imgsz=640
-            )
-            
-            # 获取标注后的图像和掩码面积
-            result = results[0]
-            mask_areas = []
-            
-            if hasattr(result, 'masks') and result.masks is not None:
-                annotated_image = result.plot()
-                # 计算每个掩码的像素数
-                for mask in result.masks.data:
-                    mask_np = mask.cpu().numpy()
-                    area = np.sum(mask_np)  # 计算掩码中为True的像素数
-                    mask_areas.append(int(area))
-            else:
-                annotated_image = image.copy()
-            
-            return annotated_image, result, mask_areas
-            
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        """使用分割模型进行检测，返回 (标注图, Detections, 模型原始结果)"""
+        model = self._require_model('segment')
+        return image_ops.detect_with_segment(model, self._input_image(image), self.yolo_confidence, self.yolo_iou)
 
     def detect_defects_ai(self):
-        """使用AI方法进行缺陷检测"""
+        """使用AI方法进行缺陷检测，结果格式见 image_ops.detect_defects_ai"""
         if self.current_image is None:
-            return self.current_image, {'cracks': [], 'potholes': [], 'water': [], 'stats': {}}
-            
+            return self.current_image, Detections.empty(meta={'stats': {}})
         try:
-            result_image = self.current_image.copy()
-            defects = {
-                'cracks': [], 
-                'potholes': [], 
-                'water': [], 
-                'stats': {
-                    'bbox': {'count': 0, 'areas': []},
-                    'segment': {'count': 0, 'areas': []}
-                }
-            }
-            
-            if self.detection_mode in ['bbox', 'both']:
-                # 使用YOLOv12进行边界框检测
-                bbox_image, boxes, bbox_areas = self.detect_with_yolo()
-                result_image = bbox_image
-                
-                # 处理边界框结果
-                pothole_count = 0
-                for box, area in zip(boxes, bbox_areas):
-                    cls_id = int(box.cls)
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    
-                    if cls_id < len(self.yolo_classes):
-                        class_name = self.yolo_classes[cls_id]
-                        if class_name == 'pothole':
-                            defects['potholes'].append((x1, y1, x2-x1, y2-y1))
-                            pothole_count += 1
-                
-                defects['stats']['bbox'] = {
-                    'count': pothole_count,
-                    'areas': bbox_areas
-                }
-            
-            if self.detection_mode in ['segment', 'both']:
-                # 使用分割模型进行检测
-                segment_image, segment_results, mask_areas = self.detect_with_segment()
-                
-                # 更新分割统计信息
-                if hasattr(segment_results, 'boxes'):
-                    segment_count = len(segment_results.boxes)
-                else:
-                    segment_count = 0
-                
-                defects['stats']['segment'] = {
-                    'count': segment_count,
-                    'areas': mask_areas
-                }
-                
-                if self.detection_mode == 'segment':
-                    result_image = segment_image
-                elif self.detection_mode == 'both':
-                    # 确保图像大小一致
-                    if segment_image.shape != result_image.shape:
-                        segment_image = cv2.resize(segment_image, (result_image.shape[1], result_image.shape[0]))
-                    alpha = 0.5
-                    result_image = cv2.addWeighted(result_image, 1-alpha, segment_image, alpha, 0)
-            
-            return result_image, defects
-            
+            # 按检测模式加载所需的模型
+            yolo_model = self._require_model('bbox') if self.detection_mode in ['bbox', 'both'] else self.yolo_model
+            segment_model = (self._require_model('segment') if self.detection_mode in ['segment', 'both']
+                             else self.segment_model)
         except Exception as e:
             print(f"AI检测出错: {str(e)}")
-            return self.current_image, {'cracks': [], 'potholes': [], 'water': [], 'stats': {}} 
-        
+            return self.current_image, Detections.empty(meta={'stats': {}})
+        return image_ops.detect_defects_ai(
+            self.current_image, yolo_model, segment_model, self.detection_mode, self.yolo_classes,
+            self.yolo_confidence, self.yolo_iou, self.quality_gate, self.road_roi)
+
     def connect_edges(self, edges, min_threshold=5, max_threshold=15):
-        """优化版边缘连接算法，使用网格空间分区加速，支持阈值范围"""
+        """边缘连接：连接距离在 [min_threshold, max_threshold] 范围内的边缘端点"""
         # 使用类属性作为默认值
         min_threshold = min_threshold if min_threshold is not None else self.connect_threshold
         max_threshold = max_threshold if max_threshold is not None else self.connect_max_threshold
-        
-        # 获取轮廓（兼容OpenCV 3.4.2）
-        if cv2.__version__.startswith('3'):
-            _, contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        else:
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
-            return edges
-        
-        # 收集端点并构建空间网格
-        endpoints = []
-        grid = {}
-        grid_size = max(max_threshold, 5)  # 网格大小为最大阈值
-        
-        for cnt in contours:
-            if len(cnt) >= 2:
-                pt_start = tuple(cnt[0][0])
-                pt_end = tuple(cnt[-1][0])
-                endpoints.extend([pt_start, pt_end])
-        
-        # 构建网格空间索引
-        for idx, (x, y) in enumerate(endpoints):
-            grid_x = x // grid_size
-            grid_y = y // grid_size
-            if (grid_x, grid_y) not in grid:
-                grid[(grid_x, grid_y)] = []
-            grid[(grid_x, grid_y)].append(idx)
-        
-        # 创建输出图像
-        connected = np.zeros_like(edges)
-        cv2.drawContours(connected, contours, -1, 255, 1)
-        
-        # 遍历所有端点，仅在相邻网格中查找邻近点
-        for i, (x, y) in enumerate(endpoints):
-            current_grid = (x // grid_size, y // grid_size)
-            
-            # 检查当前网格和8个相邻网格
-            for dx in (-1, 0, 1):
-                for dy in (-1, 0, 1):
-                    neighbor_grid = (current_grid[0] + dx, current_grid[1] + dy)
-                    if neighbor_grid not in grid:
-                        continue
-                    
-                    # 检查该网格内的所有点
-                    for j in grid[neighbor_grid]:
-                        if j <= i:  # 避免重复检查
-                            continue
-                        
-                        # 计算距离
-                        x2, y2 = endpoints[j]
-                        distance = np.sqrt((x - x2)**2 + (y - y2)**2)
-                        # 如果距离在阈值范围内，则连接
-                        if min_threshold <= distance <= max_threshold:
-                            cv2.line(connected, (x, y), (x2, y2), 255, 1)
-        
-        return connected
+        return image_ops.connect_edges(edges, min_threshold, max_threshold)
@@ -0,0 +1,164 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from buffer_pool import DEFAULT_POOL
+
+
+# 信息面板和Web响应使用的图像统计量：均值、标准差、最值、中值和百分位数都由一次256级灰度直方图得到
+# （中值和百分位数由累积分布精确计算，与 np.median / np.percentile 结果相同，不需要对整幅图像排序），
+# 平均梯度由一次float32的Sobel得到。结果按图像版本缓存，同一幅图像重复查看时不再重新计算。
+
+# 默认计算的百分位数
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# 为False时不缓存，每次都重新计算（用于对比测试）
+ENABLED = True
+
+
+def histogram_u8(image):
+    """uint8图像所有通道合计的精确直方图（int64）
+
+    cv2.calcHist 以float32计数，超过2^24时会丢失精度，因此按行分块统计后再累加。
+    """
+    flat = image.reshape(image.shape[0], -1)
+    rows = max(1, (1 << 24) // max(flat.shape[1], 1))
+    hist = np.zeros(256, np.int64)
+    for y in range(0, flat.shape[0], rows):
+        chunk = flat[y:y + rows].reshape(-1, 1)
+        hist += cv2.calcHist([chunk], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return hist
+
+
+def percentiles_from_histogram(hist, percentiles):
+    """由直方图计算百分位数，与 np.percentile（线性插值）对原始像素的结果相同"""
+    cumulative = np.cumsum(hist)
+    total = int(cumulative[-1])
+    results = []
+    for q in percentiles:
+        index = (q / 100) * (total - 1)
+        lower = int(np.floor(index))
+        upper = min(lower + 1, total - 1)
+        a, b = np.searchsorted(cumulative, [lower, upper], side='right')
+        t = index - lower
+        # 与numpy的 _lerp 相同的插值公式
+        results.append(float(b - (b - a) * (1 - t)) if t >= 0.5 else float(a + (b - a) * t))
+    return results
+
+
+def mean_gradient(gray):
+    """单通道图像Sobel梯度幅值的均值（float32计算）"""
+    with DEFAULT_POOL.scope() as acquire:
+        grad_x = cv2.Sobel(gray, cv2.CV_32F, 1, 0, dst=acquire(gray.shape, np.float32), ksize=3)
+        grad_y = cv2.Sobel(gray, cv2.CV_32F, 0, 1, dst=acquire(gray.shape, np.float32), ksize=3)
+        cv2.magnitude(grad_x, grad_y, grad_x)
+        return float(cv2.mean(grad_x)[0])
+
+
+def compute(image, gradient=True, percentiles=DEFAULT_PERCENTILES):
+    """计算uint8图像（BGR或灰度）灰度的统计量，不使用缓存
+
+    返回 {'size': (宽, 高), 'mean', 'std', 'min', 'max', 'median',
+          'percentiles': {百分位: 值}, 'mean_gradient', 'histogram': 256级int64直方图}
+    gradient为False时不计算梯度，'mean_gradient' 为None。
+    """
+    if image.dtype != np.uint8:
+        raise ValueError(f"只支持uint8图像: {image.dtype}")
+    with DEFAULT_POOL.scope() as acquire:
+        if image.ndim == 3 and image.shape[2] == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=acquire(image.shape[:2]))
+        elif image.ndim == 2:
+            gray = image
+        else:
+            raise ValueError(f"不支持的图像形状: {image.shape}")
+
+        hist = histogram_u8(gray)
+        total = int(hist.sum())
+        values = np.arange(256, dtype=np.int64)
+        # 一阶、二阶矩用Python整数精确累加，方差只在最后一步换算为浮点数
+        first = int(hist @ values)
+        second = int(hist @ (values * values))
+        nonzero = np.flatnonzero(hist)
+        median, *rest = percentiles_from_histogram(hist, (50,) + tuple(percentiles))
+        return {
+            'size': (image.shape[1], image.shape[0]),
+            'mean': first / total,
+            'std': float(np.sqrt((total * second - first * first) / (total * total))),
+            'min': int(nonzero[0]),
+            'max': int(nonzero[-1]),
+            'median': median,
+            'percentiles': dict(zip(percentiles, rest)),
+            'mean_gradient': mean_gradient(gray) if gradient else None,
+            'histogram': hist,
+        }
+
+
+class StatsCache:
+    """按图像版本缓存统计结果（最近最少使用淘汰）
+
+    version 为调用方给出的图像版本标识（如 QPixmap.cacheKey()），内容变化时版本必须随之改变；
+    不给出时以数组对象本身为标识（只保留弱引用，数组释放后条目失效），此时数组不能被原地修改。
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(image, version, gradient):
+        if version is None:
+            return ('array', id(image), gradient)
+        return ('version', version, image.shape, gradient)
+
+    def get(self, image, version=None, gradient=True):
+        key = self._key(image, version, gradient)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                ref, stats = entry
+                if ref is None or ref() is image:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return stats
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, image, stats, version=None, gradient=True):
+        key = self._key(image, version, gradient)
+        ref = weakref.ref(image) if version is None else None
+        with self._lock:
+            self._entries[key] = (ref, stats)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+DEFAULT_CACHE = StatsCache()
+
+
+def image_stats(image, version=None, gradient=True, cache=DEFAULT_CACHE):
+    """图像统计量（格式见 compute），按图像版本缓存
+
+    version: 图像版本标识，见 StatsCache；gradient: 是否计算平均梯度。
+    返回的字典在缓存中共享，调用方不应修改。
+    """
+    if not ENABLED or cache is None:
+        return compute(image, gradient)
+    stats = cache.get(image, version, gradient)
+    if stats is None:
+        stats = compute(image, gradient)
+        cache.put(image, stats, version, gradient)
+    return stats
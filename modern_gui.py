@@ -3,22 +3,40 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from image_processor import ImageProcessor
+import image_ops
+import image_stats
+from frame_dedup import FrameDeduplicator
+from quality_gate import QualityGate
+from road_roi import RoadROI
+import batch_processor
+from batch_browser import BatchBrowserDialog
+from recipe import Recipe
 import cv2
+import threading
+import time
 import qdarkstyle
 import os
 import glob
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.backends.backend_qt5agg import FigureCanvas
-
-# 中文
-plt.rcParams['font.sans-serif'] = ['SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+from histogram_widget import HistogramWidget
+from history_store import HistoryStore
+from panel_store import PanelStore, qimage_view
+from region_stats import RegionStats
 
 class ModernGUI(QMainWindow):
+    HISTORY_MEMORY_MB = 512  # 操作历史中全分辨率结果的默认内存上限
+
     def __init__(self):
         super().__init__()
         self.processor = ImageProcessor()
+        # 各结果图对应的处理流程（从原图开始依次执行的操作），可保存后批量回放
+        self.panel_recipes = {}
+        self.last_recipe_panel = None
+        # 各面板的全分辨率结果图（面板上显示的是缩放后的位图）
+        self.panel_images = PanelStore()
+        # 操作历史：内存中只保留缩略图和预算内的全分辨率结果，其余写入本地缓存
+        self.history = HistoryStore(memory_budget=self.HISTORY_MEMORY_MB * 1024 * 1024)
+        self.history_items = {}  # 记录ID -> (列表项, 分割线)
         self.initUI()
         
     def initUI(self):
@@ -195,6 +213,18 @@ class ModernGUI(QMainWindow):
         self.ai_mode.setEnabled(False)  # 初始禁用
         self.ai_mode.setStyleSheet(self.process_method.styleSheet())
         
+        # 近似重复帧跳过（定时拍摄时车辆静止或慢行会产生大量相同画面）
+        self.dedup_checkbox = QCheckBox("跳过近似重复帧")
+        self.dedup_checkbox.setChecked(False)
+        
+        # 图像质量门限（模糊、过暗、过曝的图片跳过检测）
+        self.quality_checkbox = QCheckBox("跳过低质量图片")
+        self.quality_checkbox.setChecked(False)
+        
+        # 路面ROI（自动估计路面区域，天空、路边植被和车辆内的误检被剔除）
+        self.roi_checkbox = QCheckBox("仅检测路面区域")
+        self.roi_checkbox.setChecked(False)
+        
         # 添加批处理按钮
         batch_btn = QPushButton("📦 批量处理")
         batch_btn.setStyleSheet("""
@@ -219,7 +249,10 @@ class ModernGUI(QMainWindow):
         batch_layout.addWidget(self.process_method, 0, 1)
         batch_layout.addWidget(ai_mode_label, 1, 0)
         batch_layout.addWidget(self.ai_mode, 1, 1)
-        batch_layout.addWidget(batch_btn, 2, 0, 1, 2, Qt.AlignCenter)
+        batch_layout.addWidget(self.dedup_checkbox, 2, 0)
+        batch_layout.addWidget(self.quality_checkbox, 2, 1)
+        batch_layout.addWidget(self.roi_checkbox, 3, 0)
+        batch_layout.addWidget(batch_btn, 4, 0, 1, 2, Qt.AlignCenter)
         
         # 设置列拉伸
         batch_layout.setColumnStretch(1, 1)
@@ -233,6 +266,19 @@ class ModernGUI(QMainWindow):
         file_layout.addWidget(batch_btn)
         file_layout.addWidget(self.save_btn)
         
+        # 处理流程：保存选中结果图的处理步骤，或按流程批量处理文件夹
+        save_recipe_btn = QPushButton("📝 保存处理流程")
+        replay_recipe_btn = QPushButton("▶️ 按流程批量处理")
+        save_recipe_btn.clicked.connect(self.save_recipe)
+        replay_recipe_btn.clicked.connect(self.replay_recipe)
+        file_layout.addWidget(save_recipe_btn)
+        file_layout.addWidget(replay_recipe_btn)
+        
+        # 浏览批处理结果
+        browse_results_btn = QPushButton("🗂 浏览批处理结果")
+        browse_results_btn.clicked.connect(lambda: self.show_batch_browser())
+        file_layout.addWidget(browse_results_btn)
+        
         file_group.setLayout(file_layout)
         
         # 连接文件操作信号（只在这里连接一次）
@@ -250,7 +296,7 @@ class ModernGUI(QMainWindow):
         analysis_layout.setSpacing(8)
         
         # 调整直方图显示区域
-        self.hist_label = QLabel()
+        self.hist_label = HistogramWidget()
         self.hist_label.setMinimumHeight(200)
         self.hist_label.setMaximumHeight(250)
         
@@ -324,6 +370,12 @@ class ModernGUI(QMainWindow):
         self.morph_size_slider = QSlider(Qt.Horizontal)
         self.morph_size_slider.setRange(3, 21)
         self.morph_size_value = QLabel("3")
+        morph_shape_label = QLabel("结构元素形状:")
+        self.morph_shape_combo = QComboBox()
+        self.morph_shape_combo.addItem("矩形", 'rect')
+        self.morph_shape_combo.addItem("椭圆", 'ellipse')
+        self.morph_shape_combo.addItem("十字", 'cross')
+        self.morph_shape_combo.setStyleSheet(self.process_method.styleSheet())
         
         # 添加边缘连接控制组件
         edge_connect_group = QGroupBox("边缘连接")
@@ -377,7 +429,9 @@ class ModernGUI(QMainWindow):
         params_layout.addWidget(morph_size_label, 3, 0)
         params_layout.addWidget(self.morph_size_slider, 3, 1)
         params_layout.addWidget(self.morph_size_value, 3, 2)
-        params_layout.addWidget(edge_connect_group, 4, 0, 1, 3)
+        params_layout.addWidget(morph_shape_label, 4, 0)
+        params_layout.addWidget(self.morph_shape_combo, 4, 1, 1, 2)
+        params_layout.addWidget(edge_connect_group, 5, 0, 1, 3)
         
         advanced_params.setLayout(params_layout)
         process_layout.addWidget(advanced_params)
@@ -478,6 +532,34 @@ class ModernGUI(QMainWindow):
         # 连接批处理按钮信号
         batch_btn.clicked.connect(self.batch_process)
         
+        # 6. 历史记录组
+        history_group = QGroupBox("历史记录")
+        history_layout = QVBoxLayout()
+        
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("内存上限(MB):"))
+        self.history_budget_spin = QSpinBox()
+        self.history_budget_spin.setRange(0, 65536)
+        self.history_budget_spin.setSingleStep(128)
+        self.history_budget_spin.setValue(self.HISTORY_MEMORY_MB)
+        self.history_budget_spin.setToolTip("超出上限的历史结果写入本地缓存，查看时再读取")
+        self.history_budget_spin.valueChanged.connect(self.update_history_budget)
+        budget_layout.addWidget(self.history_budget_spin)
+        history_layout.addLayout(budget_layout)
+        
+        self.history_usage_label = QLabel()
+        history_layout.addWidget(self.history_usage_label)
+        
+        history_scroll = QScrollArea()
+        history_scroll.setWidgetResizable(True)
+        history_scroll.setMinimumHeight(300)
+        history_content = QWidget()
+        self.history_list = QVBoxLayout(history_content)
+        self.history_list.addStretch()
+        history_scroll.setWidget(history_content)
+        history_layout.addWidget(history_scroll)
+        history_group.setLayout(history_layout)
+        
         # 5. 重置按钮
         reset_btn = QPushButton("🔄 重置图像")
         reset_btn.setStyleSheet("background-color: #e74c3c;")
@@ -490,6 +572,7 @@ class ModernGUI(QMainWindow):
         self.canny_high_slider.valueChanged.connect(self.update_canny_high)
         self.fft_radius_slider.valueChanged.connect(self.update_fft_radius)
         self.morph_size_slider.valueChanged.connect(self.update_morph_size)
+        self.morph_shape_combo.currentIndexChanged.connect(self.update_morph_shape)
         
         # 连接图像处理按钮信号
         enhance_btn.clicked.connect(self.enhance_image)
@@ -518,6 +601,7 @@ class ModernGUI(QMainWindow):
         content_layout.addWidget(analysis_group)
         content_layout.addWidget(process_group)
         content_layout.addWidget(detect_group)
+        content_layout.addWidget(history_group)
         content_layout.addWidget(reset_btn)
         content_layout.addStretch()
         
@@ -653,9 +737,11 @@ class ModernGUI(QMainWindow):
         """选择处理结果图像作为下一步处理的输入"""
         # 查找对应的结果组件
         clicked_result = None
+        clicked_key = None
         for key, result in self.result_widgets.items():
             if result['label'] == clicked_label:
                 clicked_result = result
+                clicked_key = key
                 break
         
         # 如果没有找到对应组件或是原图，直接返回
@@ -676,76 +762,42 @@ class ModernGUI(QMainWindow):
             if clicked_result['selected']:
                 clicked_result['widget'].setStyleSheet("border: 3px solid #27ae60;")
                 clicked_result['selected_label'].setText("🔵")
-                # 获取图像数据并设置为当前处理图像
-                pixmap = clicked_label.pixmap()
-                if pixmap:
-                    image = self.pixmap_to_cv2(pixmap)
+                # 获取全分辨率图像并设置为当前处理图像
+                image = self.panel_images.image(clicked_key)
+                if image is not None:
                     self.processor.current_image = image
                     # 更新图像信息显示
-                    self.update_clicked_image_info(image, clicked_result['widget'].findChild(QLabel).text())
+                    self.update_clicked_image_info(image, clicked_result['widget'].findChild(QLabel).text(),
+                                                   self.panel_images.version(clicked_key))
             else:
                 clicked_result['widget'].setStyleSheet("")
                 clicked_result['selected_label'].setText("⚪")
                 # 如果取消选择，恢复为原图
-                self.processor.current_image = self.processor.original_image.copy()
+                self.processor.current_image = self.processor.original_image
                 # 更新为原图信息
-                self.update_clicked_image_info(self.processor.original_image, "原始图像")
+                self.update_clicked_image_info(self.processor.original_image, "原始图像",
+                                               self.panel_images.version('input'))
 
-    def update_clicked_image_info(self, cv_image, source_name):
-        """更新点击图像的信息显示"""
+    def update_clicked_image_info(self, cv_image, source_name, version=None):
+        """更新点击图像的信息显示，version 为图像版本标识（见 image_stats.StatsCache）"""
         if cv_image is None:
             return
         
-        # 创建直方图
-        plt.figure(figsize=(5, 4))
-        plt.title(f"当前选中: {source_name}", pad=10, fontsize=10)
-        
-        # 绘制三通道直方图
-        colors = ('蓝色', '绿色', '红色')
-        for i, (color, name) in enumerate(zip(('b', 'g', 'r'), colors)):
-            hist = cv2.calcHist([cv_image], [i], None, [256], [0, 256])
-            plt.plot(hist, color=color, label=name)
-        
-        plt.legend(loc='upper right', fontsize=8)
-        plt.xlabel('像素值', fontsize=9)
-        plt.ylabel('频率', fontsize=9)
-        plt.xlim([0, 256])
-        
-        # 将matplotlib图像转换为QPixmap
-        canvas = FigureCanvas(plt.gcf())
-        canvas.draw()
-        width, height = canvas.get_width_height()
-        hist_image = QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888)
-        plt.close()
-        
         # 显示直方图
-        pixmap = QPixmap.fromImage(hist_image)
-        self.hist_label.setPixmap(pixmap.scaled(
-            self.hist_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.hist_label.set_image(cv_image, f"当前选中: {source_name}")
         
         # 计算并显示统计信息
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        mean_val = np.mean(gray)
-        std_val = np.std(gray)
-        median_val = np.median(gray)
-        min_val = np.min(gray)
-        max_val = np.max(gray)
-        
-        # 计算梯度信息
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_mag = np.sqrt(grad_x**2 + grad_y**2)
-        mean_gradient = np.mean(gradient_mag)
+        stats = image_stats.image_stats(cv_image, version)
         
         info_text = f"<b>当前选中: {source_name}</b><br><br>"
         info_text += f"<table style='font-size: 12px;'>"
         info_text += f"<tr><td>图像尺寸:</td><td>{cv_image.shape[1]}×{cv_image.shape[0]}</td></tr>"
-        info_text += f"<tr><td>均值:</td><td>{mean_val:.2f}</td></tr>"
-        info_text += f"<tr><td>标准差:</td><td>{std_val:.2f}</td></tr>"
-        info_text += f"<tr><td>中值:</td><td>{median_val:.2f}</td></tr>"
-        info_text += f"<tr><td>最小值:</td><td>{min_val}</td></tr>"
-        info_text += f"<tr><td>最大值:</td><td>{max_val}</td></tr>"
-        info_text += f"<tr><td>平均梯度:</td><td>{mean_gradient:.2f}</td></tr>"
+        info_text += f"<tr><td>均值:</td><td>{stats['mean']:.2f}</td></tr>"
+        info_text += f"<tr><td>标准差:</td><td>{stats['std']:.2f}</td></tr>"
+        info_text += f"<tr><td>中值:</td><td>{stats['median']:.2f}</td></tr>"
+        info_text += f"<tr><td>最小值:</td><td>{stats['min']}</td></tr>"
+        info_text += f"<tr><td>最大值:</td><td>{stats['max']}</td></tr>"
+        info_text += f"<tr><td>平均梯度:</td><td>{stats['mean_gradient']:.2f}</td></tr>"
         info_text += "</table>"
         
         self.hist_info.setHtml(info_text)
@@ -753,24 +805,40 @@ class ModernGUI(QMainWindow):
     def get_current_source_image(self):
         """获取当前处理的源图像"""
         # 检查是否有选中的处理结果
-        for result in self.result_widgets.values():
+        for key, result in self.result_widgets.items():
             if result['selected'] and result['has_result']:
-                pixmap = result['label'].pixmap()
-                if pixmap:
-                    return self.pixmap_to_cv2(pixmap)
+                image = self.panel_images.image(key)
+                if image is not None:
+                    return image
         
-        # 如果没有选中的结果，返回原图副本
-        return self.processor.original_image.copy()
+        # 如果没有选中的结果，返回原图（各处理函数都不修改输入图像，无需复制）
+        return self.processor.original_image
 
-    def pixmap_to_cv2(self, pixmap):
-        """将QPixmap转换为OpenCV图像格式"""
-        qimage = pixmap.toImage()
-        width = qimage.width()
-        height = qimage.height()
-        ptr = qimage.bits()
-        ptr.setsize(height * width * 4)
-        arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-        return cv2.cvtColor(arr, cv2.COLOR_BGRA2BGR)
+    def source_recipe(self):
+        """当前源图像对应的处理流程：选中的结果图的流程，未选中时为原图（空流程）"""
+        for key, result in self.result_widgets.items():
+            if result['selected'] and result['has_result']:
+                return self.panel_recipes.get(key, Recipe())
+        return Recipe()
+
+    def record_step(self, panel, op, source=None, **params):
+        """记录生成结果图 panel 的处理流程：源图像的流程（默认为当前源图像）再加上这一步"""
+        source = self.source_recipe() if source is None else source
+        self.panel_recipes[panel] = source.extended(op, **params)
+        self.last_recipe_panel = panel
+
+    def current_recipe(self):
+        """选中的结果图的处理流程，未选中时为最近一次操作的流程"""
+        for key, result in self.result_widgets.items():
+            if result['selected'] and result['has_result'] and key in self.panel_recipes:
+                return self.panel_recipes[key]
+        return self.panel_recipes.get(self.last_recipe_panel)
+
+    def show_panel_image(self, key, image):
+        """保存面板的全分辨率图像，并显示按控件尺寸缩放后的位图"""
+        self.panel_images.set(key, image)
+        label = self.result_widgets[key]['label']
+        label.setPixmap(self.panel_images.scaled_pixmap(key, label.size()))
 
     def update_result_display(self, image, operation_type):
         """更新指定操作类型的结果显示"""
@@ -780,16 +848,8 @@ class ModernGUI(QMainWindow):
             if operation_type == 'input':
                 return
             
-            height, width = image.shape[:2]
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            q_image = QImage(image_rgb.data, width, height, width * 3, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(q_image)
-            scaled_pixmap = pixmap.scaled(
-                result_widget['label'].size(), 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
-            result_widget['label'].setPixmap(scaled_pixmap)
+            self.show_panel_image(operation_type, image)
+            self.add_to_history(image, result_widget['widget'].findChild(QLabel).text())
             result_widget['has_result'] = True
             result_widget['label'].setText("")  # 清除等待处理文字
             result_widget['label'].setStyleSheet("""
@@ -814,17 +874,7 @@ class ModernGUI(QMainWindow):
             
             # 显示原图（特殊处理）
             if 'input' in self.result_widgets:
-                input_widget = self.result_widgets['input']
-                height, width = self.processor.original_image.shape[:2]
-                image_rgb = cv2.cvtColor(self.processor.original_image, cv2.COLOR_BGR2RGB)
-                q_image = QImage(image_rgb.data, width, height, width * 3, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(q_image)
-                scaled_pixmap = pixmap.scaled(
-                    input_widget['label'].size(), 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
-                input_widget['label'].setPixmap(scaled_pixmap)
+                self.show_panel_image('input', self.processor.original_image)
             
             # 重置其他所有显示区域
             self.reset_result_displays()
@@ -840,6 +890,7 @@ class ModernGUI(QMainWindow):
         """重置所有结果显示区域（除了原图）"""
         for key, result in self.result_widgets.items():
             if key != 'input':
+                self.panel_images.discard(key)
                 result['label'].clear()
                 result['label'].setText("等待处理")
                 result['selected'] = False
@@ -853,6 +904,8 @@ class ModernGUI(QMainWindow):
                     }
                 """)
                 result['selected_label'].setText("⚪")
+        self.panel_recipes.clear()
+        self.last_recipe_panel = None
 
     def reset_image(self):
         """重置图像处理状态"""
@@ -881,12 +934,16 @@ class ModernGUI(QMainWindow):
                 }
             """)
             selected_result['selected_label'].setText("⚪")
+            for key, result in self.result_widgets.items():
+                if result is selected_result:
+                    self.panel_recipes.pop(key, None)
+                    self.panel_images.discard(key)
         else:
             # 重置所有结果（除原图外）
             self.reset_result_displays()
         
         # 重置处理器状态
-        self.processor.current_image = self.processor.original_image.copy()
+        self.processor.current_image = self.processor.original_image
         self.update_histogram()  # 更新直方图显示
         self.statusBar().showMessage('图像已重置')
 
@@ -926,72 +983,37 @@ class ModernGUI(QMainWindow):
 
     def update_comparison_info(self, left_image, right_image):
         """更新对比图像的统计信息"""
-        # 计算并显示直方图
-        plt.figure(figsize=(5, 4))
-        plt.subplot(121)
-        self.plot_histogram(left_image, "原图")
-        plt.subplot(122)
-        self.plot_histogram(right_image, "处理后")
-        
-        # 将matplotlib图像转换为QPixmap
-        canvas = FigureCanvas(plt.gcf())
-        canvas.draw()
-        width, height = canvas.get_width_height()
-        image = QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888)
-        plt.close()
-        
         # 显示直方图
-        pixmap = QPixmap.fromImage(image)
-        self.hist_label.setPixmap(pixmap.scaled(
-            self.hist_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.hist_label.set_images([("原图", left_image), ("处理后", right_image)])
         
         # 更新统计信息
-        left_gray = cv2.cvtColor(left_image, cv2.COLOR_BGR2GRAY)
-        right_gray = cv2.cvtColor(right_image, cv2.COLOR_BGR2GRAY)
+        left = image_stats.image_stats(left_image)
+        right = image_stats.image_stats(right_image)
         
         info_text = "图像统计信息对比:\n"
         info_text += f"原图 -> 处理后\n"
-        info_text += f"均值: {np.mean(left_gray):.2f} -> {np.mean(right_gray):.2f}\n"
-        info_text += f"标准差: {np.std(left_gray):.2f} -> {np.std(right_gray):.2f}\n"
-        info_text += f"中值: {np.median(left_gray):.2f} -> {np.median(right_gray):.2f}\n"
-        
-        # 计算梯度信息
-        left_grad = self.calculate_gradient(left_gray)
-        right_grad = self.calculate_gradient(right_gray)
-        info_text += f"平均梯度: {left_grad:.2f} -> {right_grad:.2f}"
+        info_text += f"均值: {left['mean']:.2f} -> {right['mean']:.2f}\n"
+        info_text += f"标准差: {left['std']:.2f} -> {right['std']:.2f}\n"
+        info_text += f"中值: {left['median']:.2f} -> {right['median']:.2f}\n"
+        info_text += f"平均梯度: {left['mean_gradient']:.2f} -> {right['mean_gradient']:.2f}"
         
         self.hist_info.setText(info_text)
 
-    def plot_histogram(self, image, title):
-        """绘制单幅图像的直方图"""
-        colors = ('b', 'g', 'r')
-        for i, color in enumerate(colors):
-            hist = cv2.calcHist([image], [i], None, [256], [0, 256])
-            plt.plot(hist, color=color, alpha=0.7)
-        plt.title(title)
-        plt.xlim([0, 256])
-
     def calculate_gradient(self, gray_image):
         """计算图像的平均梯度"""
-        grad_x = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_mag = np.sqrt(grad_x**2 + grad_y**2)
-        return np.mean(gradient_mag)
+        return image_stats.mean_gradient(gray_image)
 
     def apply_histogram_equalization(self):
         """应用直方图均衡化"""
         if self.processor.current_image is None:
             return
         
-        # 在LAB空间进行均衡化
-        lab = cv2.cvtColor(self.processor.current_image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        l_eq = cv2.equalizeHist(l)
-        lab_eq = cv2.merge([l_eq, a, b])
-        result = cv2.cvtColor(lab_eq, cv2.COLOR_LAB2BGR)
+        # 在LAB空间对L通道进行均衡化
+        result = image_ops.enhance_pipeline(self.processor.current_image, ['equalize'])
         
         # 更新显示
         self.update_result_display(result, 'histogram_eq')
+        self.record_step('histogram_eq', 'equalize')
         self.processor.current_image = result
         self.update_histogram()
         self.statusBar().showMessage('直方图均衡化完成')
@@ -1006,26 +1028,15 @@ class ModernGUI(QMainWindow):
         
         # 计算并显示图像统计信息
         img = self.processor.current_image
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 基本统计信息
-        mean_val = np.mean(gray)
-        std_val = np.std(gray)
-        median_val = np.median(gray)
-        
-        # 梯度信息
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_mag = np.sqrt(grad_x**2 + grad_y**2)
-        mean_gradient = np.mean(gradient_mag)
+        stats = image_stats.image_stats(img)
         
         # 更新信息显示
         info_text = f"图像统计信息:\n"
         info_text += f"尺寸: {img.shape[1]}×{img.shape[0]}\n"
-        info_text += f"均值: {mean_val:.2f}\n"
-        info_text += f"标准差: {std_val:.2f}\n"
-        info_text += f"中值: {median_val:.2f}\n"
-        info_text += f"平均梯度: {mean_gradient:.2f}"
+        info_text += f"均值: {stats['mean']:.2f}\n"
+        info_text += f"标准差: {stats['std']:.2f}\n"
+        info_text += f"中值: {stats['median']:.2f}\n"
+        info_text += f"平均梯度: {stats['mean_gradient']:.2f}"
         self.hist_info.setText(info_text)
 
     def save_result(self):
@@ -1049,6 +1060,9 @@ class ModernGUI(QMainWindow):
         self.processor.brightness = brightness
         result = self.processor.adjust_brightness_contrast(brightness, self.processor.contrast)
         self.update_result_display(result, 'enhance')
+        # 亮度对比度调节总是基于原图
+        self.record_step('enhance', 'brightness_contrast', Recipe(),
+                         brightness=brightness, contrast=self.processor.contrast)
         self.statusBar().showMessage(f'亮度: {brightness}')
 
     def update_contrast(self):
@@ -1060,6 +1074,8 @@ class ModernGUI(QMainWindow):
         self.processor.contrast = contrast
         result = self.processor.adjust_brightness_contrast(self.processor.brightness, contrast)
         self.update_result_display(result, 'enhance')
+        self.record_step('enhance', 'brightness_contrast', Recipe(),
+                         brightness=self.processor.brightness, contrast=contrast)
         self.statusBar().showMessage(f'对比度: {contrast:.2f}')
 
     def enhance_image(self):
@@ -1071,27 +1087,16 @@ class ModernGUI(QMainWindow):
             return self.processor.enhance_image()
         
         self.apply_operation(operation, "图像增强")
+        self.record_step('enhance', 'enhance')
 
     def display_image(self, image):
         """显示单张图片（仅用于特殊情况的图像显示，不包含加载逻辑）"""
         if image is None:
             return
             
-        # 转换图像格式
-        height, width = image.shape[:2]
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        q_image = QImage(image_rgb.data, width, height, width * 3, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
-        
         # 更新输入图像显示
         if 'input' in self.result_widgets:
-            input_label = self.result_widgets['input']['label']
-            scaled_pixmap = pixmap.scaled(
-                input_label.size(), 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
-            input_label.setPixmap(scaled_pixmap)
+            self.show_panel_image('input', image)
 
     def load_directory(self):
         """批量处理文件夹"""
@@ -1157,12 +1162,14 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'defect')
+        self.record_step('defect', 'detect_defects')
         
         # 显示检测结果
+        counts = defects.counts()
         result_text = f"检测结果:\n"
-        result_text += f"裂缝: {len(defects['cracks'])} 处\n"
-        result_text += f"坑洼: {len(defects['potholes'])} 处\n"
-        result_text += f"积水: {len(defects['water'])} 处"
+        result_text += f"裂缝: {counts['cracks']} 处\n"
+        result_text += f"坑洼: {counts['potholes']} 处\n"
+        result_text += f"积水: {counts['water']} 处"
         self.result_text.setText(result_text)
         
         # 更新直方图和状态
@@ -1194,6 +1201,10 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'edge')
+        self.record_step('edge', 'edges', canny_low=self.processor.canny_low, canny_high=self.processor.canny_high,
+                         connect=self.edge_connect_checkbox.isChecked(),
+                         min_threshold=self.min_threshold_slider.value(),
+                         max_threshold=self.max_threshold_slider.value())
         self.statusBar().showMessage('边缘检测完成')
 
     def apply_fft(self):
@@ -1210,6 +1221,7 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'fft')
+        self.record_step('fft', 'fft', radius=self.processor.fft_radius, mode=self.processor.fft_mode)
         self.statusBar().showMessage('FFT滤波完成')
 
     def detect_cracks_only(self):
@@ -1226,7 +1238,8 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'defect')
-        self.result_text.setText(f"检测到 {len(defects['cracks'])} 处裂缝")
+        self.record_step('defect', 'detect_defects')
+        self.result_text.setText(f"检测到 {defects.count('cracks')} 处裂缝")
         
         # 更新直方图和状态
         self.update_histogram()
@@ -1246,7 +1259,8 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'defect')
-        self.result_text.setText(f"检测到 {len(defects['potholes'])} 处坑洼")
+        self.record_step('defect', 'detect_defects')
+        self.result_text.setText(f"检测到 {defects.count('potholes')} 处坑洼")
         
         # 更新直方图和状态
         self.update_histogram()
@@ -1266,7 +1280,8 @@ class ModernGUI(QMainWindow):
         
         # 更新显示
         self.update_result_display(result, 'defect')
-        self.result_text.setText(f"检测到 {len(defects['water'])} 处积水")
+        self.record_step('defect', 'detect_defects')
+        self.result_text.setText(f"检测到 {defects.count('water')} 处积水")
         
         # 更新直方图和状态
         self.update_histogram()
@@ -1279,12 +1294,14 @@ class ModernGUI(QMainWindow):
         
         # 获取要显示直方图的图像和来源信息
         display_image = None
+        display_version = None
         source_info = "当前显示: "
         
         # 检查是否有选中的图像
         for key, result in self.result_widgets.items():
             if result['selected'] and result['has_result']:
-                display_image = self.pixmap_to_cv2(result['label'].pixmap())
+                display_image = self.panel_images.image(key)
+                display_version = self.panel_images.version(key)
                 source_info += f"{result['widget'].findChild(QLabel).text()}"
                 break
         
@@ -1300,7 +1317,7 @@ class ModernGUI(QMainWindow):
                 source_info += "原始图像"
         
         # 更新直方图和图像信息
-        self.update_clicked_image_info(display_image, source_info.split(": ")[1])
+        self.update_clicked_image_info(display_image, source_info.split(": ")[1], display_version)
 
     def apply_morph_op(self, op_type):
         """应用形态学操作"""
@@ -1311,32 +1328,21 @@ class ModernGUI(QMainWindow):
         source_image = self.get_current_source_image()
         self.processor.current_image = source_image
         
-        kernel = np.ones((self.processor.morph_size, self.processor.morph_size), np.uint8)
-        
         # 执行相应的形态学操作
-        if op_type == 'erode':
-            result = cv2.erode(source_image, kernel, iterations=1)
-            op_name = '腐蚀'
-            display_type = 'morph_erode'
-        elif op_type == 'dilate':
-            result = cv2.dilate(source_image, kernel, iterations=1)
-            op_name = '膨胀'
-            display_type = 'morph_dilate'
-        elif op_type == 'open':
-            result = cv2.morphologyEx(source_image, cv2.MORPH_OPEN, kernel)
-            op_name = '开运算'
-            display_type = 'morph_open'
-        elif op_type == 'close':
-            result = cv2.morphologyEx(source_image, cv2.MORPH_CLOSE, kernel)
-            op_name = '闭运算'
-            display_type = 'morph_close'
-        elif op_type == 'gradient':
-            result = cv2.morphologyEx(source_image, cv2.MORPH_GRADIENT, kernel)
-            op_name = '形态学梯度'
-            display_type = 'morph_gradient'
+        result = image_ops.morph(source_image, op_type, self.processor.morph_size,
+                                 shape=self.processor.morph_shape)
+        op_name, display_type = {
+            'erode': ('腐蚀', 'morph_erode'),
+            'dilate': ('膨胀', 'morph_dilate'),
+            'open': ('开运算', 'morph_open'),
+            'close': ('闭运算', 'morph_close'),
+            'gradient': ('形态学梯度', 'morph_gradient'),
+        }[op_type]
         
         # 更新显示
         self.update_result_display(result, display_type)
+        self.record_step(display_type, 'morph', type=op_type, size=self.processor.morph_size,
+                         shape=self.processor.morph_shape)
         
         # 更新直方图
         self.update_histogram()
@@ -1344,34 +1350,32 @@ class ModernGUI(QMainWindow):
 
     def add_to_history(self, image, operation_name):
         """添加处理结果到历史记录"""
+        entry_id, removed = self.history.add(image, operation_name)
+        for old_id in removed:
+            for widget in self.history_items.pop(old_id, ()):
+                self.history_list.removeWidget(widget)
+                widget.deleteLater()
+        
         # 创建历史记录项
         item = QWidget()
         item_layout = QVBoxLayout(item)
         
         # 添加操作名称
-        name_label = QLabel(operation_name)
+        entry = self.history.entry(entry_id)
+        name_label = QLabel(f"{operation_name}  {time.strftime('%H:%M:%S', time.localtime(entry.timestamp))}")
         name_label.setStyleSheet("font-weight: bold;")
         item_layout.addWidget(name_label)
         
-        # 添加缩略图
+        # 添加缩略图（由历史记录中压缩保存的缩略图解码）
         thumb_label = QLabel()
         thumb_label.setFixedSize(280, 200)
         thumb_label.setAlignment(Qt.AlignCenter)
-        
-        # 创建缩略图
-        height, width = image.shape[:2]
-        thumb = cv2.resize(image, (280, int(280 * height / width)))
-        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
-        h, w = thumb.shape[:2]
-        q_image = QImage(thumb.data, w, h, w * 3, QImage.Format_RGB888)
-        thumb_label.setPixmap(QPixmap.fromImage(q_image))
-        
+        thumb_label.setPixmap(QPixmap.fromImage(qimage_view(self.history.thumbnail(entry_id))))
         item_layout.addWidget(thumb_label)
         
-        # 添加查看按钮
+        # 添加查看按钮：点击时才取出全分辨率结果
         view_btn = QPushButton("查看结果")
-        view_btn.clicked.connect(lambda: self.display_comparison(
-            self.processor.original_image, image))
+        view_btn.clicked.connect(lambda: self.show_history_entry(entry_id))
         item_layout.addWidget(view_btn)
         
         # 添加分割线
@@ -1382,6 +1386,36 @@ class ModernGUI(QMainWindow):
         # 将项目添加到历史记录开头
         self.history_list.insertWidget(0, item)
         self.history_list.insertWidget(1, line)
+        self.history_items[entry_id] = (item, line)
+        self.update_history_usage()
+
+    def show_history_entry(self, entry_id):
+        """查看历史记录的全分辨率结果：与原图对比统计信息，并在图像查看器中打开"""
+        image = self.history.load(entry_id)
+        if image is None:
+            QMessageBox.information(self, "提示", "该结果已超出缓存上限被移除，只保留了缩略图")
+            return
+        self.update_history_usage()
+        if self.processor.original_image is not None:
+            self.update_comparison_info(self.processor.original_image, image)
+        dialog = ImageViewerDialog(np.ascontiguousarray(image), self)
+        dialog.setWindowTitle(f"历史记录: {self.history.entry(entry_id).name}")
+        dialog.exec_()
+
+    def update_history_budget(self, value):
+        """修改历史记录的内存上限，超出部分立即写入本地缓存"""
+        self.history.set_memory_budget(value * 1024 * 1024)
+        self.update_history_usage()
+
+    def update_history_usage(self):
+        """显示历史记录当前占用的内存和缓存大小"""
+        self.history_usage_label.setText(
+            f"内存: {self.history.memory_bytes() / 1e6:.1f}MB  缓存: {self.history.disk_bytes() / 1e6:.1f}MB")
+
+    def closeEvent(self, event):
+        # 删除历史记录的本地缓存
+        self.history.close()
+        super().closeEvent(event)
 
     def apply_operation(self, operation_func, operation_name):
         """通用的操作应用函数"""
@@ -1422,23 +1456,11 @@ class ModernGUI(QMainWindow):
             return
         
         def operation():
-            # 转换到LAB空间
-            lab = cv2.cvtColor(self.processor.current_image, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-            
-            # 创建CLAHE对象
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            
-            # 应用CLAHE到L通道
-            l_clahe = clahe.apply(l)
-            
-            # 合并通道
-            lab_clahe = cv2.merge([l_clahe, a, b])
-            
-            # 转换回BGR
-            return cv2.cvtColor(lab_clahe, cv2.COLOR_LAB2BGR)
+            # 只在LAB空间的L通道上做CLAHE
+            return image_ops.clahe_enhancement(self.processor.current_image, 2.0, 8)
         
         self.apply_operation(operation, "自适应直方图均衡化")
+        self.record_step('clahe', 'clahe', clip_limit=2.0, tile_size=8)
 
     def show_detailed_info(self):
         """显示所有处理结果的详细信息"""
@@ -1463,43 +1485,23 @@ class ModernGUI(QMainWindow):
                 group = QGroupBox(result['widget'].findChild(QLabel).text())
                 group_layout = QHBoxLayout()
                 
-                # 获取图像数据
-                pixmap = result['label'].pixmap()
-                if pixmap:
-                    image = self.pixmap_to_cv2(pixmap)
+                # 获取全分辨率图像
+                image = self.panel_images.image(key)
+                if image is not None:
                     
                     # 创建直方图
-                    fig = plt.figure(figsize=(4, 3))
-                    colors = ('b', 'g', 'r')
-                    for i, color in enumerate(colors):
-                        hist = cv2.calcHist([image], [i], None, [256], [0, 256])
-                        plt.plot(hist, color=color)
-                    plt.title('RGB直方图')
-                    plt.xlabel('像素值')
-                    plt.ylabel('频率')
-                    plt.legend()
-                    plt.grid(True)
-                    
-                    # 转换直方图为QLabel
-                    canvas = FigureCanvas(fig)
-                    canvas.draw()
-                    hist_label = QLabel()
-                    hist_label.setPixmap(QPixmap.fromImage(QImage(
-                        canvas.buffer_rgba(), 
-                        int(canvas.width()), 
-                        int(canvas.height()), 
-                        QImage.Format_RGBA8888
-                    )))
-                    plt.close()
+                    hist_label = HistogramWidget()
+                    hist_label.setMinimumSize(400, 300)
+                    hist_label.set_image(image, 'RGB直方图')
                     
                     # 添加统计信息
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                    stats = image_stats.image_stats(image, self.panel_images.version(key), gradient=False)
                     info_text = f"统计信息:\n"
-                    info_text += f"均值: {np.mean(gray):.2f}\n"
-                    info_text += f"标准差: {np.std(gray):.2f}\n"
-                    info_text += f"中值: {np.median(gray):.2f}\n"
-                    info_text += f"最小值: {np.min(gray):.2f}\n"
-                    info_text += f"最大值: {np.max(gray):.2f}"
+                    info_text += f"均值: {stats['mean']:.2f}\n"
+                    info_text += f"标准差: {stats['std']:.2f}\n"
+                    info_text += f"中值: {stats['median']:.2f}\n"
+                    info_text += f"最小值: {stats['min']:.2f}\n"
+                    info_text += f"最大值: {stats['max']:.2f}"
                     
                     info_label = QLabel(info_text)
                     info_label.setStyleSheet("font-size: 12px;")
@@ -1535,26 +1537,15 @@ class ModernGUI(QMainWindow):
         
         # 计算并显示图像统计信息
         img = self.processor.current_image
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 基本统计信息
-        mean_val = np.mean(gray)
-        std_val = np.std(gray)
-        median_val = np.median(gray)
-        
-        # 梯度信息
-        grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_mag = np.sqrt(grad_x**2 + grad_y**2)
-        mean_gradient = np.mean(gradient_mag)
+        stats = image_stats.image_stats(img)
         
         # 更新信息显示
         info_text = f"图像统计信息:\n"
         info_text += f"尺寸: {img.shape[1]}×{img.shape[0]}\n"
-        info_text += f"均值: {mean_val:.2f}\n"
-        info_text += f"标准差: {std_val:.2f}\n"
-        info_text += f"中值: {median_val:.2f}\n"
-        info_text += f"平均梯度: {mean_gradient:.2f}"
+        info_text += f"均值: {stats['mean']:.2f}\n"
+        info_text += f"标准差: {stats['std']:.2f}\n"
+        info_text += f"中值: {stats['median']:.2f}\n"
+        info_text += f"平均梯度: {stats['mean_gradient']:.2f}"
         return info_text
 
     def update_canny_low(self):
@@ -1614,13 +1605,15 @@ class ModernGUI(QMainWindow):
         self.processor.morph_size = value
         self.statusBar().showMessage(f'形态学核大小: {value}')
 
+    def update_morph_shape(self):
+        """更新形态学操作的结构元素形状"""
+        self.processor.morph_shape = self.morph_shape_combo.currentData()
+        self.statusBar().showMessage(f'结构元素形状: {self.morph_shape_combo.currentText()}')
+
     def show_image_viewer(self, label):
-        """显示图像查看器对话框"""
-        if not label.pixmap():
-            return
-        
-        # 将QPixmap转换为OpenCV图像
-        image = self.pixmap_to_cv2(label.pixmap())
+        """显示图像查看器对话框（查看面板的全分辨率图像）"""
+        key = next((key for key, result in self.result_widgets.items() if result['label'] is label), None)
+        image = self.panel_images.image(key)
         if image is not None:
             dialog = ImageViewerDialog(image, self)
             dialog.exec_()
@@ -1689,6 +1682,8 @@ class ModernGUI(QMainWindow):
             
             # 更新显示
             self.update_result_display(result, 'defect')
+            # AI检测不在处理流程中，该结果图没有可回放的流程
+            self.panel_recipes.pop('defect', None)
             
             # 显示检测结果
             result_text = f"AI检测结果:\n"
@@ -1732,10 +1727,8 @@ class ModernGUI(QMainWindow):
         if not dir_path:  # 如果用户取消选择，直接返回
             return
             
-        # 获取所有图片文件
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp']:
-            image_files.extend(glob.glob(os.path.join(dir_path, ext)))
+        # 获取所有图片文件（按文件名排序，保证连续拍摄的帧按顺序处理）
+        image_files = batch_processor.list_images(dir_path)
         
         if not image_files:
             QMessageBox.warning(self, "警告", "所选文件夹中没有支持的图片文件！")
@@ -1798,6 +1791,13 @@ class ModernGUI(QMainWindow):
         
         # 处理每张图片
         processed_count = 0
+        batch_method = 'ai' if method == "AI方法" else 'intelligent'
+        dedup = FrameDeduplicator() if self.dedup_checkbox.isChecked() else None
+        skipped_low_quality = 0
+        if self.quality_checkbox.isChecked():
+            self.processor.quality_gate = QualityGate(action='skip')
+        if self.roi_checkbox.isChecked():
+            self.processor.road_roi = RoadROI(auto=True)
         try:
             for i, image_path in enumerate(image_files):
                 if progress.wasCanceled():  # 如果用户取消，直接退出循环
@@ -1811,53 +1811,11 @@ class ModernGUI(QMainWindow):
                                         f"当前进度: {int((i/len(image_files))*100)}%")
                     QApplication.processEvents()
                     
-                    # 加载图片
-                    self.processor.load_image(image_path)
-                    
-                    # 根据选择的方法进行处理
-                    if method == "AI方法":
-                        result, defects = self.processor.detect_defects_ai()
-                    else:
-                        result, defects = self.processor.detect_defects_intelligent()
-                    
-                    # 保存结果
-                    output_path = os.path.join(output_dir, f'processed_{os.path.basename(image_path)}')
-                    _, buffer = cv2.imencode(os.path.splitext(output_path)[1], result)
-                    with open(output_path, 'wb') as f:
-                        f.write(buffer)
-                    
-                    # 保存检测结果信息
-                    info_path = os.path.splitext(output_path)[0] + '_info.txt'
-                    with open(info_path, 'w', encoding='utf-8') as f:
-                        f.write(f"检测方法: {method}\n")
-                        if method == "AI方法":
-                            f.write(f"检测模式: {mode}\n")
-                        f.write(f"检测结果:\n")
-                        if method == "AI方法":
-                            if 'stats' in defects:
-                                if self.processor.detection_mode in ['bbox', 'both']:
-                                    bbox_stats = defects['stats']['bbox']
-                                    f.write(f"边界框检测:\n")
-                                    f.write(f"- 检测到坑洼: {bbox_stats['count']} 处\n")
-                                    if bbox_stats['count'] > 0:
-                                        f.write("- 各区域面积(像素):\n")
-                                        for i, area in enumerate(bbox_stats['areas'], 1):
-                                            f.write(f"  区域{i}: {area}\n")
-                                
-                                if self.processor.detection_mode in ['segment', 'both']:
-                                    segment_stats = defects['stats']['segment']
-                                    f.write(f"\n分割检测:\n")
-                                    f.write(f"- 检测到目标: {segment_stats['count']} 处\n")
-                                    if segment_stats['count'] > 0:
-                                        f.write("- 各区域掩码面积(像素):\n")
-                                        for i, area in enumerate(segment_stats['areas'], 1):
-                                            f.write(f"  区域{i}: {area}\n")
-                            else:
-                                f.write(f"坑洼: {len(defects['potholes'])} 处\n")
-                        else:
-                            f.write(f"裂缝: {len(defects['cracks'])} 处\n")
-                            f.write(f"坑洼: {len(defects['potholes'])} 处\n")
-                            f.write(f"积水: {len(defects['water'])} 处\n")
+                    # 检测并保存结果图片和检测信息
+                    defects, _ = batch_processor.process_image_file(
+                        self.processor, image_path, output_dir, batch_method, dedup)
+                    if defects.get('quality', {}).get('action') == 'skip':
+                        skipped_low_quality += 1
                     
                     processed_count += 1
                     
@@ -1869,29 +1827,133 @@ class ModernGUI(QMainWindow):
             # 恢复原始状态
             self.processor.original_image = saved_original_image
             self.processor.current_image = saved_current_image
+            self.processor.quality_gate = None
+            self.processor.road_roi = None
             
             progress.close()  # 关闭进度对话框
             
             if processed_count > 0:  # 只有在实际处理了图片时才显示完成消息
-                QMessageBox.information(self, "完成", 
-                    f"批量处理完成！\n"
-                    f"成功处理: {processed_count}/{len(image_files)} 张图片\n"
-                    f"处理结果保存在: {output_dir}")
+                message = (f"批量处理完成！\n"
+                           f"成功处理: {processed_count}/{len(image_files)} 张图片\n"
+                           f"处理结果保存在: {output_dir}")
+                if dedup is not None:
+                    report = dedup.report()
+                    message += (f"\n跳过近似重复帧: {report['duplicates']} 张"
+                                f"，节省推理时间约 {report['saved_time']:.1f} 秒")
+                if self.quality_checkbox.isChecked():
+                    message += f"\n跳过低质量图片: {skipped_low_quality} 张"
+                message += "\n\n是否浏览处理结果？"
+                if QMessageBox.question(self, "完成", message) == QMessageBox.Yes:
+                    self.show_batch_browser(output_dir)
+
+    def save_recipe(self):
+        """把选中结果图（未选中时为最近一次操作）的处理流程保存为JSON文件"""
+        recipe = self.current_recipe()
+        if recipe is None or len(recipe) == 0:
+            QMessageBox.warning(self, "警告", "还没有可保存的处理流程，请先对图像进行处理！")
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "保存处理流程", "recipe.json", "处理流程 (*.json)")
+        if file_name:
+            recipe.save(file_name)
+            self.statusBar().showMessage(f'处理流程已保存: {recipe}')
+
+    def replay_recipe(self):
+        """按处理流程并行处理文件夹中的所有图片"""
+        recipe = self.current_recipe()
+        if recipe is None or len(recipe) == 0:
+            # 没有录制的流程时从文件加载
+            file_name, _ = QFileDialog.getOpenFileName(self, "选择处理流程", "", "处理流程 (*.json)")
+            if not file_name:
+                return
+            try:
+                recipe = Recipe.load(file_name)
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"加载处理流程失败：{str(e)}")
+                return
+        
+        dir_path = QFileDialog.getExistingDirectory(self, "选择图片文件夹")
+        if not dir_path:
+            return
+        image_files = batch_processor.list_images(dir_path)
+        if not image_files:
+            QMessageBox.warning(self, "警告", "所选文件夹中没有支持的图片文件！")
+            return
+        output_dir = os.path.join(dir_path, 'processed_recipe')
+        
+        progress = QProgressDialog(f"按流程处理: {recipe}", "取消", 0, len(image_files), self)
+        progress.setWindowTitle("批处理进度")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        
+        # 在后台线程中并行处理，界面线程只刷新进度
+        done = [0]
+        stop_event = threading.Event()
+        result = {}
+        
+        def on_progress(count, total, image_path):
+            done[0] = count
+        
+        def run():
+            result['count'] = batch_processor.replay_recipe(
+                recipe, dir_path, output_dir, os.cpu_count() or 4, image_files,
+                progress=on_progress, stop_event=stop_event)
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        while worker.is_alive():
+            if progress.wasCanceled():
+                stop_event.set()
+            progress.setValue(done[0])
+            QApplication.processEvents()
+            time.sleep(0.05)
+        progress.close()
+        
+        count = result.get('count', 0)
+        if count > 0:
+            QMessageBox.information(self, "完成",
+                                    f"按流程处理完成！\n处理流程: {recipe}\n"
+                                    f"成功处理: {count}/{len(image_files)} 张图片\n"
+                                    f"处理结果保存在: {output_dir}")
+
+    def show_batch_browser(self, folder=None):
+        """浏览批处理输出文件夹中的结果，可按缺陷数量筛选和排序"""
+        folder = folder or QFileDialog.getExistingDirectory(self, "选择批处理结果文件夹")
+        if not folder:
+            return
+        try:
+            dialog = BatchBrowserDialog(folder, self.open_result_image, self)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"读取批处理结果失败：{str(e)}")
+            return
+        if dialog.model.rowCount() == 0:
+            QMessageBox.warning(self, "警告", "所选文件夹中没有批处理结果！")
+            return
+        dialog.exec_()
+
+    def open_result_image(self, path):
+        """在图像查看器中打开结果图"""
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            QMessageBox.warning(self, "警告", f"无法读取图片: {path}")
+            return
+        dialog = ImageViewerDialog(image, self)
+        dialog.setWindowTitle(f"结果图: {os.path.basename(path)}")
+        dialog.exec_()
 
     def copy_selected_image(self):
         """复制选中的图像到剪贴板"""
         # 查找选中的图像
         selected_image = None
-        for result in self.result_widgets.values():
+        for key, result in self.result_widgets.items():
             if result['selected'] and result['has_result']:
-                pixmap = result['label'].pixmap()
-                if pixmap:
-                    selected_image = pixmap
+                selected_image = self.panel_images.qimage(key)
+                if selected_image is not None:
                     break
         
-        if selected_image:
+        if selected_image is not None:
+            # 复制全分辨率图像；剪贴板可能在之后读取，不能与面板图像共享内存
             clipboard = QApplication.clipboard()
-            clipboard.setPixmap(selected_image)
+            clipboard.setImage(selected_image.copy())
             self.statusBar().showMessage('图像已复制到剪贴板')
         else:
             self.statusBar().showMessage('没有选中的图像可复制')
@@ -1941,6 +2003,7 @@ class ImageViewerDialog(QDialog):
         self.rectangles = []  # [(rect, id), ...]
         self.next_rect_id = 1
         self.current_scale = 1.0  # 添加缩放比例跟踪
+        self.region_stats = None  # 区域直方图的积分表（RegionStats），第一次框选时建立
         
         # 设置窗口属性
         self.setWindowTitle('图像查看器')
@@ -1955,11 +2018,7 @@ class ImageViewerDialog(QDialog):
 
     def setup_image(self):
         """初始化图像显示"""
-        height, width = self.image.shape[:2]
-        bytes_per_line = 3 * width
-        image_rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
-        q_image = QImage(image_rgb.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(q_image)
+        pixmap = QPixmap.fromImage(qimage_view(self.image))
         self.image_item = self.image_scene.addPixmap(pixmap)
         self.image_scene.setSceneRect(self.image_item.boundingRect())
 
@@ -2212,7 +2271,7 @@ class ImageViewerDialog(QDialog):
         hist_layout.setSpacing(5)
         
         # 添加直方图
-        hist_label = QLabel()
+        hist_label = HistogramWidget()
         hist_label.setMinimumSize(400, 300)
         
         # 添加放大按钮
@@ -2247,8 +2306,8 @@ class ImageViewerDialog(QDialog):
         self.results_layout.insertWidget(0, result_widget)
 
     def show_zoomed_histogram(self, hist_label):
-        """显示放大的直方图"""
-        if not hist_label.pixmap():
+        """显示放大的直方图（按放大后的尺寸重新绘制曲线）"""
+        if not hist_label.panels():
             return
             
         dialog = QDialog(self)
@@ -2262,17 +2321,13 @@ class ImageViewerDialog(QDialog):
         
         # 创建滚动区域
         scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
         
-        # 创建新的标签显示放大的直方图
-        zoomed_label = QLabel()
-        zoomed_label.setPixmap(hist_label.pixmap().scaled(
-            800, 600,
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        ))
+        # 创建新的直方图控件显示放大的直方图
+        zoomed_hist = HistogramWidget()
+        zoomed_hist.set_panels(hist_label.panels())
+        zoomed_hist.resize(800, 600)
         
-        scroll.setWidget(zoomed_label)
+        scroll.setWidget(zoomed_hist)
         layout.addWidget(scroll)
         
         # 添加缩放控制
@@ -2281,25 +2336,12 @@ class ImageViewerDialog(QDialog):
         zoom_out = QPushButton("缩小")
         zoom_fit = QPushButton("适应窗口")
         
-        current_scale = 1.0
-        
         def zoom(factor):
-            nonlocal current_scale
-            current_scale *= factor
-            new_size = hist_label.pixmap().size() * current_scale
-            zoomed_label.setPixmap(hist_label.pixmap().scaled(
-                new_size,
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            ))
+            zoomed_hist.resize(zoomed_hist.size() * factor)
         
         zoom_in.clicked.connect(lambda: zoom(1.2))
         zoom_out.clicked.connect(lambda: zoom(0.8))
-        zoom_fit.clicked.connect(lambda: zoomed_label.setPixmap(hist_label.pixmap().scaled(
-            scroll.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )))
+        zoom_fit.clicked.connect(lambda: zoomed_hist.resize(scroll.viewport().size()))
         
         zoom_layout.addWidget(zoom_in)
         zoom_layout.addWidget(zoom_out)
@@ -2407,8 +2449,8 @@ class ImageViewerDialog(QDialog):
             widget = self.results_layout.itemAt(i).widget()
             if isinstance(widget, QGroupBox) and widget.title() == f"区域 #{rect_id}":
                 # 更新直方图和统计信息
-                hist_label = widget.findChild(QLabel)
-                stats_label = widget.findChildren(QLabel)[1]  # 第二个QLabel是统计信息
+                hist_label = widget.findChild(HistogramWidget)
+                stats_label = widget.findChild(QLabel)
                 self.update_roi_info(rect, hist_label, stats_label, rect_id)
                 break
 
@@ -2432,48 +2474,26 @@ class ImageViewerDialog(QDialog):
         y1 = max(0, min(y1, height-1))
         y2 = max(0, min(y2, height-1))
         
-        # 提取ROI区域
-        roi = self.image[y1:y2+1, x1:x2+1]
-        
-        if roi.size == 0:
+        # 由积分直方图得到区域的直方图和统计量，拖动边缘时每次移动都能立即刷新
+        if self.region_stats is None:
+            self.region_stats = RegionStats(self.image)
+        channel_stats, histograms = self.region_stats.stats(x1, y1, x2 - x1 + 1, y2 - y1 + 1)
+        if not channel_stats:
             return
         
-        # 创建直方图
-        plt.figure(figsize=(4, 3))
-        colors = ('b', 'g', 'r')
-        for i, color in enumerate(colors):
-            hist = cv2.calcHist([roi], [i], None, [256], [0, 256])
-            plt.plot(hist, color=color, label=f'{color.upper()}通道')
-        
-        plt.title(f'区域 #{rect_id+1} RGB直方图')
-        plt.xlabel('像素值')
-        plt.ylabel('频率')
-        plt.legend()
-        plt.grid(True)
-        
-        # 将matplotlib图像转换为QPixmap
-        canvas = FigureCanvas(plt.gcf())
-        canvas.draw()
-        width, height = canvas.get_width_height()
-        image = QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888)
-        plt.close()
-        
         # 显示直方图
-        pixmap = QPixmap.fromImage(image)
-        hist_label.setPixmap(pixmap.scaled(
-            hist_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        hist_label.set_histograms(histograms, f'区域 #{rect_id+1} RGB直方图')
         
         # 更新统计信息
         stats_text = f"<b>区域 #{rect_id+1} 统计信息:</b><br>"
         stats_text += f"位置: ({x1}, {y1}) - ({x2}, {y2})<br>"
         stats_text += f"大小: {x2-x1+1} × {y2-y1+1}<br><br>"
         
-        for i, color in enumerate(['蓝色', '绿色', '红色']):
-            channel = roi[:,:,i]
+        for color, channel in zip(['蓝色', '绿色', '红色'], channel_stats):
             stats_text += f"<b>{color}通道:</b><br>"
-            stats_text += f"均值: {np.mean(channel):.2f}<br>"
-            stats_text += f"标准差: {np.std(channel):.2f}<br>"
-            stats_text += f"最小值: {np.min(channel)}<br>"
-            stats_text += f"最大值: {np.max(channel)}<br><br>"
+            stats_text += f"均值: {channel['mean']:.2f}<br>"
+            stats_text += f"标准差: {channel['std']:.2f}<br>"
+            stats_text += f"最小值: {channel['min']}<br>"
+            stats_text += f"最大值: {channel['max']}<br><br>"
         
         stats_label.setText(stats_text) 
\ No newline at end of file
@@ -0,0 +1,188 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from buffer_pool import DEFAULT_POOL, output_array
+
+
+# 形态学运算：结构元素按 (形状, 尺寸) 缓存，迭代多次的矩形核换算为一次等价的大核，
+# 大核按可分解的结构走快速路径。所有路径的结果与 cv2 的对应调用（默认边界）完全相同。
+
+SHAPES = {
+    'rect': cv2.MORPH_RECT,
+    'ellipse': cv2.MORPH_ELLIPSE,
+    'cross': cv2.MORPH_CROSS,
+}
+OPERATIONS = ('erode', 'dilate', 'open', 'close', 'gradient')
+
+# 一维窗口长度不小于该值时用倍增法求滑动最值（每个像素的开销与窗口长度无关）；更短的窗口 cv2 更快
+LARGE_RECT_SIZE = 81
+# 核边长不小于该值时分解为一组中心对称的矩形逐级计算（见 _decomposed）。cv2 对矩形核本身按行列可分离计算，
+# 只有超过 LARGE_RECT_SIZE 才需要改用倍增法；对椭圆核逐点扫描，开销随面积增长，分解后只随边长增长
+DECOMPOSE_SIZE = {'rect': LARGE_RECT_SIZE, 'ellipse': 15, 'cross': 61}
+
+
+@lru_cache(maxsize=64)
+def structuring_element(size, shape='rect'):
+    """size×size 的结构元素（uint8，只读），按参数缓存"""
+    if shape not in SHAPES:
+        raise ValueError(f"不支持的结构元素形状: {shape}")
+    size = int(size)
+    if size < 1:
+        raise ValueError(f"结构元素尺寸必须为正整数: {size}")
+    kernel = cv2.getStructuringElement(SHAPES[shape], (size, size))
+    kernel.flags.writeable = False
+    return kernel
+
+
+def equivalent_size(size, iterations=1):
+    """边长为奇数的矩形核 size 迭代 iterations 次与边长为 iterations×(size-1)+1 的矩形核一次运算等价
+    （锚点都在中心；偶数边长的锚点不在中心，迭代时交给 cv2 处理）"""
+    return iterations * (size - 1) + 1
+
+
+@lru_cache(maxsize=64)
+def rect_decomposition(size, shape='rect'):
+    """把中心对称的结构元素分解为一组以中心为锚点的矩形 [(半宽, 半高), ...]，半宽递增、半高递减
+
+    结构元素等于这些矩形的并集；各行不连续、不居中或上下不对称时返回 None。
+    """
+    kernel = structuring_element(size, shape)
+    rows, cols = kernel.shape
+    if rows % 2 == 0 or cols % 2 == 0 or not np.array_equal(kernel, kernel[::-1]):
+        return None
+    center_row, center_col = rows // 2, cols // 2
+    half_widths = []
+    for row in kernel[center_row:]:
+        width = int(row.sum())
+        if width == 0:
+            break
+        half = width // 2
+        if width % 2 == 0 or not row[center_col - half:center_col + half + 1].all():
+            return None
+        half_widths.append(half)
+    if any(b > a for a, b in zip(half_widths, half_widths[1:])) or kernel[center_row + len(half_widths):].any():
+        return None
+    # 半高为 h 的行的半宽是 half_widths[h]，按半宽分组：每种半宽对应其能覆盖到的最大半高
+    runs = {}
+    for half_height, half_width in enumerate(half_widths):
+        runs[half_width] = half_height
+    return tuple(sorted(runs.items()))
+
+
+def _running_extreme(image, half, axis, op, neutral, dst):
+    """沿 axis 方向求窗口 [-half, half] 内的最大/最小值（op 为 cv2.max / cv2.min）
+
+    倍增法：先把输入在两端各填充 half 个 neutral，窗口长度按 1, 2, 4, ... 加倍，每次只做一次逐元素运算，
+    最后用两个重叠的窗口拼出 2×half+1 的长度。与 cv2 默认的常数边界（忽略图像外的像素）一致。
+    """
+    size = 2 * half + 1
+    value = (neutral,) * 4
+    if axis == 1:
+        padded = cv2.copyMakeBorder(image, 0, 0, half, half, cv2.BORDER_CONSTANT, value=value)
+    else:
+        padded = cv2.copyMakeBorder(image, half, half, 0, 0, cv2.BORDER_CONSTANT, value=value)
+    length = padded.shape[axis]
+
+    def span(start, stop):
+        return (slice(None), slice(start, stop)) if axis == 1 else (slice(start, stop),)
+
+    width = 1
+    while width * 2 <= size:
+        op(padded[span(0, length - width)], padded[span(width, length)], dst=padded[span(0, length - width)])
+        width *= 2
+    count = image.shape[axis]
+    return op(padded[span(0, count)], padded[span(size - width, size - width + count)], dst=dst)
+
+
+@lru_cache(maxsize=64)
+def _line_element(half, axis):
+    """一行（axis=1）或一列（axis=0）的结构元素，长度为 2×half+1"""
+    kernel = np.ones((1, 2 * half + 1) if axis == 1 else (2 * half + 1, 1), np.uint8)
+    kernel.flags.writeable = False
+    return kernel
+
+
+def _line(image, half, axis, kind, dst):
+    """一维（行或列）的腐蚀/膨胀，窗口为 [-half, half]"""
+    if 2 * half + 1 >= LARGE_RECT_SIZE and image.dtype == np.uint8:
+        op, neutral = (cv2.min, 255) if kind == 'erode' else (cv2.max, 0)
+        return _running_extreme(image, half, axis, op, neutral, dst)
+    kernel = _line_element(half, axis)
+    return cv2.erode(image, kernel, dst=dst) if kind == 'erode' else cv2.dilate(image, kernel, dst=dst)
+
+
+def _decomposed(image, runs, kind, dst):
+    """按矩形分解计算腐蚀/膨胀：结果为各矩形结果的最值
+
+    行方向的窗口按半宽递增逐级扩大，列方向按 Horner 法嵌套：
+    max_i 列(H_i)∘行(W_i) = 列(d_m)(max(... 列(d_2)(max(列(d_1)(行(W_1)), 行(W_2))) ..., 行(W_m)))，
+    其中 d_i = H_i - H_{i+1}，总的列方向窗口长度只有核高，而不是每个矩形各算一次。
+    """
+    combine = cv2.min if kind == 'erode' else cv2.max
+    with DEFAULT_POOL.scope() as acquire:
+        row = image
+        acc = acquire(image.shape, image.dtype)
+        previous_width = 0
+        for i, (half_width, half_height) in enumerate(runs):
+            if half_width > previous_width:
+                row = _line(row, half_width - previous_width, 1, kind,
+                            row if row is not image else acquire(image.shape, image.dtype))
+                previous_width = half_width
+            if i == 0:
+                np.copyto(acc, row)
+            else:
+                combine(acc, row, dst=acc)
+            step = half_height - (runs[i + 1][1] if i + 1 < len(runs) else 0)
+            if step:
+                _line(acc, step, 0, kind, acc)
+        np.copyto(dst, acc)
+    return dst
+
+
+def _apply(image, kind, size, shape, iterations, dst):
+    """一次腐蚀或膨胀（迭代 iterations 次），按核的大小和形状选择实现"""
+    if shape == 'rect' and size % 2 == 1:
+        size, iterations = equivalent_size(size, iterations), 1
+    runs = rect_decomposition(size, shape) if iterations == 1 and size % 2 == 1 else None
+    if runs is not None and size >= DECOMPOSE_SIZE[shape]:
+        return _decomposed(image, runs, kind, dst)
+    kernel = structuring_element(size, shape)
+    if kind == 'erode':
+        return cv2.erode(image, kernel, dst=dst, iterations=iterations)
+    return cv2.dilate(image, kernel, dst=dst, iterations=iterations)
+
+
+def erode(image, size=3, shape='rect', iterations=1, dst=None):
+    """腐蚀，dst 为可选的结果数组（可以是 image 本身）"""
+    return _apply(image, 'erode', size, shape, iterations, output_array(dst, image.shape, image.dtype))
+
+
+def dilate(image, size=3, shape='rect', iterations=1, dst=None):
+    """膨胀，dst 为可选的结果数组（可以是 image 本身）"""
+    return _apply(image, 'dilate', size, shape, iterations, output_array(dst, image.shape, image.dtype))
+
+
+def apply(image, operation, size=3, shape='rect', iterations=1, dst=None):
+    """形态学运算：erode / dilate / open / close / gradient
+
+    size: 结构元素边长；shape: 'rect' / 'ellipse' / 'cross'；
+    iterations: 腐蚀/膨胀的迭代次数（开闭运算中两步各迭代 iterations 次，与 cv2.morphologyEx 一致），
+    矩形核会换算为一次等价的大核；dst: 可选的结果数组（可以是 image 本身）。
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"不支持的形态学操作: {operation}")
+    result = output_array(dst, image.shape, image.dtype)
+    if operation in ('erode', 'dilate'):
+        return _apply(image, operation, size, shape, iterations, result)
+    if operation == 'open':
+        _apply(image, 'erode', size, shape, iterations, result)
+        return _apply(result, 'dilate', size, shape, iterations, result)
+    if operation == 'close':
+        _apply(image, 'dilate', size, shape, iterations, result)
+        return _apply(result, 'erode', size, shape, iterations, result)
+    with DEFAULT_POOL.borrow(image.shape, image.dtype) as eroded:
+        _apply(image, 'erode', size, shape, iterations, eroded)
+        _apply(image, 'dilate', size, shape, iterations, result)
+        return cv2.subtract(result, eroded, dst=result)
@@ -0,0 +1,95 @@
+import itertools
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage, QPixmap
+
+
+# 界面各结果面板的全分辨率图像。面板上显示的是缩放到控件尺寸的位图，后续处理、统计、复制和查看
+# 都应从这里取原图，而不是从缩放后的位图还原。
+
+# 每个面板最多缓存的缩放位图数（对应不同的控件尺寸）
+MAX_SCALED = 4
+
+_versions = itertools.count(1)
+
+
+def qimage_view(image):
+    """不复制数据地把uint8的BGR或灰度图像包装为QImage
+
+    QImage 直接引用数组的内存，数组在QImage使用期间必须保持存在且不被修改。
+    """
+    if image.dtype != np.uint8:
+        raise ValueError(f"只支持uint8图像: {image.dtype}")
+    if not image.flags['C_CONTIGUOUS']:
+        image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    if image.ndim == 2:
+        return QImage(image.data, width, height, image.strides[0], QImage.Format_Grayscale8)
+    if image.ndim == 3 and image.shape[2] == 3:
+        return QImage(image.data, width, height, image.strides[0], QImage.Format_BGR888)
+    raise ValueError(f"不支持的图像形状: {image.shape}")
+
+
+class _Entry:
+    def __init__(self, image):
+        self.image = image if image.flags['C_CONTIGUOUS'] else np.ascontiguousarray(image)
+        self.version = next(_versions)
+        self.qimage = qimage_view(self.image)
+        self.scaled = {}
+
+
+class PanelStore:
+    """按面板名保存全分辨率结果图，并缓存其按控件尺寸缩放后的位图
+
+    保存的图像与 image_ops 的输入一样不能被原地修改；每次 set 都会分配新的版本号，
+    可作为统计缓存等的版本标识（见 image_stats.StatsCache）。
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def set(self, panel, image):
+        """保存面板的结果图，返回版本号"""
+        entry = _Entry(image)
+        self._entries[panel] = entry
+        return entry.version
+
+    def image(self, panel):
+        """面板的全分辨率图像，没有结果时返回None"""
+        entry = self._entries.get(panel)
+        return entry.image if entry else None
+
+    def version(self, panel):
+        """面板当前图像的版本号，没有结果时返回None"""
+        entry = self._entries.get(panel)
+        return entry.version if entry else None
+
+    def qimage(self, panel):
+        """面板图像的QImage（与保存的数组共享内存，需要长期保存时应调用 copy()）"""
+        entry = self._entries.get(panel)
+        return entry.qimage if entry else None
+
+    def scaled_pixmap(self, panel, size):
+        """按 size（QSize）等比缩放后的位图，同一图像和尺寸只缩放一次"""
+        entry = self._entries.get(panel)
+        if entry is None:
+            return None
+        key = (size.width(), size.height())
+        pixmap = entry.scaled.get(key)
+        if pixmap is None:
+            # 先缩放QImage再转换为位图，只有缩放后的小图需要复制
+            pixmap = QPixmap.fromImage(entry.qimage.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            if len(entry.scaled) >= MAX_SCALED:
+                entry.scaled.pop(next(iter(entry.scaled)))
+            entry.scaled[key] = pixmap
+        return pixmap
+
+    def discard(self, panel):
+        self._entries.pop(panel, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, panel):
+        return panel in self._entries
@@ -0,0 +1,99 @@
+import time
+
+import cv2
+import numpy as np
+
+
+def _small_gray(image, max_side):
+    """按步长抽样并缩放到最长边不超过 max_side 的灰度图"""
+    step = max(1, max(image.shape[0], image.shape[1]) // (max_side * 2))
+    if step > 1:
+        image = image[::step, ::step]
+    scale = max_side / max(image.shape[0], image.shape[1])
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def assess_quality(image, max_side=320, grid=8, min_cell_std=2.0):
+    """在缩小的灰度图上计算图像质量指标
+
+    sharpness: 拉普拉斯响应方差，越小越模糊
+    brightness: 平均亮度（由直方图计算）
+    dark_ratio / bright_ratio: 接近全黑（<30）/ 接近过曝（>225）像素占比
+    coverage: 划分为 grid×grid 网格后，曝光正常且有纹理内容（标准差大于 min_cell_std）
+        的网格占比，用于识别镜头遮挡、局部过曝、大面积纯色等无效画面
+    """
+    gray = _small_gray(image, max_side)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    hist /= max(hist.sum(), 1)
+    brightness = float(np.dot(hist, np.arange(256)))
+    dark_ratio = float(hist[:30].sum())
+    bright_ratio = float(hist[226:].sum())
+
+    h, w = gray.shape
+    ch, cw = h // grid, w // grid
+    if ch > 0 and cw > 0:
+        cells = gray[:ch * grid, :cw * grid].reshape(grid, ch, grid, cw).astype(np.float32)
+        cell_mean = cells.mean(axis=(1, 3))
+        cell_std = cells.std(axis=(1, 3))
+        valid = (cell_std > min_cell_std) & (cell_mean >= 30) & (cell_mean <= 225)
+        coverage = float(np.mean(valid))
+    else:
+        coverage = 1.0
+
+    return {
+        'sharpness': sharpness,
+        'brightness': brightness,
+        'dark_ratio': dark_ratio,
+        'bright_ratio': bright_ratio,
+        'coverage': coverage,
+    }
+
+
+class QualityGate:
+    """检测前的图像质量门限
+
+    对模糊、过暗（夜间）、过曝和无效画面的帧，按 action 处理：
+    'skip' 直接跳过检测；'cheap' 改用低开销的检测路径。
+    阈值对应 assess_quality 在最长边320像素灰度图上的结果。
+    """
+
+    ACTIONS = ('skip', 'cheap')
+
+    def __init__(self, min_sharpness=30.0, min_brightness=40.0, max_brightness=220.0,
+                 max_dark_ratio=0.6, max_bright_ratio=0.3, min_coverage=0.5, action='skip'):
+        if action not in self.ACTIONS:
+            raise ValueError(f"不支持的质量门限处理方式: {action}")
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_dark_ratio = max_dark_ratio
+        self.max_bright_ratio = max_bright_ratio
+        self.min_coverage = min_coverage
+        self.action = action
+
+    def evaluate(self, image):
+        """评估一帧，返回记录到检测结果中的质量信息字典"""
+        start = time.perf_counter()
+        scores = assess_quality(image)
+        reasons = []
+        if scores['sharpness'] < self.min_sharpness:
+            reasons.append('blur')
+        if scores['brightness'] < self.min_brightness or scores['dark_ratio'] > self.max_dark_ratio:
+            reasons.append('underexposed')
+        if scores['brightness'] > self.max_brightness or scores['bright_ratio'] > self.max_bright_ratio:
+            reasons.append('overexposed')
+        if scores['coverage'] < self.min_coverage:
+            reasons.append('low_coverage')
+        return {
+            'passed': not reasons,
+            'action': None if not reasons else self.action,
+            'reasons': reasons,
+            'scores': scores,
+            'time_ms': (time.perf_counter() - start) * 1000.0,
+        }
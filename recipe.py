@@ -0,0 +1,183 @@
+import json
+
+import cv2
+
+import fft_engine
+import image_ops
+from buffer_pool import output_array
+
+
+# 处理流程（recipe）：按顺序记录的一组操作，每步为 {'op': 操作名, 'params': {参数}}，
+# 可保存为JSON，在界面中录制后批量回放，或随 /process 请求提交。
+
+# 可直接交给 image_ops.enhance_pipeline 的增强步骤
+ENHANCE_OPS = image_ops.ENHANCE_STEP_NAMES
+
+# 各操作的默认参数（也用于校验参数名）
+RECIPE_OPS = {
+    'brightness_contrast': {'brightness': 0, 'contrast': 1.0},
+    'equalize': {},
+    'clahe': {'clip_limit': 2.0, 'tile_size': 8},
+    'denoise': {'ksize': 3},
+    'sharpen': {'strength': 1},
+    'enhance': {},
+    'edges': {'canny_low': 50, 'canny_high': 150, 'connect': False, 'min_threshold': 5, 'max_threshold': 15},
+    'fft': {'radius': 30, 'mode': 'square'},
+    'morph': {'type': 'erode', 'size': 3, 'shape': 'rect'},
+    'detect_defects': {},
+    'detect_cracks': {},
+}
+
+# 输出检测结果 (结果图, Detections) 的操作
+DETECTION_OPS = ('detect_defects', 'detect_cracks')
+
+
+def _edges(image, out, canny_low, canny_high, connect, min_threshold, max_threshold):
+    if not connect:
+        return image_ops.detect_edges(image, canny_low, canny_high, out)
+    edges = image_ops.detect_edges(image, canny_low, canny_high)
+    connected = image_ops.connect_edges(cv2.cvtColor(edges, cv2.COLOR_BGR2GRAY), min_threshold, max_threshold)
+    return cv2.cvtColor(connected, cv2.COLOR_GRAY2BGR, dst=output_array(out, image.shape))
+
+
+def _fft(image, out, radius, mode):
+    if mode not in fft_engine.FILTER_KINDS:
+        raise ValueError(f"不支持的FFT滤波器类型: {mode}")
+    return image_ops.fft_filter(image, radius, mode, out)
+
+
+def _morph(image, out, type, size, shape):
+    return image_ops.morph(image, type, size, out, shape)
+
+
+class Recipe:
+    """按顺序执行的一组图像处理操作
+
+    steps: [{'op': 操作名, 'params': {参数}}, ...]，操作名见 RECIPE_OPS，缺省参数取默认值。
+    compile() 把步骤整理为可重复执行的阶段，相邻的增强步骤在结果不变的前提下合并为一次
+    enhance_pipeline 调用（亮度对比度合并为一张查找表）；fuse=True 时相邻的亮度通道步骤也共用
+    一次LAB转换（更快，但中间不再转回BGR取整，结果与逐步执行有少量像素差异）。
+    编译结果只包含参数，不保存图像，可在多个线程中共享。
+    """
+
+    def __init__(self, steps=None):
+        self.steps = []
+        self._compiled = {}
+        for step in steps or []:
+            self.then(step['op'], **step.get('params', {}))
+
+    def then(self, op, **params):
+        """追加一步操作，返回自身以便链式调用"""
+        if op not in RECIPE_OPS:
+            raise ValueError(f"不支持的处理操作: {op}")
+        unknown = set(params) - set(RECIPE_OPS[op])
+        if unknown:
+            raise ValueError(f"操作 {op} 不支持参数: {', '.join(sorted(unknown))}")
+        self.steps.append({'op': op, 'params': dict(params)})
+        self._compiled.clear()
+        return self
+
+    def copy(self):
+        return Recipe(self.steps)
+
+    def extended(self, op, **params):
+        """返回追加一步操作后的新流程，原流程不变"""
+        return self.copy().then(op, **params)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"Recipe({' → '.join(step['op'] for step in self.steps)})"
+
+    def to_dict(self):
+        return {'steps': [{'op': step['op'], 'params': dict(step['params'])} for step in self.steps]}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict 的结果创建，也接受直接的步骤列表"""
+        steps = data if isinstance(data, list) else data.get('steps', [])
+        if any(not isinstance(step, dict) or 'op' not in step for step in steps):
+            raise ValueError("处理流程格式错误：每一步需要包含 'op' 字段")
+        return cls(steps)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def compile(self, fuse=False):
+        """把步骤整理为执行阶段 [(种类, 参数)]，结果按 fuse 缓存"""
+        if fuse in self._compiled:
+            return self._compiled[fuse]
+        stages = []
+        for step in self.steps:
+            op = step['op']
+            params = dict(RECIPE_OPS[op], **step['params'])
+            if op == 'enhance':
+                pipeline = list(image_ops.ENHANCE_STEPS)
+            elif op in ENHANCE_OPS:
+                pipeline = [(op, params)]
+            else:
+                stages.append((op, params))
+                continue
+            # 相邻增强步骤放入同一次 enhance_pipeline 调用；只有两个亮度通道步骤相邻时合并会改变结果，
+            # 这种情况只在 fuse=True 时合并
+            previous = stages[-1] if stages else None
+            mergeable = previous is not None and previous[0] == 'pipeline' and (
+                fuse or previous[1][-1][0] not in image_ops.LIGHTNESS_STEPS
+                or pipeline[0][0] not in image_ops.LIGHTNESS_STEPS)
+            if mergeable:
+                previous[1].extend(pipeline)
+            else:
+                stages.append(('pipeline', pipeline))
+        self._compiled[fuse] = stages
+        return stages
+
+    def apply(self, image, out=None, fuse=False):
+        """对图像执行整个流程，返回 (结果图, Detections 或 None)
+
+        检测结果来自最后一个检测操作；out 为可选的结果数组（与 image 同形状的uint8数组）。
+        """
+        stages = self.compile(fuse)
+        result, defects = image, None
+        for i, (kind, params) in enumerate(stages):
+            dst = out if i == len(stages) - 1 else None
+            if kind == 'pipeline':
+                result = image_ops.enhance_pipeline(result, params, dst)
+            elif kind == 'edges':
+                result = _edges(result, dst, **params)
+            elif kind == 'fft':
+                result = _fft(result, dst, **params)
+            elif kind == 'morph':
+                result = _morph(result, dst, **params)
+            elif kind == 'detect_defects':
+                result, defects = image_ops.detect_defects_intelligent(result, out=dst)
+            else:
+                result, defects = image_ops.detect_cracks_advanced(result, out=dst)
+        if not stages:
+            result = image_ops.enhance_pipeline(image, [], out)
+        return result, defects
+
+
+def load_recipe(value):
+    """由JSON字符串、JSON文件路径或字典创建处理流程"""
+    if isinstance(value, Recipe):
+        return value
+    if isinstance(value, (dict, list)):
+        return Recipe.from_dict(value)
+    text = value.strip()
+    if text.startswith(('{', '[')):
+        return Recipe.from_json(text)
+    return Recipe.load(value)
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+# 任意矩形区域的各通道直方图和统计量（均值、标准差、最值）。
+# 预先把图像按 tile×tile 分块统计直方图并沿两个方向累加（分块积分直方图），
+# 查询时矩形内部的整块部分只需对积分表做一次四角加减，不足一块的边缘条带再直接统计，
+# 耗时与矩形面积无关，只与边长成正比，适合拖动ROI时逐帧刷新。
+
+# 积分直方图表的大小上限（字节），超过时加大分块尺寸
+MAX_TABLE_BYTES = 32 * 1024 * 1024
+MIN_TILE = 16
+
+
+def _choose_tile(height, width, channels, max_bytes=MAX_TABLE_BYTES):
+    """使积分直方图表不超过 max_bytes 的最小分块尺寸（2的幂，不小于 MIN_TILE）"""
+    tile = MIN_TILE
+    while (height // tile + 1) * (width // tile + 1) * channels * 256 * 4 > max_bytes:
+        tile *= 2
+    return tile
+
+
+class RegionStats:
+    """一幅uint8图像（BGR或灰度）上任意矩形区域的直方图和统计量
+
+    image: 图像，创建后不能再修改
+    tile: 分块尺寸，默认按 MAX_TABLE_BYTES 自动选择
+    """
+
+    def __init__(self, image, tile=None):
+        if image.dtype != np.uint8 or image.ndim not in (2, 3):
+            raise ValueError(f"只支持uint8的彩色或灰度图像: {image.dtype} {image.shape}")
+        self.image = image if image.ndim == 3 else image[:, :, None]
+        height, width, self.channels = self.image.shape
+        self.tile = tile or _choose_tile(height, width, self.channels)
+        self.table = self._build_table()
+
+    def _build_table(self):
+        """积分直方图 table[ty, tx] 为前 ty 行、前 tx 列分块的直方图之和，形状 (行数+1, 列数+1, 通道数×256)"""
+        tile, channels = self.tile, self.channels
+        rows, cols = self.image.shape[0] // tile, self.image.shape[1] // tile
+        bins = channels * 256
+        table = np.zeros((rows + 1, cols + 1, bins), np.int32)
+        # 每个像素的桶号：所在列块×通道数×256 + 通道×256 + 灰度值，每个分块行做一次 bincount
+        column_offset = (np.arange(cols * tile) // tile * bins).astype(np.int32)[:, None]
+        channel_offset = (np.arange(channels) * 256).astype(np.int32)
+        offsets = column_offset + channel_offset
+        for ty in range(rows):
+            band = self.image[ty * tile:(ty + 1) * tile, :cols * tile]
+            index = (band + offsets).ravel()
+            counts = np.bincount(index, minlength=cols * bins).reshape(cols, bins)
+            table[ty + 1, 1:] = counts
+        np.cumsum(table, axis=0, out=table)
+        np.cumsum(table, axis=1, out=table)
+        return table
+
+    def _direct(self, x0, y0, x1, y1, out):
+        """直接统计 [x0, x1)×[y0, y1) 的直方图，累加到 out（通道数×256）"""
+        if x1 <= x0 or y1 <= y0:
+            return
+        values = self.image[y0:y1, x0:x1].reshape(-1, self.channels)
+        index = (values + (np.arange(self.channels) * 256).astype(np.int32)).ravel()
+        out += np.bincount(index, minlength=self.channels * 256)
+
+    def histograms(self, x, y, width, height):
+        """矩形 (x, y, width, height) 内各通道的直方图，形状 (通道数, 256)，int64
+
+        矩形超出图像的部分被裁掉。
+        """
+        image_height, image_width = self.image.shape[:2]
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(image_width, int(x) + int(width)), min(image_height, int(y) + int(height))
+        hist = np.zeros(self.channels * 256, np.int64)
+        if x1 <= x0 or y1 <= y0:
+            return hist.reshape(self.channels, 256)
+        tile = self.tile
+        rows, cols = self.table.shape[0] - 1, self.table.shape[1] - 1
+        # 完全落在矩形内的分块范围 [tx0, tx1)×[ty0, ty1)
+        tx0, ty0 = -(-x0 // tile), -(-y0 // tile)
+        tx1, ty1 = min(x1 // tile, cols), min(y1 // tile, rows)
+        if tx1 <= tx0 or ty1 <= ty0:
+            self._direct(x0, y0, x1, y1, hist)
+            return hist.reshape(self.channels, 256)
+        t = self.table
+        hist += t[ty1, tx1]
+        hist -= t[ty0, tx1]
+        hist -= t[ty1, tx0]
+        hist += t[ty0, tx0]
+        # 上下两条整行宽的条带，左右两条只覆盖整块的行
+        inner_y0, inner_y1 = ty0 * tile, ty1 * tile
+        self._direct(x0, y0, x1, inner_y0, hist)
+        self._direct(x0, inner_y1, x1, y1, hist)
+        self._direct(x0, inner_y0, tx0 * tile, inner_y1, hist)
+        self._direct(tx1 * tile, inner_y0, x1, inner_y1, hist)
+        return hist.reshape(self.channels, 256)
+
+    def stats(self, x, y, width, height):
+        """矩形内各通道的统计量 [{'mean', 'std', 'min', 'max'}, ...] 和直方图（见 histograms）
+
+        由直方图精确计算，与对区域切片分别调用 np.mean / np.std / np.min / np.max 的结果相同。
+        矩形与图像不相交时返回 ([], 直方图)。
+        """
+        hists = self.histograms(x, y, width, height)
+        total = int(hists[0].sum())
+        if total == 0:
+            return [], hists
+        values = np.arange(256, dtype=np.int64)
+        results = []
+        for hist in hists:
+            first = int(hist @ values)
+            second = int(hist @ (values * values))
+            nonzero = np.flatnonzero(hist)
+            results.append({
+                'mean': first / total,
+                'std': float(np.sqrt((total * second - first * first) / (total * total))),
+                'min': int(nonzero[0]),
+                'max': int(nonzero[-1]),
+            })
+        return results, hists
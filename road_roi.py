@@ -0,0 +1,123 @@
+import json
+
+import cv2
+import numpy as np
+
+import morphology
+
+
+def _downscale(image, work_width):
+    step = max(1, image.shape[1] // (work_width * 2))
+    if step > 1:
+        image = image[::step, ::step]
+    scale = work_width / image.shape[1]
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image
+
+
+def _robust_range(values, k, margin):
+    """以中位数为中心、k倍稳健标准差（16%~84%分位数）为半宽的取值范围"""
+    p16, p50, p84 = np.percentile(values, (16, 50, 84))
+    half = k * (p84 - p16) / 2 + margin
+    return p50 - half, p50 + half
+
+
+def auto_road_mask(image, work_width=160, k=2.5):
+    """根据颜色和纹理统计自动估计路面区域
+
+    以画面中下部（车辆正前方）作为路面样本，统计饱和度、亮度和局部纹理强度，
+    与样本统计一致、且与样本区域连通的像素视为路面。天空、植被通常在饱和度或亮度上
+    与路面差异明显，会被排除。在缩小的图像上计算，返回原尺寸的uint8掩码（路面为255）。
+    """
+    small = _downscale(image, work_width)
+    h, w = small.shape[:2]
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    texture = cv2.blur(np.abs(cv2.Laplacian(gray, cv2.CV_32F)), (5, 5))
+
+    seed = (slice(int(h * 0.6), int(h * 0.85)), slice(int(w * 0.3), int(w * 0.7)))
+    candidate = np.ones((h, w), bool)
+    for channel, margin in ((hsv[:, :, 1], 10), (hsv[:, :, 2], 10), (texture, 5)):
+        low, high = _robust_range(channel[seed], k, margin)
+        candidate &= (channel >= low) & (channel <= high)
+
+    candidate = candidate.astype(np.uint8) * 255
+    morphology.apply(candidate, 'open', 3, dst=candidate)
+    morphology.apply(candidate, 'close', 7, dst=candidate)
+
+    # 只保留与路面样本区域连通的部分，并填充内部空洞（坑洼、积水本身也要保留在ROI内）
+    _, labels = cv2.connectedComponents(candidate)
+    keep = np.unique(labels[seed])
+    keep = keep[keep > 0]
+    road = np.isin(labels, keep).astype(np.uint8) * 255
+    contours, _ = cv2.findContours(road, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    road = np.zeros_like(road)
+    cv2.drawContours(road, contours, -1, 255, cv2.FILLED)
+
+    return cv2.resize(road, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_NEAREST)
+
+
+class RoadROI:
+    """路面区域ROI
+
+    polygon: 静态多边形顶点 [(x, y), ...]，所有坐标都不大于1时按图像宽高归一化坐标处理；
+    auto: 未提供多边形时是否自动估计路面掩码。
+    min_overlap: 候选框与ROI的重叠面积占框面积的比例不低于该值时才保留。
+    """
+
+    def __init__(self, polygon=None, auto=False, min_overlap=0.5):
+        if polygon is None and not auto:
+            raise ValueError("RoadROI 需要指定多边形或启用自动路面估计")
+        self.polygon = None if polygon is None else np.asarray(polygon, dtype=np.float32).reshape(-1, 2)
+        self.auto = auto and polygon is None
+        self.min_overlap = min_overlap
+        self._mask_cache = {}
+
+    @classmethod
+    def from_config(cls, config_path, camera_id, min_overlap=0.5):
+        """从JSON配置文件读取指定相机的ROI
+
+        格式: {"相机ID": {"polygon": [[x, y], ...]} 或 {"auto": true}, ...}
+        """
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if camera_id not in config:
+            raise ValueError(f"ROI配置中没有相机: {camera_id}")
+        camera = config[camera_id]
+        return cls(camera.get('polygon'), camera.get('auto', False),
+                   camera.get('min_overlap', min_overlap))
+
+    def build_mask(self, image):
+        """返回与图像同尺寸的ROI掩码（ROI内为255），静态多边形的掩码按尺寸缓存"""
+        h, w = image.shape[:2]
+        if self.auto:
+            return auto_road_mask(image)
+        mask = self._mask_cache.get((h, w))
+        if mask is None:
+            points = self.polygon.copy()
+            if points.max() <= 1.0:
+                points *= (w, h)
+            mask = np.zeros((h, w), np.uint8)
+            cv2.fillPoly(mask, [np.round(points).astype(np.int32)], 255)
+            self._mask_cache[(h, w)] = mask
+        return mask
+
+    def filter_boxes(self, boxes, mask):
+        """按与ROI的重叠比例筛选 (x, y, w, h) 候选框，返回保留的布尔数组
+
+        用积分图一次性计算所有框内的ROI像素数
+        """
+        boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        if len(boxes) == 0:
+            return np.zeros(0, bool)
+        integral = cv2.integral((mask > 0).astype(np.uint8), sdepth=cv2.CV_32S)
+        h, w = mask.shape[:2]
+        x1 = np.clip(boxes[:, 0], 0, w)
+        y1 = np.clip(boxes[:, 1], 0, h)
+        x2 = np.clip(boxes[:, 0] + boxes[:, 2], 0, w)
+        y2 = np.clip(boxes[:, 1] + boxes[:, 3], 0, h)
+        inside = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        area = np.maximum(boxes[:, 2] * boxes[:, 3], 1)
+        return inside / area >= self.min_overlap
+
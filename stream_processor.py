@@ -0,0 +1,323 @@
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from image_processor import ImageProcessor
+import image_ops
+from defect_tracker import DefectTracker
+
+
+# 默认降级策略：从最高质量逐级降到最低开销
+# method: 'ai' 或 'intelligent'；resize: 推理前输入缩放比例
+# budget: 为True时把本帧剩余的延迟预算交给智能检测，由其按耗时模型选择尺度和分支
+# 未指定detection_mode的级别沿用处理器原有的检测模式
+DEFAULT_LEVELS = {
+    'ai': [
+        {'method': 'ai', 'resize': 1.0},
+        {'method': 'ai', 'detection_mode': 'bbox', 'resize': 1.0},
+        {'method': 'ai', 'detection_mode': 'bbox', 'resize': 0.5},
+    ],
+    'intelligent': [
+        {'method': 'intelligent', 'scales': (0.5, 1.0, 1.5), 'resize': 1.0},
+        {'method': 'intelligent', 'scales': (0.5, 1.0), 'resize': 1.0},
+        {'method': 'intelligent', 'scales': (0.5, 1.0), 'resize': 0.5},
+        {'method': 'intelligent', 'scales': (1.0,), 'resize': 0.5},
+    ],
+    'budgeted': [
+        {'method': 'intelligent', 'scales': (0.5, 1.0, 1.5), 'budget': True, 'resize': 1.0},
+        {'method': 'intelligent', 'scales': (0.5, 1.0, 1.5), 'budget': True, 'resize': 0.5},
+    ],
+}
+
+
+class LatestFrameBuffer:
+    """只保留最新一帧的缓冲区
+
+    写入新帧时直接覆盖尚未被取走的旧帧（记为丢帧），
+    保证推理线程拿到的永远是最新画面，处理速度跟不上时不会积压。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_id = 0
+        self._timestamp = 0.0
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, frame, timestamp=None):
+        """写入一帧，timestamp为采集时刻（time.perf_counter）；缓冲区关闭后写入的帧被忽略"""
+        with self._cond:
+            if self._closed:
+                return
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._timestamp = time.perf_counter() if timestamp is None else timestamp
+            self._frame_id += 1
+            self.written += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出最新帧，返回 (frame_id, timestamp, frame)
+
+        超时或缓冲区已关闭且无新帧时返回 None
+        """
+        with self._cond:
+            if self._frame is None and not self._closed:
+                self._cond.wait(timeout)
+            if self._frame is None:
+                return None
+            item = (self._frame_id, self._timestamp, self._frame)
+            self._frame = None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class StreamReader(threading.Thread):
+    """视频源读取线程
+
+    source 可以是视频文件路径、摄像头编号或网络流地址。
+    replay 为 True 时按文件原始帧率回放，用于模拟车载实时视频流。
+    """
+
+    def __init__(self, source, buffer, replay=None):
+        super().__init__(daemon=True)
+        self.source = source
+        self.buffer = buffer
+        # 文件默认按原始帧率回放；摄像头/网络流本身按实时速率产生帧
+        self.replay = isinstance(source, str) and '://' not in source if replay is None else replay
+        self.fps = 0.0
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                self.error = f"无法打开视频源: {self.source}"
+                return
+            self.fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+            interval = 1.0 / self.fps
+            next_time = time.perf_counter()
+            while not self._stop_event.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.buffer.put(frame, time.perf_counter())
+                if self.replay:
+                    next_time += interval
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+        finally:
+            cap.release()
+            self.buffer.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RealtimeStreamProcessor:
+    """有界延迟的实时检测
+
+    始终对最新帧做推理，来不及处理的旧帧直接丢弃；
+    当端到端延迟超过预算时自动切换到更低开销的检测方式或更低的输入分辨率，
+    延迟恢复后再逐级升回。
+    传入 tracker 时对每帧结果做跨帧关联，defects.track_ids 给出各框的缺陷ID。
+    """
+
+    def __init__(self, processor=None, method='ai', latency_budget_ms=200,
+                 levels=None, on_result=None, tracker=None):
+        self.processor = processor or ImageProcessor()
+        self.tracker = tracker
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.levels = levels or DEFAULT_LEVELS[method]
+        self.on_result = on_result
+        self.level = 0
+        self.detection_mode = self.processor.detection_mode
+
+        # 延迟平滑与升降级参数
+        self.ema_alpha = 0.3
+        self.recover_ratio = 0.6  # 平滑延迟低于预算的该比例时尝试升级
+        self.hold_frames = 10     # 每次切换后至少保持的帧数
+        self._ema = None
+        self._frames_since_switch = 0
+
+        # 按预算检测的级别需要耗时模型，在启动时标定，避免首帧超时
+        if any(level.get('budget') for level in self.levels):
+            image_ops.default_cost_model()
+
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.latencies = []
+        self.inference_times = []
+        self.level_switches = []
+        self.processed = 0
+
+    def run(self, source, replay=None, max_frames=None):
+        """处理视频源直到结束，返回统计报告"""
+        self._reset_stats()
+        if self.tracker is not None:
+            self.tracker.reset()
+        buffer = LatestFrameBuffer()
+        reader = StreamReader(source, buffer, replay)
+        reader.start()
+        start = time.perf_counter()
+        try:
+            while max_frames is None or self.processed < max_frames:
+                item = buffer.get(timeout=1.0)
+                if item is None:
+                    if buffer.closed:
+                        break
+                    continue
+                frame_id, captured_at, frame = item
+
+                infer_start = time.perf_counter()
+                remaining_ms = (self.latency_budget - (infer_start - captured_at)) * 1000.0
+                result_image, defects = self.process_frame(frame, max(remaining_ms, 0.0))
+                if self.tracker is not None:
+                    defects.set_track_ids(self.tracker.update_defects(defects, frame_id))
+                done = time.perf_counter()
+
+                latency = done - captured_at
+                self.latencies.append(latency)
+                self.inference_times.append(done - infer_start)
+                self.processed += 1
+                self._adapt(latency, frame_id)
+
+                if self.on_result is not None:
+                    self.on_result(frame_id, result_image, defects, latency)
+        finally:
+            # 先关闭缓冲区再停止读取线程，之后读到的帧不计入采集和丢帧
+            buffer.close()
+            reader.stop()
+            reader.join()
+        if reader.error:
+            raise ValueError(reader.error)
+        return self.report(buffer, time.perf_counter() - start, reader.fps)
+
+    def process_frame(self, frame, budget_ms=None):
+        """按当前降级级别处理一帧，检测框坐标始终对应原始分辨率
+
+        budget_ms: 本帧剩余的延迟预算，只用于 budget 为True的级别
+        """
+        level = self.levels[self.level]
+        scale = level.get('resize', 1.0)
+        image = frame
+        if scale != 1.0:
+            image = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        self.processor.current_image = image
+        if level['method'] == 'ai':
+            self.processor.detection_mode = level.get('detection_mode', self.detection_mode)
+            result_image, defects = self.processor.detect_defects_ai()
+        else:
+            result_image, defects = self.processor.detect_defects_intelligent(
+                level.get('scales', (0.5, 1.0, 1.5)),
+                budget_ms if level.get('budget') and budget_ms is not None else None)
+
+        if scale != 1.0:
+            result_image = cv2.resize(result_image, (frame.shape[1], frame.shape[0]))
+            defects = defects.transformed(scale=1.0 / scale)
+        return result_image, defects
+
+    def _adapt(self, latency, frame_id):
+        """根据平滑后的端到端延迟调整降级级别"""
+        self._ema = latency if self._ema is None else (
+            self.ema_alpha * latency + (1 - self.ema_alpha) * self._ema)
+        self._frames_since_switch += 1
+        if self._frames_since_switch < self.hold_frames:
+            return
+
+        new_level = self.level
+        if self._ema > self.latency_budget and self.level < len(self.levels) - 1:
+            new_level += 1
+        elif self._ema < self.latency_budget * self.recover_ratio and self.level > 0:
+            new_level -= 1
+
+        if new_level != self.level:
+            self.level_switches.append((frame_id, self.level, new_level, self._ema))
+            self.level = new_level
+            self._frames_since_switch = 0
+            self._ema = None
+
+    def report(self, buffer, elapsed, source_fps=0.0):
+        """汇总端到端延迟、丢帧率和降级情况"""
+        latencies = np.array(self.latencies) * 1000.0
+        inference = np.array(self.inference_times) * 1000.0
+        captured = buffer.written
+        # 只统计在缓冲区中被新帧覆盖的帧；停止时尚未取走的帧不算丢帧
+        report = {
+            'captured_frames': captured,
+            'processed_frames': self.processed,
+            'dropped_frames': buffer.dropped,
+            'drop_rate': buffer.dropped / captured if captured else 0.0,
+            'source_fps': source_fps,
+            'processed_fps': self.processed / elapsed if elapsed > 0 else 0.0,
+            'latency_budget_ms': self.latency_budget * 1000.0,
+            'final_level': self.level,
+            'level_switches': len(self.level_switches),
+        }
+        if len(latencies):
+            report.update({
+                'latency_mean_ms': float(latencies.mean()),
+                'latency_p50_ms': float(np.percentile(latencies, 50)),
+                'latency_p95_ms': float(np.percentile(latencies, 95)),
+                'latency_max_ms': float(latencies.max()),
+                'inference_mean_ms': float(inference.mean()),
+                'over_budget_rate': float(np.mean(latencies > self.latency_budget * 1000.0)),
+            })
+        if self.tracker is not None:
+            report['unique_defects'] = {
+                defect_type: entry['count'] for defect_type, entry in self.tracker.summary().items()
+            }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时有界延迟缺陷检测')
+    parser.add_argument('--source', required=True, help='视频文件路径、摄像头编号或流地址')
+    parser.add_argument('--method', choices=['ai', 'intelligent', 'budgeted'], default='ai',
+                        help='检测方法（budgeted：传统方法按每帧剩余的延迟预算选择尺度和分支）')
+    parser.add_argument('--budget', type=float, default=200, help='端到端延迟预算(毫秒)')
+    parser.add_argument('--no-replay', action='store_true', help='不按原始帧率回放文件，尽快读取')
+    parser.add_argument('--max-frames', type=int, default=None, help='最多处理的帧数')
+    parser.add_argument('--show', action='store_true', help='显示检测结果窗口')
+    parser.add_argument('--track', action='store_true', help='跨帧跟踪缺陷，统计去重后的数量')
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+
+    def show_result(frame_id, result_image, defects, latency):
+        cv2.putText(result_image, f"latency: {latency * 1000:.0f} ms", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        cv2.imshow('realtime', result_image)
+        cv2.waitKey(1)
+
+    stream = RealtimeStreamProcessor(method=args.method, latency_budget_ms=args.budget,
+                                     on_result=show_result if args.show else None,
+                                     tracker=DefectTracker() if args.track else None)
+    report = stream.run(source, replay=False if args.no_replay else None,
+                        max_frames=args.max_frames)
+
+    print("实时检测统计:")
+    for key, value in report.items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+
+# 批处理结果浏览用的缩略图磁盘缓存。JPEG按缩小后的分辨率解码（cv2.IMREAD_REDUCED_COLOR_*，
+# 解码器直接输出1/2、1/4、1/8尺寸，不需要先解出整幅图像），生成的缩略图以JPEG保存在缓存目录中，
+# 再次浏览同一文件夹时直接读取。
+
+DEFAULT_SIZE = 192
+THUMBNAIL_QUALITY = 85
+CACHE_DIR_NAME = '.thumbnails'
+
+# 从大到小尝试的缩小解码倍数
+_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _read_file(path):
+    # 使用 np.fromfile + cv2.imdecode 解决中文路径问题
+    return np.fromfile(path, dtype=np.uint8)
+
+
+def decode_reduced(path, size):
+    """解码图片，使较长边不小于 size 的前提下尽量缩小解码分辨率；JPEG以外的格式按原尺寸解码"""
+    data = _read_file(path)
+    if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg'):
+        for _, flag in _REDUCED_FLAGS:
+            image = cv2.imdecode(data, flag)
+            if image is None:
+                break
+            if max(image.shape[:2]) >= size:
+                return image
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def make_thumbnail(path, size=DEFAULT_SIZE):
+    """较长边为 size 的缩略图（BGR），无法解码时返回None"""
+    image = decode_reduced(path, size)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return image
+
+
+class ThumbnailCache:
+    """缩略图磁盘缓存，按 (文件路径, 修改时间, 文件大小, 缩略图尺寸) 索引，可在多个线程中同时使用
+
+    cache_dir: 缓存目录，不存在时自动创建
+    size: 缩略图较长边的像素数
+    """
+
+    def __init__(self, cache_dir, size=DEFAULT_SIZE):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_folder(cls, folder, size=DEFAULT_SIZE):
+        """结果文件夹下的缓存（folder/.thumbnails），文件夹不可写时改用系统临时目录"""
+        cache_dir = os.path.join(folder, CACHE_DIR_NAME)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError:
+            digest = hashlib.sha1(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16]
+            cache_dir = os.path.join(tempfile.gettempdir(), 'thumbnails', digest)
+        return cls(cache_dir, size)
+
+    def _cache_path(self, path):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.jpg')
+
+    def get(self, path):
+        """path 的缩略图（BGR）：缓存中有时直接读取，否则生成并写入缓存；无法读取时返回None"""
+        try:
+            cache_path = self._cache_path(path)
+        except OSError:
+            return None
+        if os.path.exists(cache_path):
+            thumbnail = cv2.imdecode(_read_file(cache_path), cv2.IMREAD_COLOR)
+            if thumbnail is not None:
+                self.hits += 1
+                return thumbnail
+        self.misses += 1
+        thumbnail = make_thumbnail(path, self.size)
+        if thumbnail is None:
+            return None
+        ok, data = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if ok:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # 先写临时文件再改名，其他线程不会读到写了一半的文件
+                temp_path = f"{cache_path}.{os.getpid()}.{id(thumbnail)}.tmp"
+                data.tofile(temp_path)
+                os.replace(temp_path, cache_path)
+            except OSError as e:
+                print(f"缩略图缓存写入失败: {str(e)}")
+        return thumbnail
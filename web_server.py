@@ -4,11 +4,19 @@ from werkzeug.utils import secure_filename
 import os
 import cv2
 import numpy as np
-from image_processor import ImageProcessor
+import image_ops
+import image_stats
+from quality_gate import QualityGate
+from road_roi import RoadROI
+from recipe import Recipe
+import fft_engine
+import morphology
+import json
 import base64
 import logging
 from logging.handlers import RotatingFileHandler
 import socket
+import threading
 import time
 import io
 from concurrent.futures import ThreadPoolExecutor
@@ -43,19 +51,24 @@ app.config.update(
 # 创建线程池
 executor = ThreadPoolExecutor(max_workers=4)
 
-# 创建处理器实例池
-processor_pool = []
-for _ in range(4):
-    processor_pool.append(ImageProcessor())
+# AI模型在所有请求间共享，只加载一次；推理时由 SharedModel 加锁串行执行
+shared_models = {}
+shared_models_lock = threading.Lock()
+MODEL_WEIGHTS = {
+    'bbox': image_ops.DEFAULT_YOLO_WEIGHTS,
+    'segment': image_ops.DEFAULT_SEGMENT_WEIGHTS,
+}
 
-def get_processor():
-    """从处理器池中获取一个可用的处理器"""
-    return processor_pool.pop() if processor_pool else ImageProcessor()
-
-def return_processor(processor):
-    """将处理器返回到池中"""
-    if len(processor_pool) < 4:
-        processor_pool.append(processor)
+def get_shared_model(kind):
+    """获取共享的边界框（'bbox'）或分割（'segment'）模型，加载失败时返回None"""
+    with shared_models_lock:
+        if kind not in shared_models:
+            try:
+                shared_models[kind] = image_ops.SharedModel(image_ops.load_model(MODEL_WEIGHTS[kind]))
+            except Exception as e:
+                logger.warning(f"加载{'分割' if kind == 'segment' else 'YOLOv12'}模型失败: {str(e)}")
+                return None
+        return shared_models[kind]
 
 def get_host_ip():
     """获取本机IP地址"""
@@ -74,8 +87,7 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'bmp'}
 
 def process_image_task(image_data, operation, params=None):
-    """处理图像的异步任务"""
-    processor = get_processor()
+    """处理图像的异步任务（只调用 image_ops 中的无状态函数，可任意并发）"""
     try:
         # 将图像数据转换为OpenCV格式
         nparr = np.frombuffer(image_data, np.uint8)
@@ -83,97 +95,94 @@ def process_image_task(image_data, operation, params=None):
         if image is None:
             raise ValueError("无法读取图像数据")
         
-        # 设置处理器的当前图像
-        processor.current_image = image
-        processor.original_image = image.copy()
+        params = params or {}
+        fft_mode = params.get('fft_mode') if params.get('fft_mode') in fft_engine.FILTER_KINDS else 'square'
+        morph_shape = params.get('morph_shape') if params.get('morph_shape') in morphology.SHAPES else 'rect'
+        detection_mode = params.get('detection_mode', 'bbox')
+        
+        # 图像质量门限
+        quality_action = params.get('quality_gate')
+        quality_gate = QualityGate(action=quality_action) if quality_action in QualityGate.ACTIONS else None
         
-        # 如果有参数，更新处理器参数
-        if params:
-            if 'brightness' in params:
-                processor.brightness = float(params['brightness'])
-            if 'contrast' in params:
-                processor.contrast = float(params['contrast'])
-            if 'canny_low' in params:
-                processor.canny_low = int(params['canny_low'])
-            if 'canny_high' in params:
-                processor.canny_high = int(params['canny_high'])
-            if 'fft_radius' in params:
-                processor.fft_radius = int(params['fft_radius'])
-            if 'morph_size' in params:
-                processor.morph_size = int(params['morph_size'])
-            if 'detection_mode' in params:
-                processor.detection_mode = params['detection_mode']
+        # 路面ROI：'auto' 自动估计路面，或JSON格式的多边形顶点 [[x, y], ...]
+        roi = params.get('roi', 'off')
+        if roi == 'auto':
+            road_roi = RoadROI(auto=True)
+        elif roi and roi != 'off':
+            road_roi = RoadROI(polygon=json.loads(roi))
+        else:
+            road_roi = None
         
         # 根据操作类型处理图像
         result = None
         defects = None
         info = {}
         
-        if operation == 'enhance':
-            result = processor.enhance_image()
+        if params.get('recipe'):
+            # 处理流程（JSON格式的步骤列表），提供时代替 operation
+            recipe = Recipe.from_json(params['recipe'])
+            result, defects = recipe.apply(image)
+            info['recipe'] = recipe.to_dict()
+        elif operation == 'enhance':
+            result = image_ops.enhance_image(image)
         elif operation == 'detect_edges':
-            result = processor.detect_edges()
+            result = image_ops.detect_edges(image, int(params.get('canny_low', 50)), int(params.get('canny_high', 150)))
             # 如果启用了边缘连接，进行处理
             if params.get('edge_connect_enabled', False):
                 gray = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
-                connected = processor.connect_edges(gray, 
-                                                 params.get('min_threshold', 5),
-                                                 params.get('max_threshold', 15))
+                connected = image_ops.connect_edges(gray, 
+                                                    params.get('min_threshold', 5),
+                                                    params.get('max_threshold', 15))
                 result = cv2.cvtColor(connected, cv2.COLOR_GRAY2BGR)
         elif operation == 'detect_defects':
-            result, defects = processor.detect_defects_intelligent()
+            result, defects = image_ops.detect_defects_intelligent(
+                image, quality_gate=quality_gate, road_roi=road_roi)
         elif operation == 'detect_ai':
-            # 确保加载了分割模型（如果需要）
-            if params.get('detection_mode') in ['segment', 'both'] and not processor.segment_model:
-                try:
-                    processor.load_segment_model()
-                except Exception as e:
-                    logger.warning(f"加载分割模型失败: {str(e)}")
+            # 按检测模式获取共享模型
+            yolo_model = get_shared_model('bbox') if detection_mode in ['bbox', 'both'] else None
+            segment_model = get_shared_model('segment') if detection_mode in ['segment', 'both'] else None
             
-            result, defects = processor.detect_defects_ai()
+            result, defects = image_ops.detect_defects_ai(
+                image, yolo_model, segment_model, detection_mode,
+                quality_gate=quality_gate, road_roi=road_roi)
             # 添加检测模式和统计信息到返回结果
-            info['detection_mode'] = processor.detection_mode
-            if defects and 'stats' in defects:
+            info['detection_mode'] = detection_mode
+            if defects is not None and 'stats' in defects:
                 info['stats'] = defects['stats']
         elif operation == 'adjust':
-            result = processor.adjust_brightness_contrast(
-                processor.brightness, 
-                processor.contrast
+            result = image_ops.adjust_brightness_contrast(
+                image,
+                float(params.get('brightness', 0)),
+                float(params.get('contrast', 1.0))
             )
         elif operation == 'clahe':
-            result = processor.clahe_enhancement()
+            result = image_ops.clahe_enhancement(image)
         elif operation == 'fft':
-            result = processor.fft_filter()
+            result = image_ops.fft_filter(image, int(params.get('fft_radius', 30)), fft_mode)
         elif operation == 'morph':
-            morph_type = params.get('morph_type', 'erode')
-            kernel = np.ones((processor.morph_size, processor.morph_size), np.uint8)
-            if morph_type == 'erode':
-                result = cv2.erode(processor.current_image, kernel)
-            elif morph_type == 'dilate':
-                result = cv2.dilate(processor.current_image, kernel)
-            elif morph_type == 'open':
-                result = cv2.morphologyEx(processor.current_image, cv2.MORPH_OPEN, kernel)
-            elif morph_type == 'close':
-                result = cv2.morphologyEx(processor.current_image, cv2.MORPH_CLOSE, kernel)
-            elif morph_type == 'gradient':
-                result = cv2.morphologyEx(processor.current_image, cv2.MORPH_GRADIENT, kernel)
+            result = image_ops.morph(image, params.get('morph_type', 'erode'), int(params.get('morph_size', 3)),
+                                     shape=morph_shape)
             
         # 计算图像信息
         if result is not None:
-            gray = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
+            # 每次请求的结果都是新图像，不经过缓存；不返回梯度，也不计算
+            stats = image_stats.compute(result, gradient=False)
             info.update({
-                'mean': float(np.mean(gray)),
-                'std': float(np.std(gray)),
-                'min': int(np.min(gray)),
-                'max': int(np.max(gray)),
+                'mean': stats['mean'],
+                'std': stats['std'],
+                'min': stats['min'],
+                'max': stats['max'],
                 'size': f"{result.shape[1]}x{result.shape[0]}"
             })
             
             # 如果有缺陷检测结果
-            if defects:
-                for defect_type in defects:
-                    if defect_type != 'stats':  # 跳过统计信息
-                        info[defect_type] = len(defects[defect_type])
+            if defects is not None:
+                info.update(defects.counts())
+                info['detections'] = defects.to_dict()
+                if 'quality' in defects:
+                    info['quality'] = defects['quality']
+                if 'roi' in defects:
+                    info['roi'] = defects['roi']
             
             # 将结果转换为base64
             _, buffer = cv2.imencode('.jpg', result)
@@ -182,8 +191,6 @@ def process_image_task(image_data, operation, params=None):
     except Exception as e:
         logger.error(f"处理图像时出错: {str(e)}")
         raise Exception(f"处理图像时出错: {str(e)}")
-    finally:
-        return_processor(processor)
 
 @app.route('/')
 def index():
@@ -232,12 +239,17 @@ def process():
             'canny_low': request.form.get('canny_low', 50, type=int),
             'canny_high': request.form.get('canny_high', 150, type=int),
             'fft_radius': request.form.get('fft_radius', 30, type=int),
+            'fft_mode': request.form.get('fft_mode', 'square'),
             'morph_size': request.form.get('morph_size', 3, type=int),
             'morph_type': request.form.get('morph_type', 'erode'),
+            'morph_shape': request.form.get('morph_shape', 'rect'),
             'edge_connect_enabled': request.form.get('edge_connect_enabled', 'false') == 'true',
             'min_threshold': request.form.get('min_threshold', 5, type=int),
             'max_threshold': request.form.get('max_threshold', 15, type=int),
-            'detection_mode': request.form.get('detection_mode', 'segment')
+            'detection_mode': request.form.get('detection_mode', 'segment'),
+            'quality_gate': request.form.get('quality_gate', 'off'),
+            'roi': request.form.get('roi', 'off'),
+            'recipe': request.form.get('recipe', '')
         }
         
         # 直接从内存中读取图像数据
@@ -272,7 +284,7 @@ def health_check():
             'server_ip': host_ip,
             'timestamp': time.time(),
             'debug_mode': app.debug,
-            'workers': len(processor_pool),
+            'models_loaded': sorted(shared_models),
             'max_workers': 4
         })
     except Exception as e: